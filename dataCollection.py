@@ -23,10 +23,44 @@ ceilometer server
 """
 
 # Import modules
+import argparse
+import os
+import sys
 import subprocess
 import ceilometerclient.client
 import json
-import readline  # It automatically wraps studin
+import readline  # noqa: F401  It automatically wraps studin
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'predPy'))
+# The collector modules live in predPy/, next to this script
+from checkpoint import collect_incremental  # noqa: E402
+from collector import Fetcher  # noqa: E402
+from writers import FORMATS, dataset_path  # noqa: E402
+import bulkCollect  # noqa: E402
+import metrics  # noqa: E402
+
+# Headless bulk mode: dataCollection.py --spec spec.json
+parser = argparse.ArgumentParser(
+    description="Collect meter samples from ceilometer")
+parser.add_argument('--spec', default=None,
+                    help="collect all resources matching this JSON spec "
+                         "without prompting, see predPy/bulkCollect.py")
+parser.add_argument('--format', choices=FORMATS, default='arff',
+                    help="format of the collected dataset")
+parser.add_argument('--metrics-profile', default=None,
+                    help="write the timers and counters of the collection "
+                         "to this JSON file")
+args = parser.parse_args()
+metrics.enable(args.metrics_profile is not None)
+if args.spec:
+    spec = bulkCollect.read_spec(args.spec)
+    env = (bulkCollect.openrc_environment(spec['openrc'])
+           if spec.get('openrc') else os.environ)
+    bulkCollect.run(spec, bulkCollect.ceilometer_client(env))
+    if args.metrics_profile:
+        metrics.dump(args.metrics_profile, arguments=vars(args))
+    sys.exit(0)
 
 # First source openrc * *; Otherwise, there is a error message.
 print ("source your openrc file, for example, "
@@ -76,8 +110,9 @@ for each in meter_list:
 print 'End', '+' * 15
 
 print ("\nYou can collect whatever meters you like just by typing the meter "
-       "names and using ',' as the separator,\n e.g., disk.read.requests.rate, "
-       "disk.write.requests.rate, disk.read.bytes.rate, "
+       "names and using ',' as the separator,\n e.g., "
+       "disk.read.requests.rate, disk.write.requests.rate, "
+       "disk.read.bytes.rate, "
        "disk.write.bytes.rate, cpu_util.")
 
 try:
@@ -88,56 +123,22 @@ except EOFError:
     print "\n Good Bye! Welcome again next time!"
 
 
-collect_meter_samples = []
 print ("At the same time, you need to specify the beginning time and the "
        "end time for the collection. \nThe time format is fixed, "
        "e.g., 2016-02-28T00:00:00. ")
 begin_time = raw_input("> Please input the beginning time: ")
 end_time = raw_input("> Please input the end time: ")
-for each in collect_meters:
-    query = [
-        dict(field='resource_id', op='eq', value=resource_id),
-        dict(field='timestamp', op='ge', value=begin_time),
-        dict(field='timestamp', op='lt', value=end_time),
-        dict(field='meter', op='eq', value=each)
-    ]
-#    (collect_meter_samples.
-#        append(c_client.new_samples.list(q=query, limit=1000)))
-    jsonData = c_client.new_samples.list(q=query, limit=1000)
-    collect_meter_samples.append(i for i in jsonData)
-#        append(c_client.samples.list(q=query, limit=1000)))
-
-part_info = ("% ARFF file for the collected meter sample"
-             " with some numeric feature from ceilometer API. \n \n"
-             "@relation  collected samples for VMs on host \n \n"
-             "@attribute  timestample   \n"
-             "@attribute  resource id   \n")
-item_info = [part_info]
-for each in collect_meters:
-    item_info.append("@attribute  %s \n" % each)
-item_info.append("@data \n \n")
-head_info = ''.join(item_info)
-
-with open('collectMeterSamples.arff', 'w') as fout:
-    fout.write(head_info)
-    collect_meter_sample_values = []
-    for each in collect_meter_samples[1:]:
-        # each_sample_value = (str(i.counter_volume) for i in each)
-        each_sample_value = (str(i.volume) for i in each)
-        collect_meter_sample_values.append(each_sample_value)
-
-    count = 0
-    for each in collect_meter_samples[0]:
-        fout.write("%s, %s" % (each.timestamp, each.resource_id))
-        # fout.write(', ' + str(each.counter_volume))
-        fout.write(', ' + str(each.volume))
-        for i in collect_meter_sample_values:
-            fout.write(', ' + i.next())
-        fout.write('\n')
-        count += 1
-
-    print (
-        "\nGreat! Collection is done. \n%d rows of meter samples have been "
-        "written in the file named 'collectMeterSamples.arff' in your current"
-        " directory. \nPlease check!" % count
-    )
+fetcher = Fetcher(c_client)
+path = dataset_path('collectMeterSamples', args.format)
+count = collect_incremental(fetcher, resource_id, collect_meters, begin_time,
+                            end_time, path, fmt=args.format)
+fetcher.close()
+fetcher.print_summary()
+if args.metrics_profile:
+    metrics.dump(args.metrics_profile, arguments=vars(args))
+
+print (
+    "\nGreat! Collection is done. \n%d rows of meter samples have been "
+    "appended to the dataset named '%s' in your current"
+    " directory. \nPlease check!" % (count, path)
+)
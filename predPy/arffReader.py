@@ -0,0 +1,321 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Streaming reader of ARFF files into the tables of features.py.
+
+readSchema parses the header once into a Schema of typed attributes,
+skipping anything before @relation.  The @data section is then parsed
+in blocks into float64 tables with one column per attribute, the layout
+iterTables gives for CSV, so selectTable, the feature cache and both
+engines take ARFF input unchanged:
+
+* numeric attributes are read as is, '?' as nan;
+* nominal values are mapped to their integer code, the index of the
+  value in the attribute's {...} list;
+* string attributes, and attributes without a type as in old collector
+  files, are mapped to a stable 48-bit key of the string, the resource
+  key of writers.py;
+* date attributes are read as epoch seconds.
+
+Blocks of purely numeric and numeric-valued nominal attributes, such as
+harddrive1.arff, are parsed with one np.fromstring call and the nominal
+columns mapped with np.searchsorted; other blocks, and those with quoted
+values, fall back to a line by line tokenizer.  Sparse ARFF data is not
+supported.
+
+The ARFF files of the collectors hold the time, the resource id and the
+meters but no label, so they can only be trained on once a label column
+is appended and a selection spec picks the meters and the label; with
+the default slices selectTable raises ValueError.
+"""
+
+# Imported lazily by strptime, which races in threads
+import _strptime  # noqa: F401
+import datetime
+import hashlib
+import itertools
+import re
+import numpy as np
+from features import BLOCK_ROWS
+import metrics
+
+NUMERIC_TYPES = ('numeric', 'real', 'integer')
+DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f',
+                '%Y-%m-%d %H:%M:%S', '%Y-%m-%d')
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# A quoted or bare attribute name
+NAME = re.compile(r"""\s*('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|\S+)""")
+# A quoted or bare comma separated field and its separator
+FIELD = re.compile(r"""\s*('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[^,]*)"""
+                   r"""\s*(,|$)""")
+MISSING = re.compile(r'(?<![^,])\s*\?\s*(?![^,])')
+
+
+def unquote(token):
+    token = token.strip()
+    if len(token) > 1 and token[0] == token[-1] and token[0] in '\'"':
+        return token[1:-1].replace('\\' + token[0], token[0])
+    return token
+
+
+def splitFields(text):
+    """Split a comma separated line, keeping quoted commas"""
+    fields = []
+    position = 0
+    while True:
+        match = FIELD.match(text, position)
+        if match is None:
+            raise ValueError("bad ARFF line: %r" % text)
+        fields.append(match.group(1))
+        if match.group(2) != ',':
+            return fields
+        position = match.end()
+
+
+def stringKey(value):
+    """Return the stable numeric key of a string value"""
+    return float(int(hashlib.sha1(value).hexdigest()[:12], 16))
+
+
+def parseDate(value):
+    """Return the epoch seconds of an ISO date"""
+    for dateFormat in DATE_FORMATS:
+        try:
+            moment = datetime.datetime.strptime(value, dateFormat)
+        except ValueError:
+            continue
+        return (moment - EPOCH).total_seconds()
+    raise ValueError("unknown date format: %r" % value)
+
+
+class Attribute(object):
+    """One ARFF attribute: its name, kind and nominal values"""
+
+    def __init__(self, name, kind, values=None):
+        self.name = name
+        self.kind = kind
+        self.values = values
+        self.codes = None
+        self.numericValues = None
+        if values is not None:
+            self.codes = dict((value, code)
+                              for code, value in enumerate(values))
+            try:
+                numbers = [float(value) for value in values]
+            except ValueError:
+                pass
+            else:
+                # Sorted numeric values and their codes for searchsorted
+                order = np.argsort(numbers, kind='mergesort')
+                self.numericValues = (np.asarray(numbers)[order],
+                                      order.astype(np.float64))
+
+    def convert(self, token):
+        """Convert one data token of this attribute to a float"""
+        token = unquote(token)
+        if token == '?':
+            return np.nan
+        if self.kind == 'numeric':
+            return float(token)
+        if self.kind == 'nominal':
+            if token not in self.codes:
+                raise ValueError("unknown value of nominal attribute %s" %
+                                 self.name)
+            return float(self.codes[token])
+        if self.kind == 'date':
+            return parseDate(token)
+        return stringKey(token)
+
+    def __repr__(self):
+        return 'Attribute(%r, %r)' % (self.name, self.kind)
+
+
+class Schema(object):
+    """The relation name and attributes of an ARFF header"""
+
+    def __init__(self, relation, attributes, headerLines):
+        self.relation = relation
+        self.attributes = attributes
+        # Lines up to and including @data
+        self.headerLines = headerLines
+        self.fast = all(attribute.kind == 'numeric' or
+                        attribute.numericValues is not None
+                        for attribute in attributes)
+
+    def names(self):
+        return [attribute.name for attribute in self.attributes]
+
+    def index(self, name):
+        return self.names().index(name)
+
+
+def parseAttribute(line):
+    """Parse an @attribute declaration"""
+    rest = line.strip()[len('@attribute'):]
+    match = NAME.match(rest)
+    if match is None:
+        raise ValueError("bad attribute declaration: %r" % line)
+    name = unquote(match.group(1))
+    kind = rest[match.end():].strip()
+    if kind.startswith('{'):
+        if not kind.endswith('}'):
+            raise ValueError("bad nominal declaration: %r" % line)
+        # Skip the empty value of a trailing comma, as in harddrive1.arff
+        values = [unquote(token) for token in splitFields(kind[1:-1])
+                  if token.strip()]
+        return Attribute(name, 'nominal', values)
+    kind = kind.split()[0].lower() if kind else 'string'
+    if kind in NUMERIC_TYPES:
+        return Attribute(name, 'numeric')
+    if kind == 'date':
+        return Attribute(name, 'date')
+    # string, and untyped attributes of old collector files
+    return Attribute(name, 'string')
+
+
+def readSchema(lines):
+    """Parse the header of an ARFF file up to @data into a Schema
+
+    lines is consumed up to and including the @data line.
+    """
+    relation = None
+    attributes = []
+    count = 0
+    for line in lines:
+        count += 1
+        stripped = line.strip()
+        lowered = stripped.lower()
+        if lowered.startswith('@relation'):
+            relation = unquote(stripped[len('@relation'):])
+        elif relation is None or not stripped or stripped.startswith('%'):
+            continue
+        elif lowered.startswith('@attribute'):
+            attributes.append(parseAttribute(stripped))
+        elif lowered.startswith('@data'):
+            if not attributes:
+                raise ValueError("ARFF header without attributes")
+            return Schema(relation, attributes, count)
+        else:
+            raise ValueError("unexpected ARFF header line: %r" % line)
+    raise ValueError("no @data section found")
+
+
+def dataLines(lines):
+    """Drop blank and comment lines of the @data section"""
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not stripped.startswith('%'):
+            if stripped.startswith('{'):
+                raise ValueError("sparse ARFF data is not supported")
+            yield stripped
+
+
+def parseFast(schema, lines):
+    """Parse numeric lines with one np.fromstring call"""
+    numColumns = len(schema.attributes)
+    text = MISSING.sub('nan', ','.join(lines))
+    values = np.fromstring(text, dtype=np.float64, sep=',')
+    if values.size != numColumns * len(lines):
+        raise ValueError("Expected %d columns in each of %d ARFF lines" %
+                         (numColumns, len(lines)))
+    table = values.reshape(len(lines), numColumns)
+    for column, attribute in enumerate(schema.attributes):
+        if attribute.kind != 'nominal':
+            continue
+        numbers, codes = attribute.numericValues
+        found = np.searchsorted(numbers, table[:, column])
+        found = np.minimum(found, len(numbers) - 1)
+        known = numbers[found] == table[:, column]
+        if not known.all() and not np.isnan(
+                table[~known, column]).all():
+            raise ValueError("unknown value of nominal attribute %s" %
+                             attribute.name)
+        table[:, column] = np.where(known, codes[found], np.nan)
+    return table
+
+
+def parseSlow(schema, lines):
+    """Parse lines token by token"""
+    table = np.empty((len(lines), len(schema.attributes)))
+    for row, line in enumerate(lines):
+        tokens = splitFields(line)
+        if len(tokens) != len(schema.attributes):
+            raise ValueError("Expected %d columns in ARFF line %r" %
+                             (len(schema.attributes), line))
+        for column, (attribute, token) in enumerate(
+                zip(schema.attributes, tokens)):
+            table[row, column] = attribute.convert(token)
+    return table
+
+
+@metrics.timed('features_parse_seconds', format='arff')
+def parseTable(schema, lines):
+    """Parse @data lines into one table of all attributes"""
+    lines = list(dataLines(lines))
+    if not lines:
+        return np.empty((0, len(schema.attributes)))
+    metrics.count('features_parsed_rows_total', len(lines), format='arff')
+    if schema.fast:
+        try:
+            return parseFast(schema, lines)
+        except ValueError:
+            # Quoted values, tokenized below
+            pass
+    return parseSlow(schema, lines)
+
+
+def iterTables(lines, blockRows=BLOCK_ROWS, schema=None):
+    """Yield (schema, table) blocks of at most blockRows data lines
+
+    Without schema the header is read from lines first; with one, lines
+    holds data lines only.
+    """
+    lines = iter(lines)
+    if schema is None:
+        schema = readSchema(lines)
+    while True:
+        chunk = list(itertools.islice(lines, blockRows))
+        if not chunk:
+            return
+        table = parseTable(schema, chunk)
+        if len(table):
+            yield schema, table
+
+
+def isArff(path):
+    return path.endswith('.arff') or path.endswith('.arff.gz')
+
+
+def tablesRDD(sc, path, schema, blockRows=BLOCK_ROWS):
+    """Return an RDD of the parsed tables of an ARFF file
+
+    schema is read by the driver, e.g. from the first lines of the file.
+    The header is assumed to lie within the first partition, which holds
+    at least the first HDFS block or the whole of a gzip file.
+    """
+    headerLines = schema.headerLines
+
+    def parsePartition(index, lines):
+        if index == 0:
+            lines = itertools.islice(lines, headerLines, None)
+        for _, table in iterTables(lines, blockRows, schema):
+            yield table
+
+    return sc.textFile(path).mapPartitionsWithIndex(parsePartition)
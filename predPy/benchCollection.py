@@ -0,0 +1,188 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Load benchmark of the sample collection against a local ceilometer stub.
+
+Starts ceilometerStub.py in a subprocess with N resources x M meters x T
+samples, optional latency and injected errors, and collects all of them
+with bulkCollect, through the real ceilometerclient and keystone token
+flow, into a fresh directory per round.  For each round it measures the
+end-to-end time, the samples/s and request latencies seen by the fetcher,
+and it reports the peak memory of the collecting process and the timers
+and counters of metrics.py.  The report is a JSON document with sorted
+keys, like the one of benchmark.py.
+
+Usage:
+
+    python benchCollection.py --resources 20 --meters 5 --samples 1440 \
+        --latency 0.02 --error-rate 0.01 --rounds 3 \
+        --output benchCollection.json
+"""
+
+from __future__ import print_function
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib2
+from benchmark import gitCommit, peakDriverMB, summarize
+from bulkCollect import ceilometer_client, run
+from collector import WORKERS, Fetcher, format_time, parse_time
+from writers import FORMATS
+import metrics
+
+STUB = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                    'ceilometerStub.py')
+
+
+def freePort():
+    """Return a TCP port that is free on the loopback interface"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def startStub(args, port, timeout=10):
+    """Start the stub server and wait until it answers"""
+    stub = subprocess.Popen(
+        [sys.executable, STUB, '--port', str(port),
+         '--resources', str(args.resources), '--meters', str(args.meters),
+         '--samples', str(args.samples), '--interval', str(args.interval),
+         '--start', args.start, '--gap-rate', str(args.gap_rate),
+         '--latency', str(args.latency), '--jitter', str(args.jitter),
+         '--error-rate', str(args.error_rate)],
+        stdout=open(os.devnull, 'w'))
+    deadline = time.time() + timeout
+    while True:
+        try:
+            urllib2.urlopen('http://127.0.0.1:%d/v2.0' % port).read()
+            return stub
+        except urllib2.URLError:
+            if stub.poll() is not None or time.time() > deadline:
+                stub.kill()
+                raise RuntimeError("the ceilometer stub did not start")
+            time.sleep(0.1)
+
+
+def benchRound(c_client, spec, workers, resourceWorkers):
+    """Collect the spec once, return the fetcher summary and the rows"""
+    fetcher = Fetcher(c_client, workers)
+    started = time.time()
+    rows = run(spec, c_client, workers, resourceWorkers, fetcher=fetcher)
+    seconds = time.time() - started
+    summary = fetcher.summary()
+    summary['endToEndSeconds'] = seconds
+    summary['rows'] = sum(sum(counts.values()) for counts in rows.values())
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark sample collection against a ceilometer stub")
+    parser.add_argument('--resources', type=int, default=10)
+    parser.add_argument('--meters', type=int, default=5)
+    parser.add_argument('--samples', type=int, default=1440,
+                        help="samples of each resource and meter")
+    parser.add_argument('--interval', type=int, default=60)
+    parser.add_argument('--start', default='2016-02-28T00:00:00')
+    parser.add_argument('--gap-rate', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--format', choices=FORMATS, default='csv.gz')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--resource-workers', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--output', default='benchCollection.json')
+    args = parser.parse_args()
+    metrics.enable()
+
+    port = freePort()
+    stub = startStub(args, port)
+    workDir = tempfile.mkdtemp(prefix='benchCollection')
+    try:
+        c_client = ceilometer_client({
+            'OS_AUTH_URL': 'http://127.0.0.1:%d/v2.0' % port,
+            'OS_USERNAME': 'bench', 'OS_PASSWORD': 'bench',
+            'OS_TENANT_NAME': 'bench'})
+        begin = parse_time(args.start)
+        end = begin + datetime.timedelta(
+            seconds=args.samples * args.interval)
+        rounds = []
+        for index in range(args.rounds):
+            spec = {'begin_time': format_time(begin),
+                    'end_time': format_time(end),
+                    'output': os.path.join(workDir, str(index)),
+                    'format': args.format,
+                    'types': {'all': {'meters': ['*']}}}
+            rounds.append(benchRound(c_client, spec, args.workers,
+                                     args.resource_workers))
+            shutil.rmtree(spec['output'])
+    finally:
+        stub.terminate()
+        stub.wait()
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    expected = args.resources * args.meters * args.samples
+    report = {
+        'commit': gitCommit(),
+        'python': platform.python_version(),
+        'host': platform.node(),
+        'load': {'resources': args.resources, 'meters': args.meters,
+                 'samples': args.samples, 'interval': args.interval,
+                 'gapRate': args.gap_rate, 'latency': args.latency,
+                 'jitter': args.jitter, 'errorRate': args.error_rate},
+        'format': args.format,
+        'workers': args.workers,
+        'resourceWorkers': args.resource_workers,
+        'expectedSamples': expected,
+        'samples': [summary['samples'] for summary in rounds],
+        'rows': [summary['rows'] for summary in rounds],
+        'retries': [summary['retries'] for summary in rounds],
+        'endToEndSeconds': summarize(
+            [summary['endToEndSeconds'] for summary in rounds]),
+        'samplesPerSecond': summarize(
+            [summary['samples'] / summary['endToEndSeconds']
+             for summary in rounds]),
+        'p50Ms': summarize([summary.get('p50_ms', 0) for summary in rounds]),
+        'p99Ms': summarize([summary.get('p99_ms', 0) for summary in rounds]),
+        'peakDriverMB': round(peakDriverMB(), 3),
+        'metrics': metrics.snapshot(),
+    }
+    for index, summary in enumerate(rounds):
+        print("round %d: %d samples in %.2f s, %.0f samples/s, "
+              "%d retries" % (index, summary['samples'],
+                              summary['endToEndSeconds'],
+                              summary['samples'] /
+                              summary['endToEndSeconds'],
+                              summary['retries']))
+    print("peak memory %.1f MB" % report['peakDriverMB'])
+    with open(args.output, 'w') as fout:
+        json.dump(report, fout, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        fout.write('\n')
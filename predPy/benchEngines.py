@@ -0,0 +1,159 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Crossover benchmark of the local NumPy engine against Spark.
+
+For each replication factor the selected rows of the input are repeated
+factor times and every model is trained and evaluated by both engines on
+the same 80/20 split ratio.  The local engine runs in-process on NumPy
+arrays; the Spark engine reads the columnar feature cache, replicates the
+points with a flatMap and trains with modelZoo, one model at a time so the
+timings are not disturbed by concurrent jobs.  SparkContext start-up is
+measured once and added to every Spark total, as a single predictor.py
+run would pay it.
+
+Usage:
+
+    python benchEngines.py --input ../data/harddrive1.csv.gz \
+        --cache-dir cache --factors 1,4,16,64 --master local[*]
+
+For each model the report prints the local and Spark seconds per factor
+and the first factor at which Spark is faster, or "none" when the local
+engine wins across the whole range.  --local-only times the local engine
+alone, where Spark is not installed.
+
+Measured local seconds, training plus evaluation, on harddrive1.csv.gz
+(68411 rows, 25 features, 80/20 split) replicated 1, 4 and 16 times, with
+one core of a Xeon, Python 2.7.18 and NumPy 1.16:
+
+    model           1x (68k)   4x (274k)   16x (1.1M)
+    svm                 0.34        2.48        10.99
+    lr-sgd              0.39        2.61        11.33
+    lr-lbfgs            0.12        0.49         2.88
+    naive-bayes         0.00        0.02         0.08
+    decision-tree       0.50        1.01         5.62
+    random-forest       3.38       13.68        55.49
+    gbt                 6.44       33.68       139.98
+
+The Spark columns were not measured, as that host has no Spark.  The
+local times grow about linearly with the rows, so Spark can only win
+once its fixed cost of JVM start-up and job scheduling falls below them;
+rerun the benchmark on the target cluster before picking an engine.
+"""
+
+from __future__ import print_function
+import argparse
+import time
+import numpy as np
+from featureCache import cachedPoints
+from models import selectModels
+import localEngine
+
+
+def benchLocal(features, labels, factor, specs):
+    """Return the local seconds per model for the replicated arrays"""
+    training, test = localEngine.splitData(np.tile(features, (factor, 1)),
+                                           np.tile(labels, factor))
+    timings = {}
+    for spec in specs:
+        result = localEngine.runModel(spec, training, test)
+        timings[spec.name] = result['trainSeconds'] + result['evalSeconds']
+    return timings
+
+
+def benchSpark(sc, data, factor, specs):
+    """Return the Spark seconds per model for the replicated points"""
+    import modelZoo
+    replicated = data.flatMap(lambda point: [point] * factor)
+    start = time.time()
+    trainingData, testData = modelZoo.splitData(replicated)
+    splitSeconds = time.time() - start
+    timings = {}
+    for spec in specs:
+        result = modelZoo.runModel(sc, spec, trainingData, testData)
+        timings[spec.name] = (splitSeconds + result['trainSeconds'] +
+                              result['evalSeconds'])
+    trainingData.unpersist()
+    testData.unpersist()
+    return timings
+
+
+def crossover(factors, local, spark, name):
+    """Return the first factor at which Spark beats the local engine"""
+    for factor in factors:
+        if spark[factor][name] < local[factor][name]:
+            return str(factor)
+    return "none"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find where Spark becomes faster than the local engine")
+    parser.add_argument('--input', default='../data/harddrive1.csv.gz')
+    parser.add_argument('--cache-dir', default='cache')
+    parser.add_argument('--factors', default='1,4,16,64',
+                        help="comma separated replication factors")
+    parser.add_argument('--models', default=None)
+    parser.add_argument('--master', default=None)
+    parser.add_argument('--local-only', action='store_true',
+                        help="time the local engine only, e.g. where Spark "
+                             "is not installed")
+    args = parser.parse_args()
+    factors = [int(factor) for factor in args.factors.split(',')]
+    specs = selectModels(args.models and args.models.split(','))
+
+    features, labels = localEngine.loadData(args.input, args.cache_dir)
+    local = {}
+    for factor in factors:
+        local[factor] = benchLocal(features, labels, factor, specs)
+
+    if args.local_only:
+        print("base rows: %d" % len(labels))
+        print("%-14s %8s %10s" % ("model", "factor", "local s"))
+        for spec in specs:
+            for factor in factors:
+                print("%-14s %8d %10.2f" % (spec.name, factor,
+                                            local[factor][spec.name]))
+        raise SystemExit(0)
+
+    from pyspark import SparkConf, SparkContext
+    start = time.time()
+    conf = SparkConf().setAppName("EngineCrossoverBenchmark")
+    if args.master:
+        conf.setMaster(args.master)
+    sc = SparkContext(conf=conf)
+    startup = time.time() - start
+    data = cachedPoints(sc, args.input, args.cache_dir).cache()
+    spark = {}
+    for factor in factors:
+        spark[factor] = benchSpark(sc, data, factor, specs)
+        for name in spark[factor]:
+            spark[factor][name] += startup
+    sc.stop()
+
+    print("SparkContext start-up: %.1f s, base rows: %d" %
+          (startup, len(labels)))
+    print("%-14s %8s %10s %10s" % ("model", "factor", "local s", "spark s"))
+    for spec in specs:
+        for factor in factors:
+            print("%-14s %8d %10.2f %10.2f" % (
+                spec.name, factor, local[factor][spec.name],
+                spark[factor][spec.name]))
+        print("%-14s crossover factor: %s" %
+              (spec.name, crossover(factors, local, spark, spec.name)))
@@ -0,0 +1,106 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Micro-benchmark of the per-line and the partition-level CSV parsers.
+
+Both paths turn the same lines into LabeledPoints: the per-line path is
+map(loadRecord).map(parseLine) as run by predictor.py before, the
+partition-level path is predictor.parsePartition.  The lines are read
+once into memory and optionally replicated, so only parsing is timed.
+Without pyspark only the two array parsers are timed.
+
+Usage: python benchParse.py --input ../data/harddrive1.csv.gz --repeat 3
+"""
+
+from __future__ import print_function
+import argparse
+import gzip
+import time
+from features import loadRecord, iterBlocks
+from predictor import parseLine, parsePartition
+
+
+def readLines(path, replicas):
+    """Read the CSV lines into memory, replicated replicas times"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as fin:
+        lines = [line for line in fin if line.strip()]
+    return lines * replicas
+
+
+def timeIt(func, lines, repeat):
+    """Return the best wall time of func over repeat runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func(lines)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def perLine(lines):
+    """Parse through loadRecord and parseLine, one line at a time"""
+    return sum(1 for line in lines for _ in [parseLine(loadRecord(line))])
+
+
+def perLineArrays(lines):
+    """Parse through loadRecord and float conversion, no LabeledPoint"""
+    return sum(1 for line in lines for _ in [map(float, loadRecord(line))])
+
+
+def perPartition(lines):
+    """Parse through the partition-level parser into LabeledPoints"""
+    return sum(1 for _ in parsePartition(lines))
+
+
+def perPartitionArrays(lines):
+    """Parse into NumPy blocks only, no LabeledPoint"""
+    return sum(len(labels) for _, labels in iterBlocks(lines))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the per-line and partition-level parsers")
+    parser.add_argument('--input', default='../data/harddrive1.csv.gz')
+    parser.add_argument('--replicas', type=int, default=1,
+                        help="replicate the input lines this many times")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="runs per parser, the best one is reported")
+    args = parser.parse_args()
+
+    parsers = [("loadRecord+parseLine", perLine),
+               ("parsePartition", perPartition),
+               ("loadRecord (arrays only)", perLineArrays),
+               ("iterBlocks (arrays only)", perPartitionArrays)]
+    try:
+        import pyspark  # noqa: F401
+    except ImportError:
+        print("pyspark is not installed, skipping the LabeledPoint parsers")
+        parsers = parsers[2:]
+
+    lines = readLines(args.input, args.replicas)
+    print("Parsing %d lines, best of %d runs" % (len(lines), args.repeat))
+    baseline = None
+    for name, func in parsers:
+        elapsed = timeIt(func, lines, args.repeat)
+        if baseline is None:
+            baseline = elapsed
+        print("%-26s %8.3f s %12.0f rows/s %6.2fx" %
+              (name, elapsed, len(lines) / elapsed, baseline / elapsed))
@@ -0,0 +1,263 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Reproducible training and prediction benchmark of the Python models.
+
+The Python counterpart of the Java Model.benchmark(rounds, filename).  The
+input CSV is replicated synthetically to every requested scale; replica r
+shifts the serial in column 0 by r * SERIAL_STRIDE, so every copy looks
+like a distinct set of drives with the same SMART histories.  For each
+scale the benchmark measures the parse time, and for every model over
+several rounds the training time, the prediction time and throughput on
+the test split, and the peak memory of the driver and, with Spark, of the
+executors.  The peaks are high-water marks of the whole run, not of one
+case: cumulativePeakDriverMB is the largest resident size of this process
+so far, so a model only raises it when it needs more memory than every
+case before it, and cumulativePeakExecutorMB is likewise the largest
+executor heap since the SparkContext started.  The report is a JSON
+document with sorted keys, so reports of two commits can be compared with
+diff.
+
+Usage:
+
+    python benchmark.py --input ../data/harddrive1.csv.gz --engine local \
+        --scales 1,10,100 --rounds 3 --output benchmark.json
+"""
+
+from __future__ import print_function
+import argparse
+import gzip
+import json
+import os
+import platform
+import resource
+import subprocess
+import time
+import numpy as np
+from featureCache import openSource
+from features import iterBlocks
+from models import selectModels
+import localEngine
+
+# Serial offset between two replicas of the input
+SERIAL_STRIDE = 1000000
+
+
+def replicate(path, factor, workDir):
+    """Write factor copies of the CSV with shifted serials, return path"""
+    target = os.path.join(workDir, 'harddrive_x%d.csv.gz' % factor)
+    if os.path.exists(target):
+        return target
+    tmpTarget = target + '.tmp'
+    with openSource(path) as fin:
+        lines = [line.rstrip('\r\n') for line in fin if line.strip()]
+    rows = [line.split(',', 1) for line in lines]
+    fout = gzip.open(tmpTarget, 'wb')
+    try:
+        for replica in range(factor):
+            shift = replica * SERIAL_STRIDE
+            for serial, rest in rows:
+                fout.write('%d,%s\n' % (int(float(serial)) + shift, rest))
+    finally:
+        fout.close()
+    os.rename(tmpTarget, target)
+    return target
+
+
+def peakDriverMB():
+    """Peak resident memory of this process so far, in MB
+
+    The value never decreases during a run, it is not per measured case.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on OS X
+    if platform.system() == 'Darwin':
+        return peak / (1024.0 * 1024.0)
+    return peak / 1024.0
+
+
+def peakExecutorMB(sc):
+    """Peak JVM heap of the executors from the Spark REST API, or None"""
+    import urllib2
+    try:
+        url = '%s/api/v1/applications/%s/executors' % (
+            sc.uiWebUrl, sc.applicationId)
+        executors = json.load(urllib2.urlopen(url, timeout=5))
+    except Exception:
+        return None
+    peaks = [executor.get('peakMemoryMetrics', {}).get('JVMHeapMemory')
+             for executor in executors]
+    peaks = [peak for peak in peaks if peak is not None]
+    return max(peaks) / (1024.0 * 1024.0) if peaks else None
+
+
+def summarize(samples):
+    """Mean, standard deviation and 95% confidence interval half-width"""
+    samples = np.asarray(samples, dtype=np.float64)
+    std = float(samples.std(ddof=1)) if len(samples) > 1 else 0.0
+    return {
+        'rounds': [round(sample, 6) for sample in samples.tolist()],
+        'mean': round(float(samples.mean()), 6),
+        'std': round(std, 6),
+        'ci95': round(1.959964 * std / np.sqrt(len(samples)), 6),
+    }
+
+
+def benchLocal(path, specs, rounds):
+    """Benchmark the local engine on one replicated file"""
+    start = time.time()
+    with openSource(path) as fin:
+        blocks = list(iterBlocks(fin))
+    features = np.concatenate([block[0] for block in blocks])
+    labels = np.concatenate([block[1] for block in blocks])
+    parseSeconds = time.time() - start
+    training, test = localEngine.splitData(features, labels)
+
+    models = {}
+    for spec in specs:
+        trainTimes, predictTimes = [], []
+        for _ in range(rounds):
+            start = time.time()
+            model = localEngine.trainModel(spec, *training)
+            trainTimes.append(time.time() - start)
+            start = time.time()
+            model.predict(test[0])
+            predictTimes.append(time.time() - start)
+        models[spec.name] = modelReport(trainTimes, predictTimes,
+                                        len(test[1]))
+        models[spec.name]['cumulativePeakDriverMB'] = round(
+            peakDriverMB(), 1)
+    return len(labels), parseSeconds, models
+
+
+def benchSpark(sc, path, specs, rounds):
+    """Benchmark MLlib on one replicated file"""
+    import modelZoo
+    from predictor import parsePartition
+    start = time.time()
+    data = sc.textFile(path).mapPartitions(parsePartition).cache()
+    rows = data.count()
+    parseSeconds = time.time() - start
+    trainingData, testData = modelZoo.splitData(data)
+    testRows = testData.count()
+    testFeatures = testData.map(lambda point: point.features).cache()
+    testFeatures.count()
+
+    models = {}
+    for spec in specs:
+        trainTimes, predictTimes = [], []
+        for _ in range(rounds):
+            start = time.time()
+            model = modelZoo.trainModel(spec, trainingData)
+            trainTimes.append(time.time() - start)
+            start = time.time()
+            model.predict(testFeatures).count()
+            predictTimes.append(time.time() - start)
+        models[spec.name] = modelReport(trainTimes, predictTimes, testRows)
+        models[spec.name]['cumulativePeakDriverMB'] = round(
+            peakDriverMB(), 1)
+        peak = peakExecutorMB(sc)
+        models[spec.name]['cumulativePeakExecutorMB'] = (
+            round(peak, 1) if peak is not None else None)
+    for rdd in (data, trainingData, testData, testFeatures):
+        rdd.unpersist()
+    return rows, parseSeconds, models
+
+
+def modelReport(trainTimes, predictTimes, testRows):
+    """Timing summary of one model"""
+    predict = summarize(predictTimes)
+    return {
+        'trainSeconds': summarize(trainTimes),
+        'predictSeconds': predict,
+        'predictRowsPerSecond': (round(testRows / predict['mean'], 1)
+                                 if predict['mean'] > 0 else None),
+        'testRows': testRows,
+    }
+
+
+def gitCommit():
+    """Return the commit of the working tree, or None outside git"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark training and prediction of the models")
+    parser.add_argument('--input', default='../data/harddrive1.csv.gz')
+    parser.add_argument('--engine', choices=('spark', 'local'),
+                        default='local')
+    parser.add_argument('--scales', default='1,10,100',
+                        help="comma separated replication factors")
+    parser.add_argument('--models', default=None)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--work-dir', default='benchmark_data',
+                        help="directory of the replicated inputs")
+    parser.add_argument('--output', default='benchmark.json')
+    args = parser.parse_args()
+    specs = selectModels(args.models and args.models.split(','))
+    if not os.path.isdir(args.work_dir):
+        os.makedirs(args.work_dir)
+
+    sc = None
+    if args.engine == 'spark':
+        from pyspark import SparkContext
+        sc = SparkContext(appName="HardDriveBenchmark")
+
+    scales = []
+    for factor in [int(factor) for factor in args.scales.split(',')]:
+        path = replicate(args.input, factor, args.work_dir)
+        if sc is not None:
+            rows, parseSeconds, models = benchSpark(sc, path, specs,
+                                                    args.rounds)
+        else:
+            rows, parseSeconds, models = benchLocal(path, specs, args.rounds)
+        scales.append({'factor': factor, 'rows': rows,
+                       'parseSeconds': round(parseSeconds, 6),
+                       'models': models})
+        print("scale %dx: %d rows parsed in %.2f s" %
+              (factor, rows, parseSeconds))
+        for spec in specs:
+            report = models[spec.name]
+            print("  %-14s train %8.3f s  predict %10.0f rows/s" %
+                  (spec.name, report['trainSeconds']['mean'],
+                   report['predictRowsPerSecond'] or 0))
+
+    report = {
+        'commit': gitCommit(),
+        'engine': args.engine,
+        'input': args.input,
+        'rounds': args.rounds,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'host': platform.node(),
+        'scales': scales,
+    }
+    if sc is not None:
+        report['spark'] = sc.version
+        sc.stop()
+    with open(args.output, 'w') as fout:
+        json.dump(report, fout, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        fout.write('\n')
@@ -0,0 +1,237 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Headless bulk collection of meter samples for every matching resource
+
+dataCollection.py collects one resource per run from interactive prompts.
+bulkCollect takes a JSON spec instead, e.g.
+
+    {
+        "openrc": "source /opt/stack/devstack/openrc admin admin",
+        "begin_time": "2016-02-28T00:00:00",
+        "end_time": "now",
+        "output": "fleet",
+        "format": "csv.gz",
+        "types": {
+            "instance": {"meters": ["cpu_util", "disk.*.requests.rate"]},
+            "interface": {"meters": ["network.*.bytes.rate"],
+                          "resource_id": "^instance-"}
+        }
+    }
+
+The meters of all resources are listed once.  A resource is of a type if
+it has meters matching the type's fnmatch patterns, and its id matches
+the type's optional resource_id regular expression.  The matching
+resources are collected in parallel through one Fetcher into one sharded
+dataset per type: output/<type>/<resource> files with the same columns,
+the meters of the type, in the format of writers.py given by the spec
+(arff by default), and a manifest.json listing the shards.
+Shards are collected incrementally from their checkpoints, so the spec
+can be run on a schedule to keep the datasets current.  Without openrc,
+the credentials are taken from the environment.
+"""
+
+from __future__ import print_function
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import re
+import subprocess
+import time
+from multiprocessing.pool import ThreadPool
+from checkpoint import collect_incremental
+from collector import WORKERS, Fetcher, format_time
+from writers import FORMATS, dataset_path
+import metrics
+
+# Resources collected at the same time
+RESOURCE_WORKERS = 4
+
+
+def openrc_environment(source):
+    """Return the environment after running an openrc source command"""
+    dumps = ('/usr/bin/python -c '
+             '"import os, json; print json.dumps(dict(os.environ))"')
+    command = ['/bin/bash', '-c', source + '&&' + dumps]
+    pipe = subprocess.Popen(command, stdout=subprocess.PIPE)
+    return json.loads(pipe.stdout.read())
+
+
+def ceilometer_client(env):
+    """Create an authenticated ceilometer client from OS_* variables"""
+    import ceilometerclient.client
+    return ceilometerclient.client.get_client(
+        "2", os_username=env['OS_USERNAME'],
+        os_password=env['OS_PASSWORD'],
+        os_tenant_name=env['OS_TENANT_NAME'],
+        os_auth_url=env['OS_AUTH_URL'])
+
+
+def read_spec(path):
+    """Read and check a bulk collection spec"""
+    with open(path) as fin:
+        spec = json.load(fin)
+    for key in ('begin_time', 'end_time', 'types'):
+        if key not in spec:
+            raise ValueError("%s: missing %r" % (path, key))
+    if spec.get('format', 'arff') not in FORMATS:
+        raise ValueError("%s: unknown format %r, not one of %s" %
+                         (path, spec['format'], ', '.join(FORMATS)))
+    for name, each in spec['types'].items():
+        if not each.get('meters'):
+            raise ValueError("%s: type %r has no meter patterns" %
+                             (path, name))
+    if spec['end_time'] == 'now':
+        spec['end_time'] = format_time(datetime.datetime.utcnow())
+    return spec
+
+
+def resource_meters(meter_list):
+    """Group a meter listing into {resource_id: set of meter names}"""
+    resources = {}
+    for each in meter_list:
+        resources.setdefault(each.resource_id, set()).add(each.name)
+    return resources
+
+
+def match_types(types, resources):
+    """Return {type: (meters, {resource_id: present meters})}
+
+    The meters of a type are the names matching its patterns on any of
+    its resources, sorted to give every shard the same columns.
+    """
+    matched = {}
+    for name, each in types.items():
+        pattern = each.get('resource_id')
+        shards = {}
+        for resource_id, names in resources.items():
+            if pattern and not re.search(pattern, resource_id):
+                continue
+            present = set(meter for meter in names
+                          if any(fnmatch.fnmatchcase(meter, glob)
+                                 for glob in each['meters']))
+            if present:
+                shards[resource_id] = present
+        if shards:
+            meters = sorted(set.union(*shards.values()))
+            matched[name] = (meters, shards)
+    return matched
+
+
+def shard_name(resource_id, fmt='arff'):
+    """Return a file name for the shard of a resource"""
+    return dataset_path(re.sub(r'[^A-Za-z0-9_.-]', '_', resource_id), fmt)
+
+
+def write_manifest(typeDir, name, meters, shards, fmt='arff'):
+    """Write the columns and shards of the dataset of one type"""
+    manifest = {
+        'type': name,
+        'meters': meters,
+        'format': fmt,
+        'shards': dict((shard_name(resource_id, fmt), resource_id)
+                       for resource_id in shards),
+    }
+    with open(os.path.join(typeDir, 'manifest.json'), 'w') as fout:
+        json.dump(manifest, fout, sort_keys=True, indent=1,
+                  separators=(',', ': '))
+
+
+def run(spec, c_client, workers=WORKERS, resource_workers=RESOURCE_WORKERS,
+        fetcher=None):
+    """Collect every resource matching the spec
+
+    Returns the rows appended per resource per type.  A fetcher may be
+    passed in to read its summary afterwards; it is closed either way.
+    """
+    output = spec.get('output', 'dataset')
+    fmt = spec.get('format', 'arff')
+    matched = match_types(spec['types'],
+                          resource_meters(c_client.meters.list()))
+    tasks = []
+    for name, (meters, shards) in sorted(matched.items()):
+        typeDir = os.path.join(output, name)
+        if not os.path.isdir(typeDir):
+            os.makedirs(typeDir)
+        print("%s: %d resources, meters %s" %
+              (name, len(shards), ', '.join(meters)))
+        for resource_id, present in sorted(shards.items()):
+            tasks.append((name, resource_id, meters, present,
+                          os.path.join(typeDir, shard_name(resource_id, fmt))))
+
+    if fetcher is None:
+        fetcher = Fetcher(c_client, workers)
+
+    def collect(task):
+        name, resource_id, meters, present, path = task
+        try:
+            return task, collect_incremental(
+                fetcher, resource_id, meters, spec['begin_time'],
+                spec['end_time'], path, present=present, fmt=fmt), None
+        except Exception as error:
+            return task, 0, error
+
+    pool = ThreadPool(max(1, min(resource_workers, len(tasks))))
+    rows = {}
+    failed = 0
+    try:
+        for task, count, error in pool.imap_unordered(collect, tasks):
+            if error is not None:
+                failed += 1
+                print("%s %s failed: %s" % (task[0], task[1], error))
+            else:
+                print("%s %s: %d rows" % (task[0], task[1], count))
+            rows.setdefault(task[0], {})[task[1]] = count
+    finally:
+        pool.close()
+        pool.join()
+        fetcher.close()
+    for name, (meters, shards) in matched.items():
+        write_manifest(os.path.join(output, name), name, meters, shards,
+                       fmt)
+    fetcher.print_summary()
+    if failed:
+        raise RuntimeError("%d of %d resources failed" % (failed, len(tasks)))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Collect the meters of all matching resources")
+    parser.add_argument('spec', help="JSON collection spec")
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help="concurrent sample queries")
+    parser.add_argument('--resource-workers', type=int,
+                        default=RESOURCE_WORKERS,
+                        help="resources collected at the same time")
+    parser.add_argument('--metrics-profile', default=None,
+                        help="write the timers and counters of the run to "
+                             "this JSON file")
+    args = parser.parse_args()
+    metrics.enable(args.metrics_profile is not None)
+    spec = read_spec(args.spec)
+    env = (openrc_environment(spec['openrc']) if spec.get('openrc')
+           else os.environ)
+    start = time.time()
+    run(spec, ceilometer_client(env), args.workers, args.resource_workers)
+    print("Bulk collection done in %.1f s" % (time.time() - start))
+    if args.metrics_profile:
+        metrics.dump(args.metrics_profile, arguments=vars(args))
@@ -0,0 +1,365 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+A local stand-in for keystone and the ceilometer v2 API.
+
+Serves the calls ceilometerclient makes for the collectors: keystone v2
+token requests and version discovery, and GET /v2/resources, /v2/meters
+and /v2/samples with q.field/q.op/q.value filters and limit.  It holds
+no data: the T samples of each of N resources x M meters are generated
+on demand from their index, every interval seconds from start, with a
+small per-series offset so meters do not line up exactly.  A fraction
+gap_rate of the samples is left out to exercise gap filling.  Samples are
+returned newest first, as ceilometer does.
+
+Every API request can be delayed by latency plus up to jitter seconds and
+answered with a 503 with probability error_rate.
+
+Usage: python ceilometerStub.py --port 8777 --resources 10 --meters 5 \
+    --samples 1440
+
+then point OS_AUTH_URL at http://127.0.0.1:8777/v2.0 with any user,
+password and tenant.
+"""
+
+from __future__ import print_function
+import argparse
+import BaseHTTPServer
+import SocketServer
+import datetime
+import json
+import random
+import threading
+import time
+import urlparse
+import uuid
+from collector import parse_time, format_time
+
+METERS = ('cpu_util', 'disk.read.requests.rate', 'disk.write.requests.rate',
+          'disk.read.bytes.rate', 'disk.write.bytes.rate',
+          'network.incoming.bytes.rate', 'network.outgoing.bytes.rate',
+          'memory.usage')
+TOKEN_LIFETIME = datetime.timedelta(hours=1)
+
+
+def parse_query(query):
+    """Return the (field, op, value) filters of a ceilometer query string"""
+    params = urlparse.parse_qs(query, keep_blank_values=True)
+    fields = params.get('q.field', [])
+    ops = params.get('q.op', ['eq'] * len(fields))
+    values = params.get('q.value', [])
+    return zip(fields, ops, values)
+
+
+def ceil_div(a, b):
+    return -(-a // b)
+
+
+class Fleet(object):
+    """The synthetic resources, meters and samples"""
+
+    def __init__(self, resources=10, meters=5, samples=1440, interval=60,
+                 start=datetime.datetime(2016, 2, 28), gap_rate=0.0):
+        self.resources = ['resource-%04d' % index
+                          for index in range(resources)]
+        self.meters = [METERS[index] if index < len(METERS)
+                       else 'meter.%d' % index for index in range(meters)]
+        self.samples = samples
+        self.interval = interval
+        self.start = start
+        self.gap_rate = gap_rate
+
+    def offset(self, resource, meter):
+        """Milliseconds by which a series is shifted from the grid"""
+        return (resource * 37 + meter * 11) % 1000
+
+    def present(self, resource, meter, index):
+        if not self.gap_rate:
+            return True
+        draw = ((resource * 1000003 + meter * 10007 + index * 7919) %
+                100003) / 100003.0
+        return draw >= self.gap_rate
+
+    def volume(self, resource, meter, index):
+        return round(50 + 40 * ((resource * 31 + meter * 17 + index * 13) %
+                                101) / 101.0, 3)
+
+    def moment(self, resource, meter, index):
+        return self.start + datetime.timedelta(
+            seconds=index * self.interval,
+            milliseconds=self.offset(resource, meter))
+
+    def series_of(self, filters):
+        """Return the (resource, meter) index pairs matching filters"""
+        resources = range(len(self.resources))
+        meters = range(len(self.meters))
+        for field, op, value in filters:
+            if field == 'resource_id' and op == 'eq':
+                resources = [index for index in resources
+                             if self.resources[index] == value]
+            elif field in ('meter', 'counter_name') and op == 'eq':
+                meters = [index for index in meters
+                          if self.meters[index] == value]
+        return [(resource, meter) for resource in resources
+                for meter in meters]
+
+    def index_range(self, resource, meter, filters):
+        """Return the [low, high) sample indices within the time filters"""
+        low, high = 0, self.samples
+        base = self.moment(resource, meter, 0)
+        step = self.interval * 1000000
+        for field, op, value in filters:
+            if field != 'timestamp':
+                continue
+            delta = parse_time(value) - base
+            micros = (delta.days * 86400 + delta.seconds) * 1000000 + \
+                delta.microseconds
+            if op in ('ge', 'gt'):
+                first = ceil_div(micros, step)
+                if op == 'gt' and first * step == micros:
+                    first += 1
+                low = max(low, first)
+            elif op in ('lt', 'le'):
+                last = micros // step
+                if op == 'lt' and last * step == micros:
+                    last -= 1
+                high = min(high, last + 1)
+        return low, max(low, high)
+
+    def sample(self, resource, meter, index):
+        moment = self.moment(resource, meter, index)
+        return {
+            'id': '%d-%d-%d' % (resource, meter, index),
+            'meter': self.meters[meter],
+            'type': 'gauge',
+            'unit': '%',
+            'volume': self.volume(resource, meter, index),
+            'resource_id': self.resources[resource],
+            'project_id': 'stub-project',
+            'user_id': 'stub-user',
+            'source': 'openstack',
+            'timestamp': format_time(moment),
+            'recorded_at': format_time(moment),
+            'metadata': {},
+        }
+
+    def list_samples(self, filters, limit):
+        """Return at most limit matching samples, newest first"""
+        candidates = []
+        for resource, meter in self.series_of(filters):
+            low, high = self.index_range(resource, meter, filters)
+            count = 0
+            for index in xrange(high - 1, low - 1, -1):
+                if limit and count == limit:
+                    break
+                if self.present(resource, meter, index):
+                    candidates.append((self.moment(resource, meter, index),
+                                       resource, meter, index))
+                    count += 1
+        candidates.sort(reverse=True)
+        if limit:
+            candidates = candidates[:limit]
+        return [self.sample(resource, meter, index)
+                for _, resource, meter, index in candidates]
+
+    def list_meters(self, filters):
+        return [{
+            'name': self.meters[meter],
+            'type': 'gauge',
+            'unit': '%',
+            'resource_id': self.resources[resource],
+            'project_id': 'stub-project',
+            'user_id': 'stub-user',
+            'source': 'openstack',
+            'meter_id': '%d-%d' % (resource, meter),
+        } for resource, meter in self.series_of(filters)]
+
+    def list_resources(self, filters):
+        resources = sorted(set(resource for resource, _ in
+                               self.series_of(filters)))
+        last = format_time(self.moment(0, 0, self.samples - 1))
+        return [{
+            'resource_id': self.resources[resource],
+            'project_id': 'stub-project',
+            'user_id': 'stub-user',
+            'source': 'openstack',
+            'first_sample_timestamp': format_time(self.start),
+            'last_sample_timestamp': last,
+            'metadata': {'display_name': self.resources[resource]},
+            'links': [],
+        } for resource in resources]
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, fleet, latency=0.0, jitter=0.0,
+                 error_rate=0.0, seed=0):
+        BaseHTTPServer.HTTPServer.__init__(self, address, StubHandler)
+        self.fleet = fleet
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def url(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def draw(self):
+        """Return (delay, fail) of the next API request"""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.random.random() * self.jitter
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def versions(self):
+        base = self.server.url()
+        version = {
+            'id': 'v2.0', 'status': 'stable',
+            'links': [{'rel': 'self', 'href': base + '/v2.0/'}],
+            'media-types': [{
+                'base': 'application/json',
+                'type': 'application/vnd.openstack.identity-v2.0+json'}],
+        }
+        return version
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        path = url.path.rstrip('/')
+        if path == '':
+            return self.reply(300, {'versions': {'values': [self.versions()]}})
+        if path == '/v2.0':
+            return self.reply(200, {'version': self.versions()})
+        if not path.startswith('/v2/'):
+            return self.reply(404, {'error_message': 'not found'})
+        delay, fail = self.server.draw()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return self.reply(503, {'error_message': 'injected error'})
+        try:
+            filters = parse_query(url.query)
+            fleet = self.server.fleet
+            if path == '/v2/samples':
+                limit = int(urlparse.parse_qs(url.query).get('limit',
+                                                             ['0'])[0])
+                return self.reply(200, fleet.list_samples(filters, limit))
+            if path == '/v2/meters':
+                return self.reply(200, fleet.list_meters(filters))
+            if path == '/v2/resources':
+                return self.reply(200, fleet.list_resources(filters))
+        except ValueError as error:
+            return self.reply(400, {'error_message': str(error)})
+        return self.reply(404, {'error_message': 'not found'})
+
+    def do_POST(self):
+        path = urlparse.urlparse(self.path).path.rstrip('/')
+        length = int(self.headers.getheader('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or '{}')
+        if path != '/v2.0/tokens':
+            return self.reply(404, {'error_message': 'not found'})
+        tenant = body.get('auth', {}).get('tenantName', 'stub')
+        expires = datetime.datetime.utcnow() + TOKEN_LIFETIME
+        base = self.server.url()
+        endpoint = {'publicURL': base, 'internalURL': base,
+                    'adminURL': base, 'region': 'RegionOne',
+                    'id': 'stub-endpoint'}
+        self.reply(200, {'access': {
+            'token': {'id': uuid.uuid4().hex,
+                      'issued_at': format_time(datetime.datetime.utcnow()),
+                      'expires': expires.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                      'tenant': {'id': 'stub-project', 'name': tenant,
+                                 'enabled': True}},
+            'serviceCatalog': [
+                {'type': 'metering', 'name': 'ceilometer',
+                 'endpoints': [endpoint], 'endpoints_links': []},
+                {'type': 'identity', 'name': 'keystone',
+                 'endpoints': [dict(endpoint, publicURL=base + '/v2.0',
+                                    internalURL=base + '/v2.0',
+                                    adminURL=base + '/v2.0')],
+                 'endpoints_links': []},
+            ],
+            'user': {'id': 'stub-user', 'name': 'stub', 'roles': [],
+                     'roles_links': []},
+            'metadata': {'is_admin': 0, 'roles': []},
+        }})
+
+
+def serve(port=8777, host='127.0.0.1', **options):
+    """Start a stub server in a daemon thread and return it"""
+    fleet_options = dict((name, options.pop(name))
+                         for name in ('resources', 'meters', 'samples',
+                                      'interval', 'start', 'gap_rate')
+                         if name in options)
+    server = StubServer((host, port), Fleet(**fleet_options), **options)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve synthetic keystone and ceilometer v2 APIs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8777)
+    parser.add_argument('--resources', type=int, default=10)
+    parser.add_argument('--meters', type=int, default=5)
+    parser.add_argument('--samples', type=int, default=1440,
+                        help="samples of each resource and meter")
+    parser.add_argument('--interval', type=int, default=60,
+                        help="seconds between two samples of a series")
+    parser.add_argument('--start', default='2016-02-28T00:00:00')
+    parser.add_argument('--gap-rate', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds added to every API request")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="fraction of API requests answered with 503")
+    args = parser.parse_args()
+    server = StubServer(
+        (args.host, args.port),
+        Fleet(args.resources, args.meters, args.samples, args.interval,
+              parse_time(args.start), args.gap_rate),
+        args.latency, args.jitter, args.error_rate)
+    print("Serving %d resources x %d meters x %d samples on %s" %
+          (args.resources, args.meters, args.samples, server.url()))
+    server.serve_forever()
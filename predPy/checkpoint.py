@@ -0,0 +1,182 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Checkpointed, incremental collection of meter samples
+
+A collection run used to fetch the whole range again and overwrite its
+dataset.  collect_incremental keeps a JSON checkpoint next to the dataset
+with the timestamp of the last collected sample of every (resource_id,
+meter) and the length of the dataset, in bytes or rows of its format.  A
+run fetches only the samples after the checkpointed timestamps and
+appends their rows.
+
+The last rows of a run can still change with the samples of the next
+one: the resampling bucket open at the end of the range, and the rows
+within tolerance of its end.  They are written, so that the dataset is
+the full collection of the range, but left out of the checkpoint; the
+next run truncates them and collects them again with the new samples.
+The values FILL_PREVIOUS carries forward are checkpointed too.
+
+The checkpoint is written atomically, by renaming a synced temporary
+file, and only after the rows it covers are synced to the dataset.  A run
+that finds the dataset longer than its checkpoint was interrupted and
+truncates the partial rows before it resumes, so a crash leaves neither
+a gap nor duplicate rows.
+"""
+
+from __future__ import print_function
+import json
+import os
+from collector import (FILL_MISSING, PAGE_SIZE, TOLERANCE, WINDOW,
+                       format_time, iter_batches, merge_series, parse_time)
+from writers import WRITERS, open_writer
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+# Rows appended between two checkpoints of a long run
+CHECKPOINT_ROWS = 10000
+
+
+def checkpoint_path(path):
+    return path + CHECKPOINT_SUFFIX
+
+
+def read_checkpoint(path):
+    """Return the checkpoint of the dataset at path, None if it has none"""
+    try:
+        with open(checkpoint_path(path)) as fin:
+            return json.load(fin)
+    except IOError:
+        return None
+
+
+def write_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint of the dataset at path"""
+    target = checkpoint_path(path)
+    temporary = target + '.tmp'
+    with open(temporary, 'w') as fout:
+        json.dump(checkpoint, fout, sort_keys=True, indent=1,
+                  separators=(',', ': '))
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.rename(temporary, target)
+
+
+def resume(path, resource_id, meters, fmt='arff'):
+    """Return the checkpoint to append to, or None to start over
+
+    A dataset longer than its checkpoint is truncated to the checkpointed
+    length, in the bytes or rows of its format.  A dataset without a
+    checkpoint, or of other series or format, is collected again from
+    scratch.
+    """
+    checkpoint = read_checkpoint(path)
+    if checkpoint is None or not os.path.exists(path):
+        return None
+    if (checkpoint['resource_id'] != resource_id or
+            checkpoint['meters'] != list(meters) or
+            checkpoint.get('format', 'arff') != fmt):
+        print("%s holds other meters, collecting it again" % path)
+        return None
+    writer = WRITERS[fmt]
+    length = writer.size(path)
+    if length < checkpoint['length']:
+        raise IOError("%s is shorter than its checkpoint" % path)
+    if length > checkpoint['length']:
+        print("Truncating %d past the checkpoint from %s" %
+              (length - checkpoint['length'], path))
+        writer.truncate(path, checkpoint['length'])
+    return checkpoint
+
+
+def after(samples, last):
+    """Skip the samples of a meter up to the timestamp last"""
+    if last is None:
+        return samples
+    last = parse_time(last)
+    return [each for each in samples if parse_time(each.timestamp) > last]
+
+
+def is_closed(moment, end, tolerance, resample):
+    """Whether no sample at or after end can change the row at moment"""
+    if resample is not None:
+        return moment + resample <= end
+    return moment + tolerance < end
+
+
+def collect_incremental(fetcher, resource_id, meters, begin_time, end_time,
+                        path, page_size=PAGE_SIZE, window=WINDOW,
+                        tolerance=TOLERANCE, resample=None, fill=FILL_MISSING,
+                        checkpoint_rows=CHECKPOINT_ROWS, present=None,
+                        fmt='arff'):
+    """Append the samples after the checkpoint to the dataset at path
+
+    present is the subset of meters the resource has, all by default;
+    the others are left missing without querying them.  fmt is one of
+    writers.FORMATS.  Returns the number of rows appended, the rows left
+    out of the checkpoint included.
+    """
+    meters = list(meters)
+    present = set(meters if present is None else present)
+    checkpoint = resume(path, resource_id, meters, fmt)
+    append = checkpoint is not None
+    if not append:
+        checkpoint = {'resource_id': resource_id, 'meters': meters,
+                      'format': fmt, 'last': [None] * len(meters),
+                      'length': 0}
+    last = list(checkpoint['last'])
+    previous = list(checkpoint.get('previous', [None] * len(meters)))
+    # Fetch from the oldest checkpointed timestamp, each meter after its own
+    collected = [parse_time(each) for meter, each in zip(meters, last)
+                 if meter in present and each is not None]
+    if collected and len(collected) == len(present):
+        begin_time = format_time(max(parse_time(begin_time),
+                                     min(collected)))
+    series = [(resource_id, meter if meter in present else None)
+              for meter in meters]
+    batches = iter_batches(fetcher, series, begin_time, end_time, page_size,
+                           window)
+    batches = ([after(samples, each) for samples, each in zip(batch, last)]
+               for batch in batches)
+
+    def commit(state):
+        checkpoint['length'] = writer.sync()
+        checkpoint['last'], checkpoint['previous'] = state
+        write_checkpoint(path, checkpoint)
+
+    end = parse_time(end_time)
+    closed = True
+    state = list(last), list(previous)
+    writer = open_writer(fmt, path, meters, append)
+    try:
+        for row in merge_series(batches, len(series), tolerance, resample,
+                                fill, last, previous):
+            if closed and not is_closed(row[0], end, tolerance, resample):
+                # This row and the next ones are collected again next run
+                commit(state)
+                closed = False
+            writer.write(*row)
+            if closed:
+                state = list(last), list(previous)
+                if writer.count % checkpoint_rows == 0:
+                    commit(state)
+        if closed:
+            commit(state)
+    finally:
+        writer.close()
+    return writer.count
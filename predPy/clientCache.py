@@ -0,0 +1,140 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Cached ceilometer clients and listings for the web collector.
+
+Sourcing an openrc costs two subprocesses and building a client costs a
+keystone authentication, so ClientCache keeps one client per openrc
+source.  The environment of a source is dumped once; a client is rebuilt
+from it, without any subprocess, when its token is about to expire.  The
+expiry is read from the keystone auth reference where the client exposes
+one, and otherwise assumed TOKEN_LIFETIME after the client was built.
+
+TTLCache keeps resource and meter listings for ttl seconds, so page loads
+within that time make no API calls.  Both caches can be invalidated
+explicitly, per key or entirely.
+"""
+
+import datetime
+import threading
+import time
+from bulkCollect import ceilometer_client, openrc_environment
+
+# Keystone's default token lifetime, used when a client hides its expiry
+TOKEN_LIFETIME = 3600
+# Tokens expiring within this many seconds are refreshed before use
+TOKEN_MARGIN = 300
+LISTING_TTL = 300
+
+# Attribute paths where ceilometerclient versions keep the auth reference
+AUTH_REF_PATHS = (
+    ('auth_plugin', 'auth_ref'),
+    ('http_client', 'auth_plugin', 'auth_ref'),
+    ('http_client', 'session', 'auth', 'auth_ref'),
+)
+
+
+def token_expiry(client):
+    """Return the token expiry of a client in epoch seconds, or None"""
+    for path in AUTH_REF_PATHS:
+        value = client
+        for name in path:
+            value = getattr(value, name, None)
+        expires = getattr(value, 'expires', None)
+        if isinstance(expires, datetime.datetime):
+            if expires.tzinfo is not None:
+                expires = (expires.replace(tzinfo=None) -
+                           expires.utcoffset())
+            return (expires - datetime.datetime(1970, 1, 1)).total_seconds()
+    return None
+
+
+class ClientCache(object):
+    """Authenticated ceilometer clients by openrc source"""
+
+    def __init__(self, margin=TOKEN_MARGIN, lifetime=TOKEN_LIFETIME):
+        self.margin = margin
+        self.lifetime = lifetime
+        self.environments = {}
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def environment(self, source):
+        """Return the environment of an openrc source, dumped once"""
+        with self.lock:
+            env = self.environments.get(source)
+        if env is None:
+            env = openrc_environment(source)
+            with self.lock:
+                self.environments[source] = env
+        return env
+
+    def get(self, source):
+        """Return a client of the source with a token that is not expiring"""
+        with self.lock:
+            cached = self.clients.get(source)
+        if cached is not None and cached[1] - self.margin > time.time():
+            return cached[0]
+        client = ceilometer_client(self.environment(source))
+        expires = token_expiry(client) or time.time() + self.lifetime
+        with self.lock:
+            self.clients[source] = (client, expires)
+        return client
+
+    def invalidate(self, source=None):
+        """Forget the client, and environment, of a source or of all"""
+        with self.lock:
+            if source is None:
+                self.clients.clear()
+                self.environments.clear()
+            else:
+                self.clients.pop(source, None)
+                self.environments.pop(source, None)
+
+
+class TTLCache(object):
+    """Values loaded on demand and kept for ttl seconds"""
+
+    def __init__(self, ttl=LISTING_TTL):
+        self.ttl = ttl
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, load):
+        """Return the value of key, calling load() when missing or stale"""
+        with self.lock:
+            cached = self.values.get(key)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+        value = load()
+        with self.lock:
+            self.values[key] = (value, time.time() + self.ttl)
+        return value
+
+    def invalidate(self, match=None):
+        """Drop the keys for which match(key) is true, all by default
+
+        Returns the number of dropped keys.
+        """
+        with self.lock:
+            keys = [key for key in self.values
+                    if match is None or match(key)]
+            for key in keys:
+                del self.values[key]
+        return len(keys)
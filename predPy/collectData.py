@@ -23,23 +23,72 @@ ceilometer server
 
 # Import modules
 import web
-import subprocess
-import ceilometerclient.client
+import os
 import json
-import readline  # It automatically wraps studin
+from clientCache import ClientCache, TTLCache
+from collectJobs import JOB_RETENTION, JobQueue
+from modelStore import listModels
+from scorer import ScorerRegistry
+import metrics
 
 urls = (
     '/', 'Index',
     '/meter', 'Meter',
-    '/sample', 'Sample'
+    '/sample', 'Sample',
+    '/jobs', 'Jobs',
+    '/job/([0-9a-f]+)', 'Job',
+    '/job/([0-9a-f]+)/download', 'Download',
+    '/score', 'Score',
+    '/refresh', 'Refresh',
+    '/metrics', 'Metrics'
 )
 
 app = web.application(urls, globals())
 
-# Global variables
-c_client = None
-resource_id_list = []
-resource_id = None
+# Record the metrics of the collection jobs for /metrics
+metrics.enable()
+
+# The openrc source and the chosen resource of each browser session, kept
+# across the reloads of the debug mode
+if web.config.get('_session') is None:
+    session = web.session.Session(
+        app, web.session.DiskStore('sessions'),
+        initializer={'source': None, 'resource_id': None})
+    web.config._session = session
+else:
+    session = web.config._session
+
+# Clients by openrc source, resource and meter listings by source
+clients = ClientCache()
+listings = TTLCache()
+
+
+def list_resource_ids(source):
+    """Return the cached resource ids visible with an openrc source"""
+    return listings.get(
+        ('resources', source),
+        lambda: [each.resource_id
+                 for each in clients.get(source).resources.list()])
+
+
+def list_meter_names(source, resource_id):
+    """Return the cached meter names of a resource"""
+    query_meter = [dict(field='resource_id', op='eq', value=resource_id)]
+    return listings.get(
+        ('meters', source, resource_id),
+        lambda: [each.name
+                 for each in clients.get(source).meters.list(q=query_meter)])
+
+
+# Collections running in the background, each into its own file
+jobs = JobQueue(os.environ.get('COLLECTION_JOB_DIR', 'jobs'),
+                retention=int(os.environ.get('COLLECTION_JOB_RETENTION',
+                                             JOB_RETENTION)))
+DOWNLOAD_CHUNK = 1 << 16
+DOWNLOAD_TYPES = {'arff': 'text/plain', 'csv.gz': 'application/gzip'}
+
+# Scorers of the models saved by predictor.py --save-dir
+scorers = ScorerRegistry(os.environ.get('PREDICTION_MODEL_DIR', 'models'))
 
 render = web.template.render('templates', base="layout")
 
@@ -50,147 +99,139 @@ class Index(object):
 
     def POST(self):
         form = web.input(content=None)
-        dumps = ('/usr/bin/python -c '
-                 '"import os, json; print json.dumps(dict(os.environ))"')
-        command = ['/bin/bash', '-c', form.content + '&&' + dumps]
-        pipe = subprocess.Popen(command, stdout=subprocess.PIPE)
-        env = json.loads(pipe.stdout.read())
-
-        # Create an authenticated ceilometer client
-        global c_client
-        c_client = ceilometerclient.client.get_client(
-            "2", os_username=env['OS_USERNAME'],
-            os_password=env['OS_PASSWORD'],
-            os_tenant_name=env['OS_TENANT_NAME'],
-            os_auth_url=env['OS_AUTH_URL'])
-
-        resource_list = c_client.resources.list()
-        resourceInfo = open("templates/resourceInfo.html", "w")
-        index = 0
-        resourceInfo.write("<h2>All resource ids which can be measured "
-                           "are listed as follows:</h2>")
-        resourceInfo.write("<ol>\n")
-        for each in resource_list:
-            resourceInfo.write("  <li>resource_id_list[%d]: %s</li>\n" %
-                               (index, each.resource_id))
-            index += 1
-            global resource_id_list
-            resource_id_list.append(each.resource_id)
-        resourceInfo.write("</ol>\n")
-        resourceInfo.write(
-            "<h2>The following shows resources corresponding to resource ids: "
-            "</h2><ul>\n"
-            "  <li>resource_id_list[0:3] represents image ids</li> \n"
-            "  <li>resource_id_list[3] represents instance ids</li> \n"
-            "  <li>resource_id_list[4:6] represents disk ids</li> \n"
-            "  <li>resource_id_list[6] represents interface ids</li> \n"
-            "</ul><h2>So you can collect what kind of data you like."
-            "Just type the number from 0 to 6</h2>"
-        )
-
-        resourceInfo.write(
-            '<form action="/meter" method="POST" height=29px> \n'
-            '<input type="text" name="number" width=200px>\n'
-            '<input type="submit" value="Submit Number" class="button">\n'
-            '</form>'
-        )
-        resourceInfo.close()
-        return render.resourceInfo()
+        session.source = form.content
+        resource_id_list = list_resource_ids(form.content)
+        return render.resourceInfo(resource_id_list)
 
 
 class Meter(object):
     def POST(self):
         form = web.input(number=None)
         input_number = int(form.number)
-        global resource_id
-        resource_id = resource_id_list[input_number]
-        query_meter = [dict(field='resource_id', op='eq', value=resource_id)]
-        meter_list = c_client.meters.list(q=query_meter)
-        meter_name_list = []
-        metersInfo = open("templates/metersInfo.html", "w")
-        metersInfo.write(
-            '<h2>List meter names related with the resource id--%s as '
-            'follows:</h2>\n' % resource_id)
-        metersInfo.write("<ol>\n")
-        for each in meter_list:
-            metersInfo.write("  <li>%s</li>\n" % each.name)
-            meter_name_list.append(each.name)
-        metersInfo.write("</ol>\n")
-        metersInfo.write(
-            "\n<p>You can collect whatever meters you like just by typing "
-            "the meter names and using ',' as the separator,\n e.g., "
-            "disk.read.requests.rate, disk.write.requests.rate, "
-            "disk.read.bytes.rate, disk.write.bytes.rate, cpu_util.</p>")
-        metersInfo.write(
-            "<p>At the same time, you need to specify the beginning time and "
-            "the end time for the collection. \nThe time format is fixed, "
-            "e.g., 2016-02-28T00:00:00.</p>")
-
-        metersInfo.write(
-            '<form action="/sample" method="POST" height=29px>\n'
-            'Meters:<input type="text" name="sample" class="input-box">\n'
-            '<br> \n'
-            'Begin Time:<input type="text" name="begin_time" class="input-box">'
-            '<br> \n'
-            'End Time:<input type="text" name="end_time" class="input-box"> \n'
-            '<br> \n'
-            '<input type="submit" value="Submit" class="button">'
-        )
-        metersInfo.close()
-        return render.metersInfo()
+        resource_id = list_resource_ids(session.source)[input_number]
+        session.resource_id = resource_id
+        return render.metersInfo(
+            resource_id, list_meter_names(session.source, resource_id))
 
 
 class Sample(object):
     def POST(self):
-        form = web.input(sample=None, begin_time=None, end_time=None)
+        form = web.input(sample=None, begin_time=None, end_time=None,
+                         format='arff')
+        if session.source is None or session.resource_id is None:
+            raise web.badrequest("Choose an openrc source and a resource "
+                                 "before collecting samples")
+        if not form.sample:
+            raise web.badrequest("No meters given")
         input_meters = form.sample
         collect_meters = input_meters.split(",")
         collect_meters = [meter.strip() for meter in collect_meters]
 
-        collect_meter_samples = []
-        for each in collect_meters:
-            query = [
-                dict(field='resource_id', op='eq', value=resource_id),
-                dict(field='timestamp', op='ge', value=form.begin_time),
-                dict(field='timestamp', op='lt', value=form.end_time),
-                dict(field='meter', op='eq', value=each)
-            ]
-            (collect_meter_samples.
-                append(c_client.new_samples.list(q=query, limit=1000)))
-        # append(c_client.samples.list(each, limit=1000)))
-        fout = open('collectMeterSamples.arff', 'w')
-        head_info = ("% ARFF file for the collected meter samples "
-                     "with some numeric feature from ceilometer API. \n \n"
-                     "@relation  collected samples for VMs on host \n \n"
-                     "@attribute timestample \n"
-                     "@attribute resource id \n")
-
-        for each in collect_meters:
-            head_info = head_info + "@attribute  %s \n" % each
-
-        head_info = head_info + "@data \n \n"
-        fout.write(head_info)
-
-        count = 0
-        collect_meter_sample_values = []
-        for each in collect_meter_samples[1:]:
-            each_sample_value = []
-            for i in each:
-                # each_sample_value.append(str(i.counter_volume))
-                each_sample_value.append(str(i.volume))
-            collect_meter_sample_values.append(each_sample_value)
-
-        for each in collect_meter_samples[0]:
-            fout.write(each.timestamp + ', ' + each.resource_id)
-            # fout.write(', ' + str(each.counter_volume))
-            fout.write(', ' + str(each.volume))
-            for i in collect_meter_sample_values:
-                fout.write(', ' + i[count])
-                fout.write('\n')
-            count += 1
-
-        fout.close()
-        return render.meterSamples(count=count)
+        try:
+            job_id = jobs.submit(clients.get(session.source),
+                                 session.resource_id, collect_meters,
+                                 form.begin_time, form.end_time,
+                                 form.format)
+        except (ValueError, AttributeError) as error:
+            raise web.badrequest(str(error))
+        return render.meterSamples(jobs.status(job_id))
+
+
+class Jobs(object):
+    """List the collection jobs"""
+    def GET(self):
+        web.header('Content-Type', 'application/json')
+        return json.dumps({'jobs': jobs.list()})
+
+
+class Job(object):
+    """Report the state and progress of a collection job
+
+    JSON by default, the collection page with html=1.
+    """
+    def GET(self, job_id):
+        job = jobs.status(job_id)
+        if job is None:
+            raise web.notfound()
+        if web.input(html=None).html:
+            return render.meterSamples(job)
+        web.header('Content-Type', 'application/json')
+        return json.dumps(job)
+
+
+class Download(object):
+    """Stream the ARFF file of a finished collection job"""
+    def GET(self, job_id):
+        job = jobs.status(job_id)
+        if job is None:
+            raise web.notfound()
+        if job['state'] != 'done':
+            raise web.badrequest("job %s is %s" % (job_id, job['state']))
+        path = jobs.path(job_id)
+        web.header('Content-Type', DOWNLOAD_TYPES[job['format']])
+        web.header('Content-Disposition',
+                   'attachment; filename="%s"' % os.path.basename(path))
+        with open(path, 'rb') as fin:
+            while True:
+                chunk = fin.read(DOWNLOAD_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+
+
+class Score(object):
+    """Score SMART records with a stored model
+
+    POST a JSON body {"model": name, "records": [csv row, ...]} with rows
+    in the harddrive1.csv layout; GET lists the models and scorer stats.
+    """
+    def GET(self):
+        web.header('Content-Type', 'application/json')
+        stats = dict((name, each.stats())
+                     for name, each in scorers.scorers.items())
+        return json.dumps({'models': listModels(scorers.storeDir),
+                           'stats': stats})
+
+    def POST(self):
+        web.header('Content-Type', 'application/json')
+        try:
+            body = json.loads(web.data())
+            scorer = scorers.get(body['model'])
+            predictions, scores = scorer.score(body['records'])
+        except (ValueError, KeyError, TypeError, IOError, OSError) as error:
+            raise web.badrequest(json.dumps({'error': str(error)}))
+        except RuntimeError as error:
+            # The scorer timed out or was replaced by a newer model
+            raise web.HTTPError('503 Service Unavailable',
+                                {'Content-Type': 'application/json',
+                                 'Retry-After': '1'},
+                                json.dumps({'error': str(error)}))
+        return json.dumps({'model': body['model'],
+                           'predictions': predictions,
+                           'scores': scores})
+
+
+class Refresh(object):
+    """Invalidate the cached listings of the session's openrc source
+
+    POST client=1 to rebuild its client as well.
+    """
+    def POST(self):
+        form = web.input(client=None)
+        web.header('Content-Type', 'application/json')
+        source = session.source
+        dropped = listings.invalidate(lambda key: key[1] == source)
+        if form.client:
+            clients.invalidate(source)
+        return json.dumps({'invalidated': dropped,
+                           'client': bool(form.client)})
+
+
+class Metrics(object):
+    """The metrics of this process in the Prometheus text format"""
+    def GET(self):
+        web.header('Content-Type', 'text/plain; version=0.0.4')
+        return metrics.exposition()
 
 
 if __name__ == "__main__":
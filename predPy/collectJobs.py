@@ -0,0 +1,164 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Background collection jobs of the web collector.
+
+Sample.POST used to fetch and write a whole collection inside the request
+handler, into the same collectMeterSamples.arff for every user.  A
+JobQueue runs collections on a bounded pool of worker threads instead.
+Every job gets a uuid and its own output file in workDir, ARFF or gzip
+CSV, and keeps its state, row count and progress through the time range
+so handlers can report on it while it runs.  Only the last `retention`
+finished jobs are kept; older ones are forgotten and their output files
+removed when a new job is submitted.
+
+The jobs of a queue usually share one ceilometer client, so each job's
+Fetcher gets an equal share of the collector.WORKERS concurrent requests
+a client can pool instead of WORKERS of its own.
+"""
+
+import os
+import threading
+import time
+import uuid
+from multiprocessing.pool import ThreadPool
+from collector import (WORKERS, Fetcher, iter_batches, merge_series,
+                       parse_time)
+from writers import CsvWriter, dataset_path, open_writer
+
+JOB_WORKERS = 4
+# Finished jobs kept, with their output files
+JOB_RETENTION = 100
+# Formats a job can be downloaded in
+SINGLE_FILE_FORMATS = ('arff', 'csv.gz')
+# Rows written between two progress updates
+PROGRESS_ROWS = 100
+
+
+class JobQueue(object):
+    """Collections run by a bounded pool, by job id"""
+
+    def __init__(self, workDir='jobs', workers=JOB_WORKERS,
+                 retention=JOB_RETENTION, fetch_workers=None):
+        self.workDir = workDir
+        self.retention = retention
+        if fetch_workers is None:
+            fetch_workers = max(1, WORKERS // workers)
+        self.fetch_workers = fetch_workers
+        self.pool = ThreadPool(workers)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        if not os.path.isdir(workDir):
+            os.makedirs(workDir)
+
+    def submit(self, c_client, resource_id, meters, begin_time, end_time,
+               fmt='arff'):
+        """Queue a collection into a dataset of format fmt, return its id"""
+        # Parse the range now to reject bad times in the request
+        parse_time(begin_time), parse_time(end_time)
+        if fmt not in SINGLE_FILE_FORMATS:
+            raise ValueError("unknown format %r, not one of %s" %
+                             (fmt, ', '.join(SINGLE_FILE_FORMATS)))
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'state': 'queued',
+            'resource_id': resource_id,
+            'meters': list(meters),
+            'begin_time': begin_time,
+            'end_time': end_time,
+            'format': fmt,
+            'rows': 0,
+            'progress': 0.0,
+            'submitted': time.time(),
+            'error': None,
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+        self.pool.apply_async(self.run, (job_id, c_client))
+        self.prune()
+        return job_id
+
+    def prune(self):
+        """Forget the oldest finished jobs beyond retention, and their files"""
+        with self.lock:
+            finished = sorted((job for job in self.jobs.values()
+                               if 'finished' in job),
+                              key=lambda job: job['finished'])
+            expired = finished[:max(0, len(finished) - self.retention)]
+            for job in expired:
+                del self.jobs[job['id']]
+        for job in expired:
+            path = dataset_path(os.path.join(self.workDir, job['id']),
+                                job['format'])
+            for name in (path, CsvWriter.keys_path(path)):
+                if os.path.exists(name):
+                    os.remove(name)
+        return len(expired)
+
+    def path(self, job_id):
+        """Return the output file of a job"""
+        return dataset_path(os.path.join(self.workDir, job_id),
+                            self.status(job_id)['format'])
+
+    def status(self, job_id):
+        """Return a copy of the state of a job, None if it is unknown"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list(self):
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def update(self, job_id, **changes):
+        with self.lock:
+            self.jobs[job_id].update(changes)
+
+    def run(self, job_id, c_client):
+        """Collect one job into its output file"""
+        job = self.status(job_id)
+        self.update(job_id, state='running', started=time.time())
+        begin = parse_time(job['begin_time'])
+        span = max(1.0, (parse_time(job['end_time']) -
+                         begin).total_seconds())
+        fetcher = Fetcher(c_client, workers=self.fetch_workers)
+        try:
+            series = [(job['resource_id'], meter) for meter in job['meters']]
+            batches = iter_batches(fetcher, series, job['begin_time'],
+                                   job['end_time'])
+            writer = open_writer(job['format'], self.path(job_id),
+                                 job['meters'])
+            try:
+                for row in merge_series(batches, len(series)):
+                    writer.write(*row)
+                    if writer.count % PROGRESS_ROWS == 0:
+                        done = (row[0] - begin).total_seconds()
+                        self.update(job_id, rows=writer.count,
+                                    progress=min(1.0, done / span))
+            finally:
+                writer.close()
+            self.update(job_id, state='done', rows=writer.count,
+                        progress=1.0)
+        except Exception as error:
+            self.update(job_id, state='failed', error=str(error))
+        finally:
+            fetcher.close()
+            self.update(job_id, finished=time.time(),
+                        fetch=fetcher.summary())
@@ -0,0 +1,415 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Paginated, streaming collection of ceilometer meter samples
+
+new_samples.list returns at most `limit` samples, newest first, so a
+single query with limit=1000 silently drops everything older than the
+thousandth sample of a meter.  iter_samples walks the collection range in
+ascending time windows and pages backwards through each window with a
+timestamp cursor until it is exhausted.  Samples sharing the cursor
+timestamp are fetched again by the next page and dropped by their sample
+id.  At most two windows of the collected meters are held in memory.
+
+A Fetcher sends the queries through one shared, authenticated client
+from a bounded thread pool.  iter_batches fetches each window of all
+meters concurrently and prefetches the next window while the current one
+is written, so a collection is no longer a sequence of round trips.
+Queries failing with a server error are retried with exponential backoff,
+and the fetcher keeps the latency and throughput of the run.
+
+merge_series joins the k meters on timestamp with a heap in one
+O(n log k) pass, either taking the samples within a tolerance of each
+other as a row or averaging them in fixed resampling intervals, and fills
+the gaps of a meter by an explicit policy.  The windows are merged one
+after another, so a meter without samples does not make the others
+buffer ahead.  collect streams the merged
+rows into a dataset through a writer of writers.py, so the memory of a
+collection does not grow with the length of its range.
+"""
+
+from __future__ import print_function
+import collections
+# Imported lazily by strptime, which races in threads
+import _strptime  # noqa: F401
+import datetime
+import heapq
+import random
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from writers import open_writer
+import metrics
+
+PAGE_SIZE = 1000
+WINDOW = datetime.timedelta(hours=1)
+# Stays below the 10 pooled connections per host of the HTTP session
+WORKERS = 8
+RETRIES = 5
+BACKOFF = 0.5
+# Samples of one polling cycle differ by fractions of a second
+TOLERANCE = datetime.timedelta(seconds=5)
+FILL_MISSING = 'missing'
+FILL_PREVIOUS = 'previous'
+FILL_DROP = 'drop'
+EPOCH = datetime.datetime(1970, 1, 1)
+TIME_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S')
+
+
+def parse_time(value):
+    """Parse a ceilometer timestamp, e.g. 2016-02-28T00:00:00"""
+    value = value.rstrip('Z')
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, time_format)
+        except ValueError:
+            pass
+    raise ValueError("unknown timestamp format: %r" % value)
+
+
+def format_time(value):
+    """Format a datetime as a ceilometer query timestamp"""
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+def sample_id(sample):
+    """Return the unique id of a sample"""
+    return getattr(sample, 'id', None) or getattr(sample, 'message_id', None)
+
+
+def sample_query(resource_id, meter, begin, end, end_op='lt'):
+    """Return the query of the samples of one meter in [begin, end)"""
+    return [
+        dict(field='resource_id', op='eq', value=resource_id),
+        dict(field='timestamp', op='ge', value=format_time(begin)),
+        dict(field='timestamp', op=end_op, value=format_time(end)),
+        dict(field='meter', op='eq', value=meter)
+    ]
+
+
+def status_code(error):
+    """Return the HTTP status of a client error, None if it has none"""
+    for name in ('code', 'status_code', 'http_status'):
+        code = getattr(error, name, None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def percentile(values, q):
+    """Return the q-th percentile of a sorted list"""
+    return values[min(len(values) - 1, int(len(values) * q / 100.0))]
+
+
+class Fetcher(object):
+    """Concurrent, retrying sample queries through one shared client"""
+
+    def __init__(self, c_client, workers=WORKERS, retries=RETRIES,
+                 backoff=BACKOFF):
+        self.c_client = c_client
+        self.retries = retries
+        self.backoff = backoff
+        self.pool = ThreadPool(workers)
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.samples = 0
+        self.retried = 0
+        self.started = time.time()
+
+    def list_samples(self, query, limit):
+        """Run one sample query, backing off on server errors"""
+        for attempt in range(self.retries + 1):
+            start = time.time()
+            try:
+                page = self.c_client.new_samples.list(q=query, limit=limit)
+            except Exception as error:
+                code = status_code(error)
+                if attempt == self.retries or code is None or code < 500:
+                    metrics.count('collector_errors_total', status=code)
+                    raise
+                with self.lock:
+                    self.retried += 1
+                metrics.count('collector_retries_total', status=code)
+                time.sleep(self.backoff * 2 ** attempt *
+                           (0.5 + random.random()))
+                continue
+            elapsed = time.time() - start
+            with self.lock:
+                self.latencies.append(elapsed)
+                self.samples += len(page)
+            metrics.observe('collector_request_seconds', elapsed)
+            metrics.count('collector_samples_total', len(page))
+            return page
+
+    def map_async(self, function, items):
+        """Apply function to the items in the pool"""
+        return self.pool.map_async(function, items)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def summary(self):
+        """Return the request latencies and throughput of the run"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            samples, retried = self.samples, self.retried
+        seconds = time.time() - self.started
+        summary = {'requests': len(latencies), 'samples': samples,
+                   'retries': retried, 'seconds': seconds,
+                   'samples_per_second': samples / seconds if seconds else 0}
+        if latencies:
+            summary['p50_ms'] = percentile(latencies, 50) * 1000.0
+            summary['p99_ms'] = percentile(latencies, 99) * 1000.0
+        return summary
+
+    def print_summary(self):
+        summary = self.summary()
+        print("%d requests (%d retried), %d samples in %.1f s: "
+              "%.0f samples/s, latency p50 %.0f ms, p99 %.0f ms" %
+              (summary['requests'], summary['retries'], summary['samples'],
+               summary['seconds'], summary['samples_per_second'],
+               summary.get('p50_ms', 0), summary.get('p99_ms', 0)))
+
+
+def iter_window(fetcher, resource_id, meter, begin, end,
+                page_size=PAGE_SIZE):
+    """Yield the samples of one meter in [begin, end), newest first"""
+    cursor, end_op = end, 'lt'
+    seen = set()
+    while True:
+        query = sample_query(resource_id, meter, begin, cursor, end_op)
+        page = fetcher.list_samples(query, page_size)
+        fresh = [each for each in page if sample_id(each) not in seen]
+        for each in fresh:
+            yield each
+        if len(page) < page_size:
+            return
+        oldest = parse_time(page[-1].timestamp)
+        if not fresh:
+            raise RuntimeError(
+                "more than %d samples of %s at %s, raise the page size" %
+                (page_size, meter, page[-1].timestamp))
+        # Only the ids at the cursor timestamp can be returned again
+        if oldest != cursor:
+            seen = set()
+        seen.update(sample_id(each) for each in fresh
+                    if parse_time(each.timestamp) == oldest)
+        cursor, end_op = oldest, 'le'
+
+
+def time_windows(begin_time, end_time, window=WINDOW):
+    """Return the consecutive [begin, end) windows covering the range"""
+    begin, end = parse_time(begin_time), parse_time(end_time)
+    windows = []
+    while begin < end:
+        windows.append((begin, min(begin + window, end)))
+        begin += window
+    return windows
+
+
+def fetch_window(fetcher, resource_id, meter, begin, end,
+                 page_size=PAGE_SIZE):
+    """Return the samples of one meter in [begin, end), oldest first"""
+    samples = list(iter_window(fetcher, resource_id, meter, begin, end,
+                               page_size))
+    samples.reverse()
+    return samples
+
+
+def iter_samples(fetcher, resource_id, meter, begin_time, end_time,
+                 page_size=PAGE_SIZE, window=WINDOW):
+    """Yield every sample of one meter in [begin_time, end_time), oldest first
+
+    The range is fetched one window at a time; the samples of a window are
+    buffered to reverse them, so window bounds the memory used.
+    """
+    for begin, end in time_windows(begin_time, end_time, window):
+        for each in fetch_window(fetcher, resource_id, meter, begin, end,
+                                 page_size):
+            yield each
+
+
+def iter_batches(fetcher, series, begin_time, end_time, page_size=PAGE_SIZE,
+                 window=WINDOW):
+    """Yield, window by window, the samples of each (resource_id, meter)
+
+    The windows of all series are fetched concurrently, one window ahead
+    of the consumer.  A series with meter None is empty and not queried.
+    """
+    def fetch(task):
+        if task[1] is None:
+            return []
+        return fetch_window(fetcher, task[0], task[1], task[2], task[3],
+                            page_size)
+
+    pending = None
+    for begin, end in time_windows(begin_time, end_time, window):
+        batch = fetcher.map_async(
+            fetch, [(resource_id, meter, begin, end)
+                    for resource_id, meter in series])
+        if pending is not None:
+            yield pending.get()
+        pending = batch
+    if pending is not None:
+        yield pending.get()
+
+
+def timed(index, samples):
+    """Yield (time, index, sample) of a meter's samples for the merge heap"""
+    for each in samples:
+        yield parse_time(each.timestamp), index, each
+
+
+def merge_samples(batches):
+    """Yield (time, index, sample) of the window batches in time order
+
+    The windows of iter_batches are ascending and disjoint, so each batch
+    is merged on its own and the next one is only taken once it is
+    consumed, whatever the gaps of the meters.
+    """
+    for batch in batches:
+        for entry in heapq.merge(*[timed(index, samples)
+                                   for index, samples in enumerate(batch)]):
+            yield entry
+
+
+def align_tolerance(entries, width, tolerance):
+    """Yield (time, resource_id, samples) rows of samples within tolerance
+
+    entries are the (time, index, sample) of merge_samples for width
+    meters.  A row is anchored at the oldest pending sample and takes the
+    first sample of every other meter no later than tolerance after it; a
+    meter without one has None in the row.  Only the samples within
+    tolerance of the anchor are read ahead.
+    """
+    entries = iter(entries)
+    pending = collections.deque()
+    upcoming = next(entries, None)
+    while pending or upcoming is not None:
+        if not pending:
+            pending.append(upcoming)
+            upcoming = next(entries, None)
+        anchor, _, sample = pending[0]
+        while upcoming is not None and upcoming[0] - anchor <= tolerance:
+            pending.append(upcoming)
+            upcoming = next(entries, None)
+        row = [None] * width
+        deferred = collections.deque()
+        while pending and pending[0][0] - anchor <= tolerance:
+            entry = pending.popleft()
+            if row[entry[1]] is None:
+                row[entry[1]] = entry[2]
+            else:
+                deferred.append(entry)
+        deferred.extend(pending)
+        pending = deferred
+        yield anchor, sample.resource_id, row
+
+
+def align_resample(entries, width, interval):
+    """Yield (time, resource_id, samples) rows of fixed interval buckets
+
+    entries are the (time, index, sample) of merge_samples for width
+    meters.  Each row holds the samples of every meter in its bucket, a
+    list per meter, empty when the meter has none.
+    """
+    step = interval.total_seconds()
+    current, resource_id, row = None, None, None
+    for moment, index, sample in entries:
+        offset = (moment - EPOCH).total_seconds()
+        bucket = EPOCH + datetime.timedelta(seconds=offset - offset % step)
+        if bucket != current:
+            if row is not None:
+                yield current, resource_id, row
+            current, resource_id = bucket, sample.resource_id
+            row = [[] for _ in range(width)]
+        row[index].append(sample)
+    if row is not None:
+        yield current, resource_id, row
+
+
+def merge_series(batches, width, tolerance=TOLERANCE, resample=None,
+                 fill=FILL_MISSING, last=None, previous=None):
+    """Join the window batches of width meters on timestamp in one pass
+
+    With resample, the samples are averaged per meter in buckets of that
+    timedelta; otherwise samples within tolerance form a row.  Gaps are
+    filled by the fill policy: FILL_MISSING leaves None, FILL_PREVIOUS
+    carries the last value of the meter forward, FILL_DROP drops the row
+    and a number is used as is.  Yields (time, resource_id, values).
+
+    If last is a list, last[i] is kept at the timestamp of the newest
+    sample of meter i in the rows yielded or dropped so far.  If previous
+    is a list, it holds the values carried forward by FILL_PREVIOUS and is
+    kept up to date, so that a later call can continue from it.
+    """
+    if previous is None:
+        previous = [None] * width
+    entries = merge_samples(batches)
+    if resample is not None:
+        rows = align_resample(entries, width, resample)
+    else:
+        rows = align_tolerance(entries, width, tolerance)
+    for moment, resource_id, row in rows:
+        if last is not None:
+            for index, each in enumerate(row):
+                if each:
+                    newest = each[-1] if isinstance(each, list) else each
+                    last[index] = newest.timestamp
+        values = []
+        for index, each in enumerate(row):
+            if not each:
+                value = None
+            elif isinstance(each, list):
+                value = sum(sample.volume for sample in each) / float(
+                    len(each))
+            else:
+                value = each.volume
+            if value is None:
+                if fill == FILL_DROP:
+                    break
+                elif fill == FILL_PREVIOUS:
+                    value = previous[index]
+                elif fill != FILL_MISSING:
+                    value = fill
+            previous[index] = value
+            values.append(value)
+        else:
+            yield moment, resource_id, values
+
+
+def collect(fetcher, resource_id, meters, begin_time, end_time, path,
+            page_size=PAGE_SIZE, window=WINDOW, tolerance=TOLERANCE,
+            resample=None, fill=FILL_MISSING, fmt='arff'):
+    """Collect the meters of one resource into a dataset at path
+
+    fmt is one of writers.FORMATS.  Returns the number of rows.
+    """
+    series = [(resource_id, meter) for meter in meters]
+    batches = iter_batches(fetcher, series, begin_time, end_time, page_size,
+                           window)
+    writer = open_writer(fmt, path, meters)
+    try:
+        for row in merge_series(batches, len(series), tolerance, resample,
+                                fill):
+            writer.write(*row)
+    finally:
+        writer.close()
+    return writer.count
@@ -0,0 +1,113 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Evaluation of the binary failure predictors.
+
+evaluate builds the whole confusion matrix of an RDD of (label, prediction)
+pairs with one aggregate job and derives accuracy, recall, false positive
+rate, precision and F1 from it.  evaluateArrays does the same for the
+NumPy arrays of the local engine.
+"""
+
+from __future__ import print_function
+import numpy as np
+
+
+def countOutcome(counts, labelAndPrediction):
+    """Add one (label, prediction) pair to a (tp, fp, fn, tn) tuple"""
+    tp, fp, fn, tn = counts
+    label, prediction = labelAndPrediction
+    if prediction == 1:
+        if label == prediction:
+            tp += 1
+        else:
+            fp += 1
+    else:
+        if label == prediction:
+            tn += 1
+        else:
+            fn += 1
+    return tp, fp, fn, tn
+
+
+def mergeOutcomes(left, right):
+    """Merge two partial (tp, fp, fn, tn) tuples"""
+    return tuple(a + b for a, b in zip(left, right))
+
+
+def ratio(numerator, denominator):
+    """Divide, returning 0.0 instead of failing on an empty denominator"""
+    if denominator == 0:
+        return 0.0
+    return numerator / float(denominator)
+
+
+def evaluate(labelsAndPredictions):
+    """Compute the confusion matrix and derived metrics in a single pass
+
+    labelsAndPredictions is an RDD of (label, prediction) pairs.  All four
+    cells of the confusion matrix are accumulated by one aggregate job, and
+    accuracy, recall, false positive rate, precision and F1 are derived
+    from them on the driver.
+    """
+    tp, fp, fn, tn = labelsAndPredictions.aggregate(
+        (0, 0, 0, 0), countOutcome, mergeOutcomes)
+    return metricsFromCounts(tp, fp, fn, tn)
+
+
+def evaluateArrays(labels, predictions):
+    """Compute the same metrics as evaluate from NumPy arrays"""
+    labels = np.asarray(labels) == 1
+    predictions = np.asarray(predictions) == 1
+    tp = int(np.count_nonzero(labels & predictions))
+    fp = int(np.count_nonzero(~labels & predictions))
+    fn = int(np.count_nonzero(labels & ~predictions))
+    tn = int(np.count_nonzero(~labels & ~predictions))
+    return metricsFromCounts(tp, fp, fn, tn)
+
+
+def metricsFromCounts(tp, fp, fn, tn):
+    """Derive the metrics from the cells of a confusion matrix"""
+    recall = ratio(tp, tp + fn)
+    precision = ratio(tp, tp + fp)
+    return {
+        'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+        'accuracy': ratio(tp + tn, tp + fp + fn + tn),
+        'recall': recall,
+        'fprate': ratio(fp, fp + tn),
+        'precision': precision,
+        'f1': ratio(2 * precision * recall, precision + recall),
+    }
+
+
+def printMetrics(name, metrics):
+    """Print the confusion matrix and metrics of the named model"""
+    print("true positive number: %d, false positive number: %d" %
+          (metrics['tp'], metrics['fp']))
+    print("false negative number: %d, true negative number: %d" %
+          (metrics['fn'], metrics['tn']))
+    for metric in ('accuracy', 'recall', 'fprate', 'precision', 'f1'):
+        print("The test %s of %s is: %.4f" % (metric, name, metrics[metric]))
+    print("\n")
+
+
+def predictLabels(model, testData):
+    """Return an RDD of (label, prediction) pairs of the test set"""
+    predictions = model.predict(testData.map(lambda x: x.features))
+    return testData.map(lambda p: p.label).zip(predictions)
@@ -0,0 +1,203 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Columnar cache of the selected hard drive features.
+
+The gzip CSV is not splittable, so every Spark action that reads it has one
+core decompress and parse the whole file.  buildCache converts the columns
+picked by features.SELECTED_SLICES once into NumPy arrays, features.npy,
+labels.npy and the drive serials in serials.npy, stored under a directory
+named after the SHA-1 of the source file and of the slice spec.  Later runs
+memory-map the arrays and hand row ranges to Spark partitions, so no CSV is
+parsed at all.  ARFF sources, such as data/harddrive1.arff, are read with
+arffReader into the same columns.
+
+The cache directory has to be visible to the executors under the same path,
+as is already the case for the input file passed to sc.textFile.
+
+Usage: python featureCache.py hdd/harddrive1.csv.gz cache
+"""
+
+from __future__ import print_function
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from features import BLOCK_ROWS, SELECTED_SLICES, iterTables, selectTable
+import arffReader
+
+FEATURES_FILE = 'features.npy'
+LABELS_FILE = 'labels.npy'
+SERIALS_FILE = 'serials.npy'
+META_FILE = 'meta.json'
+
+# Layout version of the entries, part of the cache key
+CACHE_VERSION = 2
+
+
+def fileDigest(path, chunkSize=1 << 20):
+    """Return the SHA-1 hex digest of the file content"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fin:
+        chunk = fin.read(chunkSize)
+        while chunk:
+            digest.update(chunk)
+            chunk = fin.read(chunkSize)
+    return digest.hexdigest()
+
+
+def cacheKey(path, slices=SELECTED_SLICES):
+    """Key a cache entry by the source content and the column selection"""
+    digest = hashlib.sha1(fileDigest(path).encode('ascii'))
+    digest.update(json.dumps([list(s) for s in slices]).encode('ascii'))
+    digest.update(str(CACHE_VERSION).encode('ascii'))
+    return digest.hexdigest()
+
+
+def openSource(path):
+    """Open a plain or gzip compressed CSV file"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def sourceTables(fin, path, blockRows=BLOCK_ROWS):
+    """Yield the parsed tables of an open CSV or, by its name, ARFF file"""
+    if arffReader.isArff(path):
+        for _, table in arffReader.iterTables(fin, blockRows):
+            yield table
+    else:
+        for table in iterTables(fin, blockRows):
+            yield table
+
+
+def buildCache(path, cacheDir, slices=SELECTED_SLICES):
+    """Convert the CSV or ARFF file into a cache entry, return its directory
+
+    The entry is written to a temporary directory and renamed into place,
+    so a concurrent or interrupted build never leaves a partial entry.
+    """
+    key = cacheKey(path, slices)
+    entryDir = os.path.join(cacheDir, key)
+    if os.path.exists(os.path.join(entryDir, META_FILE)):
+        return entryDir
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+
+    blocks = []
+    serials = []
+    with openSource(path) as fin:
+        for table in sourceTables(fin, path):
+            blocks.append(selectTable(table, slices))
+            serials.append(table[:, 0])
+    if not blocks:
+        raise ValueError("No records found in %s" % path)
+    features = np.concatenate([block[0] for block in blocks])
+    labels = np.concatenate([block[1] for block in blocks])
+
+    tmpDir = tempfile.mkdtemp(dir=cacheDir)
+    try:
+        np.save(os.path.join(tmpDir, FEATURES_FILE), features)
+        np.save(os.path.join(tmpDir, LABELS_FILE), labels)
+        np.save(os.path.join(tmpDir, SERIALS_FILE), np.concatenate(serials))
+        meta = {
+            'source': os.path.abspath(path),
+            'key': key,
+            'slices': [list(s) for s in slices],
+            'rows': features.shape[0],
+            'features': features.shape[1],
+        }
+        with open(os.path.join(tmpDir, META_FILE), 'w') as fout:
+            json.dump(meta, fout, indent=2)
+        try:
+            os.rename(tmpDir, entryDir)
+        except OSError:
+            # Another process finished the same entry first
+            if not os.path.exists(os.path.join(entryDir, META_FILE)):
+                raise
+    finally:
+        if os.path.exists(tmpDir):
+            shutil.rmtree(tmpDir)
+    return entryDir
+
+
+def readMeta(entryDir):
+    """Return the metadata of a cache entry"""
+    with open(os.path.join(entryDir, META_FILE)) as fin:
+        return json.load(fin)
+
+
+def loadCache(path, cacheDir, slices=SELECTED_SLICES, withSerials=False):
+    """Return memory-mapped (features, labels) arrays, building if needed
+
+    With withSerials the drive serials of the rows are returned third.
+    """
+    entryDir = buildCache(path, cacheDir, slices)
+    names = [FEATURES_FILE, LABELS_FILE]
+    if withSerials:
+        names.append(SERIALS_FILE)
+    return tuple(np.load(os.path.join(entryDir, name), mmap_mode='r')
+                 for name in names)
+
+
+def partitionBounds(rows, numPartitions):
+    """Split range(rows) into numPartitions contiguous (start, stop) pairs"""
+    return [(rows * i // numPartitions, rows * (i + 1) // numPartitions)
+            for i in range(numPartitions)]
+
+
+def cachedPoints(sc, path, cacheDir, numPartitions=None,
+                 slices=SELECTED_SLICES):
+    """Return an RDD of LabeledPoint read from the cache of the CSV file
+
+    Each partition memory-maps the cache entry and materializes only its
+    own contiguous row range.
+    """
+    entryDir = os.path.abspath(buildCache(path, cacheDir, slices))
+    rows = readMeta(entryDir)['rows']
+    numPartitions = numPartitions or sc.defaultParallelism
+
+    def readPartition(bounds):
+        from pyspark.mllib.regression import LabeledPoint
+        features = np.load(os.path.join(entryDir, FEATURES_FILE),
+                           mmap_mode='r')
+        labels = np.load(os.path.join(entryDir, LABELS_FILE), mmap_mode='r')
+        for start, stop in bounds:
+            block = np.array(features[start:stop])
+            for label, row in zip(labels[start:stop], block):
+                yield LabeledPoint(float(label), row)
+
+    return (sc.parallelize(partitionBounds(rows, numPartitions),
+                           numPartitions).mapPartitions(readPartition))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the columnar feature cache of a CSV file")
+    parser.add_argument('input', help="hard drive CSV file, may be gzipped")
+    parser.add_argument('cache_dir', help="directory holding cache entries")
+    args = parser.parse_args()
+    entryDir = buildCache(args.input, args.cache_dir)
+    meta = readMeta(entryDir)
+    print("Cached %d rows of %d features in %s" %
+          (meta['rows'], meta['features'], entryDir))
@@ -0,0 +1,312 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+One-pass column statistics and automatic pruning of the selected features.
+
+features.SELECTED_SLICES was picked by hand from the 64 columns of
+harddrive1.csv.  Outside of it five columns, 18 and 35 to 38, are zero in
+every row and others copy another column.  columnStats reads the data
+once and returns, for every selected column, the count of finite values,
+the mean, variance, minimum and maximum and the correlation with the label,
+together with the correlation matrix of the columns.  Each block of rows
+is reduced to its count, means and centered co-moment matrix, and the
+blocks are merged pairwise as in the parallel algorithm of Chan et al.,
+which is exact, associative and does not lose precision on the large raw
+SMART values.  With Spark the blocks are reduced by the partitions and
+merged with a single treeReduce.
+
+pruneColumns drops the constant columns, and of every group of columns
+correlated beyond maxCorrelation keeps the one most correlated with the
+label.  Pruning starts from SELECTED_SLICES, or with --all-columns from
+ALL_SLICES, every column after the first four: the serial, the frame,
+the Hours and HoursBeforeFail identify a record or its time, and
+HoursBeforeFail is derived from the failure itself, so training on
+them would leak the label.  SELECTED_SLICES has no constant or
+duplicate column on harddrive1.csv and keeps all 25 features; pruning
+only pays off with --all-columns, where it drops the five zero columns
+and six duplicates and keeps 48 of 59 features.  The kept columns are
+written as a selection spec, a JSON file whose slices replace
+SELECTED_SLICES:
+
+    python featureStats.py ../data/harddrive1.csv.gz selection.json \
+        --all-columns
+    python predictor.py --input ../data/harddrive1.csv.gz \
+        --selection selection.json --engine local --save-dir models
+
+Saved models record their slices, so scorer.py and streamPredictor.py
+score them with the same columns.
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import os
+import numpy as np
+from features import SELECTED_SLICES, iterTables, selectedColumns
+from featureCache import openSource, sourceTables
+from modelCache import datasetFingerprint
+import arffReader
+
+# Columns correlated beyond this are considered duplicates
+MAX_CORRELATION = 0.999
+# Every column after the serial, frame, Hours and HoursBeforeFail, which
+# identify a record or, for HoursBeforeFail, derive from the label
+ALL_SLICES = ((4, None),)
+
+
+class ColumnStats(object):
+    """Count, means, co-moments and ranges of a set of rows"""
+
+    def __init__(self, rows, mean, comoment, minimum, maximum, finite):
+        self.rows = rows
+        self.mean = mean
+        self.comoment = comoment
+        self.minimum = minimum
+        self.maximum = maximum
+        self.finite = finite
+
+    @classmethod
+    def ofTable(cls, table):
+        mean = table.mean(axis=0)
+        centered = table - mean
+        return cls(len(table), mean, centered.T.dot(centered),
+                   table.min(axis=0), table.max(axis=0),
+                   np.isfinite(table).sum(axis=0))
+
+    def merge(self, other):
+        """Return the statistics of the rows of both"""
+        if other is None or not other.rows:
+            return self
+        if not self.rows:
+            return other
+        rows = self.rows + other.rows
+        delta = other.mean - self.mean
+        return ColumnStats(
+            rows, self.mean + delta * (float(other.rows) / rows),
+            self.comoment + other.comoment +
+            np.outer(delta, delta) * (float(self.rows) * other.rows / rows),
+            np.minimum(self.minimum, other.minimum),
+            np.maximum(self.maximum, other.maximum),
+            self.finite + other.finite)
+
+    def variance(self):
+        return self.comoment.diagonal() / self.rows
+
+    def correlation(self):
+        """Return the correlation matrix, 0 where a column is constant"""
+        deviation = np.sqrt(self.comoment.diagonal())
+        scale = np.outer(deviation, deviation)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(scale > 0, self.comoment / scale, 0.0)
+
+
+def mergeStats(left, right):
+    if left is None:
+        return right
+    return left.merge(right)
+
+
+def tableStats(table, slices=SELECTED_SLICES):
+    """Return the statistics of the selected columns of a parsed table"""
+    return ColumnStats.ofTable(
+        table[:, selectedColumns(table.shape[1], slices)])
+
+
+def columnStats(path, slices=SELECTED_SLICES, sc=None):
+    """Return the ColumnStats of the selected columns of a CSV or ARFF file
+
+    The label is the last column.  Without sc the file is read locally
+    block by block.
+    """
+    if sc is None:
+        stats = None
+        with openSource(path) as fin:
+            for table in sourceTables(fin, path):
+                stats = mergeStats(stats, tableStats(table, slices))
+        return stats
+
+    def partitionStats(tables):
+        stats = None
+        for table in tables:
+            stats = mergeStats(stats, tableStats(table, slices))
+        return [stats] if stats is not None else []
+
+    if arffReader.isArff(path):
+        with openSource(path) as fin:
+            schema = arffReader.readSchema(fin)
+        tables = arffReader.tablesRDD(sc, path, schema)
+    else:
+        tables = sc.textFile(path).mapPartitions(iterTables)
+    return tables.mapPartitions(partitionStats).treeReduce(mergeStats)
+
+
+def pruneColumns(stats, minStd=0.0, maxCorrelation=MAX_CORRELATION):
+    """Return the positions of the kept features and why the others went
+
+    Positions index the selected columns.  Columns with non-finite values
+    are kept without judging them.
+    """
+    features = len(stats.mean) - 1
+    deviation = np.sqrt(stats.variance())
+    correlation = stats.correlation()
+    labelCorrelation = np.nan_to_num(np.abs(correlation[:features, -1]))
+    dropped = {}
+    for position in range(features):
+        if stats.finite[position] < stats.rows:
+            continue
+        if stats.maximum[position] == stats.minimum[position]:
+            dropped[position] = 'constant'
+        elif deviation[position] <= minStd:
+            dropped[position] = 'std %g' % deviation[position]
+    kept = []
+    # Most predictive first, so it survives its duplicates
+    for position in sorted(range(features),
+                           key=lambda p: (-labelCorrelation[p], p)):
+        if position in dropped:
+            continue
+        for other in kept:
+            if (abs(correlation[position, other]) >= maxCorrelation and
+                    stats.finite[position] == stats.rows):
+                dropped[position] = 'duplicate of %d' % other
+                break
+        else:
+            kept.append(position)
+    return sorted(kept), dropped
+
+
+def columnSlices(columns, numColumns):
+    """Return the slices selecting the sorted column indices
+
+    A run reaching the last column, the label, is left open ended, as in
+    SELECTED_SLICES.
+    """
+    slices = []
+    for column in columns:
+        if slices and slices[-1][1] == column:
+            slices[-1][1] = column + 1
+        else:
+            slices.append([column, column + 1])
+    if slices and slices[-1][1] == numColumns:
+        slices[-1][1] = None
+    return [tuple(s) for s in slices]
+
+
+def selectionSpec(path, stats, numColumns, slices=SELECTED_SLICES,
+                  minStd=0.0, maxCorrelation=MAX_CORRELATION):
+    """Return the selection spec of the columns kept by pruneColumns"""
+    columns = selectedColumns(numColumns, slices)
+    kept, dropped = pruneColumns(stats, minStd, maxCorrelation)
+    variance = stats.variance()
+    correlation = stats.correlation()
+
+    def number(value):
+        value = float(value)
+        return value if np.isfinite(value) else None
+
+    report = []
+    for position, column in enumerate(columns):
+        report.append({
+            'column': column,
+            'count': int(stats.finite[position]),
+            'mean': number(stats.mean[position]),
+            'variance': number(variance[position]),
+            'min': number(stats.minimum[position]),
+            'max': number(stats.maximum[position]),
+            'labelCorrelation': number(correlation[position, -1]),
+            'dropped': dropped.get(position),
+        })
+    for entry in report:
+        reason = entry['dropped']
+        if reason and reason.startswith('duplicate of '):
+            other = int(reason.split()[-1])
+            entry['dropped'] = 'duplicate of column %d' % columns[other]
+    return {
+        'source': os.path.abspath(path),
+        'dataset': datasetFingerprint(path),
+        'rows': stats.rows,
+        'baseSlices': [list(s) for s in slices],
+        'slices': [list(s) for s in columnSlices(
+            [columns[p] for p in kept] + [columns[-1]], numColumns)],
+        'minStd': minStd,
+        'maxCorrelation': maxCorrelation,
+        'columns': report,
+    }
+
+
+def loadSelection(path):
+    """Return the slices of a selection spec written by featureStats"""
+    with open(path) as fin:
+        return [tuple(s) for s in json.load(fin)['slices']]
+
+
+def numberOfColumns(path):
+    """Return the number of columns of the first row of the file"""
+    with openSource(path) as fin:
+        for table in sourceTables(fin, path, blockRows=1):
+            return table.shape[1]
+    raise ValueError("No records found in %s" % path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compute column statistics and prune the features")
+    parser.add_argument('input', help="hard drive CSV or ARFF file, may be "
+                                      "gzipped")
+    parser.add_argument('output', help="selection spec to write")
+    parser.add_argument('--engine', choices=('spark', 'local'),
+                        default='local')
+    parser.add_argument('--all-columns', action='store_true',
+                        help="start from every column after the first "
+                             "four instead of SELECTED_SLICES")
+    parser.add_argument('--min-std', type=float, default=0.0,
+                        help="drop features with at most this standard "
+                             "deviation, besides the constant ones")
+    parser.add_argument('--max-correlation', type=float,
+                        default=MAX_CORRELATION,
+                        help="drop features correlated at least this much "
+                             "with a kept one")
+    args = parser.parse_args()
+
+    sc = None
+    if args.engine == 'spark':
+        from pyspark import SparkContext
+        sc = SparkContext(appName="HardDriveFeatureStats")
+    slices = ALL_SLICES if args.all_columns else SELECTED_SLICES
+    stats = columnStats(args.input, slices, sc)
+    if sc is not None:
+        sc.stop()
+    if stats is None:
+        raise SystemExit("No records found in %s" % args.input)
+    spec = selectionSpec(args.input, stats, numberOfColumns(args.input),
+                         slices, args.min_std,
+                         args.max_correlation)
+    with open(args.output, 'w') as fout:
+        json.dump(spec, fout, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        fout.write('\n')
+    for entry in spec['columns'][:-1]:
+        print("column %2d  mean %14.6g  std %14.6g  label corr %8s  %s" %
+              (entry['column'], entry['mean'] or 0,
+               np.sqrt(entry['variance'] or 0),
+               '%.4f' % entry['labelCorrelation']
+               if entry['labelCorrelation'] is not None else '-',
+               entry['dropped'] or 'kept'))
+    kept = sum(1 for entry in spec['columns'][:-1] if not entry['dropped'])
+    print("%d of %d features kept, slices %s" %
+          (kept, len(spec['columns']) - 1, spec['slices']))
@@ -0,0 +1,135 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Feature selection for the hard drive SMART records.
+
+Each CSV row holds the drive serial, the day index, the SMART attributes and
+the failure label in the last column.  SELECTED_SLICES lists the column
+ranges kept for training; the label is the last selected column.
+
+loadRecord handles one line at a time.  parseLines and iterBlocks parse many
+lines at once into NumPy arrays and apply the selection as a single fancy
+index, which is what the Spark partitions and the feature cache use.
+"""
+
+import csv
+import itertools
+import StringIO
+import numpy as np
+import metrics
+
+# Lines parsed together into one NumPy block
+BLOCK_ROWS = 65536
+
+# Column ranges (start, stop) selected from a CSV row, stop None meaning the
+# end of the row
+SELECTED_SLICES = ((12, 17), (19, 20), (23, 26), (39, 47), (54, 61),
+                   (62, None))
+
+
+def selectedColumns(numColumns, slices=SELECTED_SLICES):
+    """Return the indices of the selected columns of a numColumns row
+
+    Raises ValueError if a slice lies outside the row or none selects a
+    column, e.g. for a collector dataset read with the default slices.
+    """
+    columns = []
+    for start, stop in slices:
+        if start >= numColumns or (stop is not None and stop > numColumns):
+            raise ValueError("Slice (%s, %s) lies outside the %d columns of "
+                             "the table" % (start, stop, numColumns))
+        columns.extend(range(numColumns)[start:stop])
+    if not columns:
+        raise ValueError("The slices %s select no columns" % (slices,))
+    return columns
+
+
+def loadRecord(line, slices=SELECTED_SLICES):
+    """Load a CSV line and select 26 indicative parameters"""
+    inputLine = StringIO.StringIO(line)
+    reader = csv.reader(inputLine)
+    parameters = reader.next()
+    # Instances that were collected within seven days before the failures
+    # are used to train the failing model
+    # if float(parameters[-1]) == 1 and float(parameters[3]) >= 360:
+    #    parameters[-1] = 0
+    selectedParameters = []
+    for start, stop in slices:
+        selectedParameters.extend(parameters[start:stop])
+    # selectedParameters = parameters
+    return selectedParameters
+
+
+@metrics.timed('features_parse_seconds', format='csv')
+def parseTable(lines):
+    """Parse numeric CSV lines into one NumPy matrix of all their columns
+
+    The lines are joined and converted by a single np.fromstring call.  All
+    lines must have the same number of purely numeric columns.
+    """
+    lines = [line.strip() for line in lines]
+    lines = [line for line in lines if line]
+    if not lines:
+        return np.empty((0, 0))
+    numColumns = lines[0].count(',') + 1
+    values = np.fromstring(','.join(lines), dtype=np.float64, sep=',')
+    if values.size != numColumns * len(lines):
+        raise ValueError("Rows do not all have %d numeric columns" %
+                         numColumns)
+    metrics.count('features_parsed_rows_total', len(lines), format='csv')
+    return values.reshape(len(lines), numColumns)
+
+
+def selectTable(table, slices=SELECTED_SLICES):
+    """Split a parsed table into selected (features, labels) arrays
+
+    The label is the last selected column.  Raises ValueError if the
+    slices do not fit the table, see selectedColumns.
+    """
+    if not table.size:
+        return np.empty((0, 0)), np.empty(0)
+    selected = table[:, selectedColumns(table.shape[1], slices)]
+    return selected[:, :-1], selected[:, -1]
+
+
+def parseLines(lines, slices=SELECTED_SLICES):
+    """Parse numeric CSV lines into (features, labels) NumPy arrays
+
+    The selected columns are taken from the parsed table with one fancy
+    index.
+    """
+    return selectTable(parseTable(lines), slices)
+
+
+def iterTables(lines, blockRows=BLOCK_ROWS):
+    """Yield parsed tables of at most blockRows lines"""
+    lines = iter(lines)
+    while True:
+        chunk = list(itertools.islice(lines, blockRows))
+        if not chunk:
+            return
+        table = parseTable(chunk)
+        if len(table):
+            yield table
+
+
+def iterBlocks(lines, blockRows=BLOCK_ROWS, slices=SELECTED_SLICES):
+    """Yield (features, labels) blocks of at most blockRows parsed lines"""
+    for table in iterTables(lines, blockRows):
+        yield selectTable(table, slices)
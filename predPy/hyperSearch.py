@@ -0,0 +1,256 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Cross-validated hyperparameter search for the Python models.
+
+The k folds are built once and cached: index arrays for the local engine,
+cached RDDs from one randomSplit for Spark, together with the training
+union of every fold.  Candidate configurations come from a grid or from
+random draws over SEARCH_SPACES and are raced fold by fold: all surviving
+configurations are trained on the next fold in parallel from a thread
+pool, and after each fold only the best 1/eta of them (never fewer than
+minSurvivors) go on, so clearly losing configurations stop early.  Every
+trial, finished or not, is appended as one JSON line to the results file.
+
+Usage:
+
+    python hyperSearch.py --model random-forest --engine local \
+        --input ../data/harddrive1.csv.gz --cache-dir cache \
+        --folds 3 --search random --trials 12 --output search.jsonl
+"""
+
+from __future__ import print_function
+import argparse
+import itertools
+import json
+import math
+import time
+from multiprocessing.pool import ThreadPool
+import numpy as np
+from models import MODELS_BY_NAME
+import localEngine
+
+# Values tried per hyperparameter.  A list is sampled uniformly, a
+# ('log', low, high) tuple log-uniformly by the random search; the grid
+# search only uses lists.
+SEARCH_SPACES = {
+    'svm': {'regParam': [1e-3, 1e-2, 3e-2, 7e-2, 1e-1, 3e-1],
+            'iterations': [100, 200]},
+    'lr-sgd': {'regParam': [1e-3, 1e-2, 3e-2, 8e-2, 1e-1, 3e-1],
+               'iterations': [100, 200]},
+    'lr-lbfgs': {'regParam': [1e-3, 1e-2, 3e-2, 7e-2, 1e-1, 3e-1]},
+    'naive-bayes': {'lambda_': [1e-2, 1e-1, 3e-1, 7e-1, 1.0, 3.0]},
+    'decision-tree': {'maxDepth': [4, 6, 8, 10, 12],
+                      'impurity': ['gini', 'entropy'],
+                      'maxBins': [16, 32, 64]},
+    'random-forest': {'numTrees': [10, 15, 30, 50],
+                      'maxDepth': [6, 8, 12, 16],
+                      'impurity': ['gini', 'entropy']},
+    'gbt': {'numIterations': [10, 20, 40],
+            'maxDepth': [3, 5, 8],
+            'maxBins': [16, 32]},
+}
+
+
+def gridConfigs(space):
+    """Return every combination of the listed values"""
+    names = sorted(space)
+    values = [space[name] for name in names]
+    return [dict(zip(names, combination))
+            for combination in itertools.product(*values)]
+
+
+def randomConfigs(space, trials, seed=0):
+    """Return trials distinct configurations drawn from the space"""
+    rng = np.random.RandomState(seed)
+    configs = []
+    seen = set()
+    for _ in range(trials * 20):
+        if len(configs) == trials:
+            break
+        config = {}
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, tuple) and values[0] == 'log':
+                low, high = math.log(values[1]), math.log(values[2])
+                config[name] = float(math.exp(rng.uniform(low, high)))
+            else:
+                config[name] = values[rng.randint(len(values))]
+        key = json.dumps(config, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+class LocalFolds(object):
+    """k folds of NumPy arrays for the local engine"""
+
+    def __init__(self, features, labels, k, seed=0):
+        assignment = np.random.RandomState(seed).randint(0, k, len(labels))
+        self.folds = []
+        for fold in range(k):
+            test = assignment == fold
+            self.folds.append(((features[~test], labels[~test]),
+                               (features[test], labels[test])))
+
+    def run(self, spec, fold):
+        training, test = self.folds[fold]
+        return localEngine.runModel(spec, training, test)
+
+
+class SparkFolds(object):
+    """k cached folds of an RDD of LabeledPoint"""
+
+    def __init__(self, sc, data, k, seed=0):
+        # Imported here so that local searches do not need pyspark
+        import modelZoo
+        self.engine = modelZoo
+        self.sc = sc
+        parts = data.randomSplit([1.0] * k, seed=seed)
+        for part in parts:
+            part.cache()
+        self.folds = []
+        for fold in range(k):
+            training = sc.union([part for i, part in enumerate(parts)
+                                 if i != fold]).cache()
+            self.folds.append((training, parts[fold]))
+
+    def run(self, spec, fold):
+        training, test = self.folds[fold]
+        return self.engine.runModel(self.sc, spec, training, test)
+
+
+def search(folds, name, configs, metric='f1', parallelism=4, eta=2,
+           minSurvivors=2, output=None):
+    """Race the configurations over the folds and return them ranked
+
+    Returns a list of (mean metric, config) pairs of the configurations
+    that ran on every fold, best first.
+    """
+    base = MODELS_BY_NAME[name]
+    specs = [base._replace(params=dict(base.params, **config))
+             for config in configs]
+    scores = dict((i, []) for i in range(len(specs)))
+    alive = list(range(len(specs)))
+    pool = ThreadPool(max(1, parallelism))
+    fout = open(output, 'a') if output else None
+
+    def trial(job):
+        index, fold = job
+        start = time.time()
+        try:
+            result = folds.run(specs[index], fold)
+            return index, fold, result, None, time.time() - start
+        except Exception as error:
+            return index, fold, None, str(error), time.time() - start
+
+    try:
+        for fold in range(len(folds.folds)):
+            jobs = [(index, fold) for index in alive]
+            for index, fold, result, error, elapsed in pool.imap_unordered(
+                    trial, jobs):
+                record = {'model': name, 'trial': index, 'fold': fold,
+                          'params': configs[index], 'seconds': elapsed}
+                if error:
+                    record['error'] = error
+                    scores[index] = None
+                else:
+                    record['metrics'] = result['metrics']
+                    record['trainSeconds'] = result['trainSeconds']
+                    record['evalSeconds'] = result['evalSeconds']
+                    if scores[index] is not None:
+                        scores[index].append(result['metrics'][metric])
+                if fout:
+                    fout.write(json.dumps(record, sort_keys=True) + '\n')
+                    fout.flush()
+            alive = [index for index in alive if scores[index] is not None]
+            if fold < len(folds.folds) - 1:
+                alive.sort(key=lambda index: -np.mean(scores[index]))
+                keep = max(minSurvivors, int(math.ceil(len(alive) /
+                                                       float(eta))))
+                for index in alive[keep:]:
+                    if fout:
+                        fout.write(json.dumps(
+                            {'model': name, 'trial': index,
+                             'params': configs[index], 'dropped': fold,
+                             'meanMetric': float(np.mean(scores[index]))},
+                            sort_keys=True) + '\n')
+                alive = alive[:keep]
+    finally:
+        pool.close()
+        pool.join()
+        if fout:
+            fout.close()
+    ranked = [(float(np.mean(scores[index])), configs[index])
+              for index in alive]
+    ranked.sort(key=lambda pair: -pair[0])
+    return ranked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cross-validated hyperparameter search")
+    parser.add_argument('--model', required=True,
+                        choices=sorted(SEARCH_SPACES))
+    parser.add_argument('--engine', choices=('spark', 'local'),
+                        default='local')
+    parser.add_argument('--input', default='hdd/harddrive1.csv')
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--search', choices=('grid', 'random'),
+                        default='random')
+    parser.add_argument('--trials', type=int, default=12,
+                        help="configurations drawn by the random search")
+    parser.add_argument('--metric', default='f1',
+                        help="metric maximized, e.g. f1, recall, accuracy")
+    parser.add_argument('--parallelism', type=int, default=4)
+    parser.add_argument('--eta', type=float, default=2,
+                        help="keep the best 1/eta configurations per fold")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='search.jsonl')
+    args = parser.parse_args()
+
+    space = SEARCH_SPACES[args.model]
+    if args.search == 'grid':
+        configs = gridConfigs(space)
+    else:
+        configs = randomConfigs(space, args.trials, args.seed)
+
+    if args.engine == 'local':
+        features, labels = localEngine.loadData(args.input, args.cache_dir)
+        folds = LocalFolds(features, labels, args.folds, args.seed)
+    else:
+        from pyspark import SparkContext
+        from featureCache import cachedPoints
+        from predictor import parsePartition
+        sc = SparkContext(appName="HardDriveHyperparameterSearch")
+        if args.cache_dir:
+            data = cachedPoints(sc, args.input, args.cache_dir)
+        else:
+            data = sc.textFile(args.input).mapPartitions(parsePartition)
+        folds = SparkFolds(sc, data, args.folds, args.seed)
+
+    ranked = search(folds, args.model, configs, args.metric,
+                    args.parallelism, args.eta, output=args.output)
+    print("%d configurations, %d survived all %d folds" %
+          (len(configs), len(ranked), args.folds))
+    for score, config in ranked:
+        print("%s %.4f  %s" % (args.metric, score,
+                               json.dumps(config, sort_keys=True)))
@@ -0,0 +1,518 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Spark-free local engine for single-node runs.
+
+For the usual data sizes (tens of thousands of rows, a few dozen features)
+starting the SparkContext and its JVM costs more than training.  This
+module trains and evaluates the seven model families of models.MODELS
+in-process with vectorized NumPy code, reading the features selected by
+features.SELECTED_SLICES, or a selection spec of featureStats.py, either
+from the CSV or from the feature cache.
+predictor.py selects it with --engine local; benchEngines.py measures
+where Spark starts to pay off.
+
+The implementations follow the MLlib algorithms and accept the same
+hyperparameters:
+
+* SVM and logistic regression with SGD run full-batch gradient descent
+  with step size 1/sqrt(t) and the squared L2 updater, like MLlib.
+* Logistic regression with LBFGS minimizes the same L2 regularized log
+  loss on standardized features; with only a few dozen features an exact
+  Newton step is cheaper than L-BFGS and converges to the same optimum.
+* Multinomial naive Bayes uses additive smoothing lambda_.
+* Trees bin every feature into at most maxBins quantile bins and find the
+  best split of all features of a node with one histogram.  The random
+  forest bootstraps the rows and samples features per node, the gradient
+  boosted trees minimize the log loss with learning rate 0.1.
+"""
+
+from __future__ import print_function
+import time
+import numpy as np
+from evaluation import evaluateArrays
+from features import SELECTED_SLICES, selectTable
+from featureCache import loadCache, openSource, sourceTables
+from models import MODELS
+import metrics
+import sampling
+
+
+@metrics.timed('predictor_load_seconds', engine='local')
+def loadData(path, cacheDir=None, withSerials=False, slices=SELECTED_SLICES):
+    """Return the selected (features, labels) arrays of the CSV or ARFF file
+
+    With withSerials the drive serials of the rows are returned third.
+    """
+    if cacheDir:
+        arrays = loadCache(path, cacheDir, slices, withSerials)
+        return tuple(np.asarray(array) for array in arrays)
+    blocks = []
+    with openSource(path) as fin:
+        for table in sourceTables(fin, path):
+            features, labels = selectTable(table, slices)
+            blocks.append((features, labels, table[:, 0]))
+    if not blocks:
+        raise ValueError("No records found in %s" % path)
+    count = 3 if withSerials else 2
+    return tuple(np.concatenate([block[i] for block in blocks])
+                 for i in range(count))
+
+
+def splitMask(count, weights=(0.8, 0.2), seed=0):
+    """Return a random boolean mask of the training rows"""
+    rng = np.random.RandomState(seed)
+    return rng.rand(count) < weights[0] / float(sum(weights))
+
+
+def splitData(features, labels, weights=(0.8, 0.2), seed=0):
+    """Split the arrays randomly into training and test sets"""
+    training = splitMask(len(labels), weights, seed)
+    return ((features[training], labels[training]),
+            (features[~training], labels[~training]))
+
+
+def sigmoid(margins):
+    """Logistic function, safe for large margins"""
+    return 0.5 * (1.0 + np.tanh(0.5 * margins))
+
+
+class LinearModel(object):
+    """Linear classifier, an SVM or a logistic regression"""
+
+    def __init__(self, weights, intercept, logistic, threshold=None):
+        self.weights = weights
+        self.intercept = intercept
+        self.logistic = logistic
+        self.threshold = threshold
+        if threshold is None:
+            self.threshold = 0.5 if logistic else 0.0
+
+    def setThreshold(self, threshold):
+        self.threshold = threshold
+
+    def predictScores(self, features):
+        """Return the margins, or the probabilities if logistic"""
+        margins = np.dot(features, self.weights) + self.intercept
+        return sigmoid(margins) if self.logistic else margins
+
+    def predict(self, features):
+        scores = self.predictScores(features)
+        return (scores > self.threshold).astype(np.float64)
+
+
+def gradientDescent(features, labels, gradient, iterations=100, step=1.0,
+                    regParam=0.01, intercept=False):
+    """Full-batch gradient descent with the MLlib squared L2 updater"""
+    weights = np.zeros(features.shape[1])
+    bias = 0.0
+    for i in range(1, iterations + 1):
+        margins = np.dot(features, weights) + bias
+        multipliers = gradient(margins, labels)
+        thisStep = step / np.sqrt(i)
+        decay = 1.0 - thisStep * regParam
+        weights = (weights * decay -
+                   thisStep * np.dot(multipliers, features) / len(labels))
+        if intercept:
+            bias = bias * decay - thisStep * multipliers.mean()
+    return weights, bias
+
+
+def hingeMultipliers(margins, labels):
+    """Per-row hinge loss gradient factors, labels in {0, 1}"""
+    scaled = 2.0 * labels - 1.0
+    return np.where(scaled * margins < 1.0, -scaled, 0.0)
+
+
+def logisticMultipliers(margins, labels):
+    """Per-row log loss gradient factors, labels in {0, 1}"""
+    return sigmoid(margins) - labels
+
+
+def trainSVM(features, labels, iterations=100, step=1.0, regParam=0.01,
+             intercept=False, **ignored):
+    weights, bias = gradientDescent(features, labels, hingeMultipliers,
+                                    iterations, step, regParam, intercept)
+    return LinearModel(weights, bias, logistic=False)
+
+
+def trainLogisticSGD(features, labels, iterations=100, step=1.0,
+                     regParam=0.01, intercept=False, **ignored):
+    weights, bias = gradientDescent(features, labels, logisticMultipliers,
+                                    iterations, step, regParam, intercept)
+    return LinearModel(weights, bias, logistic=True)
+
+
+def trainLogisticNewton(features, labels, iterations=100, regParam=0.0,
+                        intercept=True, tolerance=1e-6, **ignored):
+    """Minimize the L2 regularized log loss with Newton steps
+
+    The features are standardized first, as LogisticRegressionWithLBFGS
+    does, and the weights are mapped back to the original scale.
+    """
+    mean = features.mean(axis=0)
+    std = features.std(axis=0)
+    std[std == 0] = 1.0
+    scaled = (features - mean) / std
+    if intercept:
+        scaled = np.hstack([scaled, np.ones((len(labels), 1))])
+    penalty = np.full(scaled.shape[1], regParam)
+    if intercept:
+        penalty[-1] = 0.0
+    weights = np.zeros(scaled.shape[1])
+    for _ in range(iterations):
+        probabilities = sigmoid(np.dot(scaled, weights))
+        gradient = (np.dot(scaled.T, probabilities - labels) / len(labels) +
+                    penalty * weights)
+        curvature = probabilities * (1.0 - probabilities)
+        hessian = (np.dot(scaled.T * curvature, scaled) / len(labels) +
+                   np.diag(penalty) + 1e-9 * np.eye(len(weights)))
+        delta = np.linalg.solve(hessian, gradient)
+        weights -= delta
+        if np.abs(delta).max() < tolerance:
+            break
+    bias = weights[-1] if intercept else 0.0
+    coefficients = (weights[:-1] if intercept else weights) / std
+    return LinearModel(coefficients, bias - np.dot(coefficients, mean),
+                       logistic=True)
+
+
+class NaiveBayesModel(object):
+    """Multinomial naive Bayes over the binary label"""
+
+    def __init__(self, logPrior, logLikelihood):
+        self.logPrior = logPrior
+        self.logLikelihood = logLikelihood
+
+    def predictScores(self, features):
+        """Return the posterior probability of the failure class"""
+        joint = np.dot(features, self.logLikelihood.T) + self.logPrior
+        return sigmoid(joint[:, 1] - joint[:, 0])
+
+    def predict(self, features):
+        joint = np.dot(features, self.logLikelihood.T) + self.logPrior
+        return joint.argmax(axis=1).astype(np.float64)
+
+
+def trainNaiveBayes(features, labels, lambda_=1.0, **ignored):
+    if (features < 0).any():
+        raise ValueError("Naive Bayes requires nonnegative feature values")
+    classes = np.array([labels != 1, labels == 1])
+    counts = classes.sum(axis=1).astype(np.float64)
+    logPrior = (np.log(counts + lambda_) -
+                np.log(counts.sum() + 2 * lambda_))
+    sums = np.dot(classes, features)
+    logLikelihood = (np.log(sums + lambda_) -
+                     np.log(sums.sum(axis=1) + features.shape[1] * lambda_)
+                     [:, np.newaxis])
+    return NaiveBayesModel(logPrior, logLikelihood)
+
+
+def binThresholds(features, maxBins):
+    """Return per feature at most maxBins - 1 quantile split thresholds"""
+    quantiles = np.linspace(0, 100, maxBins + 1)[1:-1]
+    thresholds = []
+    for column in features.T:
+        candidates = np.unique(np.percentile(column, quantiles))
+        thresholds.append(candidates[candidates < column.max()])
+    return thresholds
+
+
+def binFeatures(features, thresholds, maxBins):
+    """Map every value to the index of its quantile bin"""
+    bins = np.empty(features.shape, dtype=np.int32)
+    for j, candidates in enumerate(thresholds):
+        bins[:, j] = np.searchsorted(candidates, features[:, j], side='left')
+    return bins
+
+
+def impurity(count, total, squares, kind):
+    """Impurity of nodes from their row count, target sum and square sum"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if kind == 'variance':
+            mean = total / count
+            value = squares / count - mean * mean
+        else:
+            p = total / count
+            if kind == 'gini':
+                value = 2.0 * p * (1.0 - p)
+            else:
+                value = -(np.where(p > 0, p * np.log2(p), 0.0) +
+                          np.where(p < 1, (1 - p) * np.log2(1 - p), 0.0))
+    return np.where(count > 0, value, 0.0)
+
+
+class TreeModel(object):
+    """Binary decision tree stored as flat node arrays"""
+
+    def __init__(self, feature, split, left, right, value, depth,
+                 classify):
+        self.feature = feature
+        self.split = split
+        self.left = left
+        self.right = right
+        self.value = value
+        self.depth = depth
+        self.classify = classify
+
+    def leafValues(self, features):
+        """Return the value of the leaf every row falls into"""
+        nodes = np.zeros(len(features), dtype=np.int64)
+        rows = np.arange(len(features))
+        for _ in range(self.depth):
+            internal = self.feature[nodes] >= 0
+            if not internal.any():
+                break
+            current = nodes[internal]
+            goLeft = (features[rows[internal], self.feature[current]] <=
+                      self.split[current])
+            nodes[internal] = np.where(goLeft, self.left[current],
+                                       self.right[current])
+        return self.value[nodes]
+
+    def predictScores(self, features):
+        return self.leafValues(features)
+
+    def predict(self, features):
+        values = self.leafValues(features)
+        if self.classify:
+            return (values > 0.5).astype(np.float64)
+        return values
+
+
+def growTree(bins, thresholds, targets, maxDepth=5, maxBins=32,
+             impurityKind='gini', numFeatures=None, rng=None, rows=None):
+    """Grow a tree on binned features with histogram split search
+
+    targets are the labels for classification trees and the residuals for
+    regression trees (impurityKind 'variance').  rows selects, possibly
+    with repetition, the training rows; numFeatures limits the features
+    tried at each node to a random subset.
+    """
+    numRows, numColumns = bins.shape
+    width = maxBins
+    offsets = np.arange(numColumns) * width
+    rows = np.arange(numRows) if rows is None else rows
+    feature, split, left, right, value = [], [], [], [], []
+
+    def newNode(nodeRows):
+        feature.append(-1)
+        split.append(0.0)
+        left.append(-1)
+        right.append(-1)
+        value.append(targets[nodeRows].mean() if len(nodeRows) else 0.0)
+        return len(feature) - 1
+
+    stack = [(newNode(rows), rows, 0)]
+    while stack:
+        node, nodeRows, depth = stack.pop()
+        if depth >= maxDepth or len(nodeRows) < 2:
+            continue
+        y = targets[nodeRows]
+        if y.min() == y.max():
+            continue
+        columns = np.arange(numColumns)
+        if numFeatures and numFeatures < numColumns:
+            columns = np.sort(rng.choice(numColumns, numFeatures,
+                                         replace=False))
+        codes = (bins[nodeRows][:, columns] + offsets[:len(columns)]).ravel()
+        size = len(columns) * width
+        count = np.bincount(codes, minlength=size).reshape(-1, width)
+        total = np.bincount(codes, weights=np.repeat(y, len(columns)),
+                            minlength=size).reshape(-1, width)
+        squares = np.bincount(codes, weights=np.repeat(y * y, len(columns)),
+                              minlength=size).reshape(-1, width)
+        leftCount = np.cumsum(count, axis=1)[:, :-1].astype(np.float64)
+        leftTotal = np.cumsum(total, axis=1)[:, :-1]
+        leftSquares = np.cumsum(squares, axis=1)[:, :-1]
+        n = float(len(nodeRows))
+        rightCount = n - leftCount
+        parent = impurity(n, y.sum(), (y * y).sum(), impurityKind)
+        gain = parent - (
+            leftCount / n * impurity(leftCount, leftTotal, leftSquares,
+                                     impurityKind) +
+            rightCount / n * impurity(rightCount, total.sum(axis=1)[:, None] -
+                                      leftTotal,
+                                      squares.sum(axis=1)[:, None] -
+                                      leftSquares, impurityKind))
+        gain[(leftCount == 0) | (rightCount == 0)] = -1.0
+        best = np.argmax(gain)
+        column, cut = divmod(best, width - 1)
+        if gain.flat[best] <= 0 or cut >= len(thresholds[columns[column]]):
+            continue
+        column = columns[column]
+        goLeft = bins[nodeRows, column] <= cut
+        feature[node] = column
+        split[node] = thresholds[column][cut]
+        left[node] = newNode(nodeRows[goLeft])
+        right[node] = newNode(nodeRows[~goLeft])
+        stack.append((left[node], nodeRows[goLeft], depth + 1))
+        stack.append((right[node], nodeRows[~goLeft], depth + 1))
+    return TreeModel(np.array(feature), np.array(split), np.array(left),
+                     np.array(right), np.array(value), maxDepth,
+                     classify=impurityKind != 'variance')
+
+
+def trainDecisionTree(features, labels, impurity='gini', maxDepth=5,
+                      maxBins=32, **ignored):
+    thresholds = binThresholds(features, maxBins)
+    bins = binFeatures(features, thresholds, maxBins)
+    return growTree(bins, thresholds, labels, maxDepth, maxBins, impurity)
+
+
+class ForestModel(object):
+    """Majority vote of classification trees"""
+
+    def __init__(self, trees):
+        self.trees = trees
+
+    def predictScores(self, features):
+        """Return the fraction of trees voting for a failure"""
+        votes = [tree.predict(features) for tree in self.trees]
+        return np.mean(votes, axis=0)
+
+    def predict(self, features):
+        return (self.predictScores(features) > 0.5).astype(np.float64)
+
+
+def trainRandomForest(features, labels, numTrees=10,
+                      featureSubsetStrategy='auto', impurity='gini',
+                      maxDepth=4, maxBins=32, seed=None, **ignored):
+    rng = np.random.RandomState(seed)
+    numColumns = features.shape[1]
+    strategy = featureSubsetStrategy
+    if strategy == 'auto':
+        strategy = 'all' if numTrees == 1 else 'sqrt'
+    numFeatures = {
+        'all': numColumns,
+        'sqrt': int(np.ceil(np.sqrt(numColumns))),
+        'log2': max(1, int(np.ceil(np.log2(numColumns)))),
+        'onethird': max(1, int(np.ceil(numColumns / 3.0))),
+    }[strategy]
+    thresholds = binThresholds(features, maxBins)
+    bins = binFeatures(features, thresholds, maxBins)
+    trees = []
+    for _ in range(numTrees):
+        rows = rng.randint(0, len(labels), len(labels))
+        trees.append(growTree(bins, thresholds, labels, maxDepth, maxBins,
+                              impurity, numFeatures, rng, rows))
+    return ForestModel(trees)
+
+
+class BoostedTreesModel(object):
+    """Weighted sum of regression trees, classified by its sign"""
+
+    # Constant added to the margin, e.g. by sampling.recalibrate
+    offset = 0.0
+
+    def __init__(self, trees, weights):
+        self.trees = trees
+        self.weights = weights
+
+    def predictScores(self, features):
+        """Return the boosted margin, positive for a failure"""
+        margins = np.full(len(features), self.offset)
+        for tree, weight in zip(self.trees, self.weights):
+            margins += weight * tree.predict(features)
+        return margins
+
+    def predict(self, features):
+        return (self.predictScores(features) > 0).astype(np.float64)
+
+
+def trainBoostedTrees(features, labels, numIterations=100, learningRate=0.1,
+                      maxDepth=3, maxBins=32, **ignored):
+    """Gradient boosting with the MLlib log loss on labels in {-1, 1}"""
+    thresholds = binThresholds(features, maxBins)
+    bins = binFeatures(features, thresholds, maxBins)
+    signs = 2.0 * labels - 1.0
+    trees = [growTree(bins, thresholds, signs, maxDepth, maxBins,
+                      'variance')]
+    weights = [1.0]
+    margins = trees[0].predict(features)
+    for _ in range(1, numIterations):
+        residuals = 4.0 * signs / (1.0 + np.exp(2.0 * signs * margins))
+        tree = growTree(bins, thresholds, residuals, maxDepth, maxBins,
+                        'variance')
+        trees.append(tree)
+        weights.append(learningRate)
+        margins += learningRate * tree.predict(features)
+    return BoostedTreesModel(trees, weights)
+
+
+TRAINERS = {
+    'svm': trainSVM,
+    'lr-sgd': trainLogisticSGD,
+    'lr-lbfgs': trainLogisticNewton,
+    'naive-bayes': trainNaiveBayes,
+    'decision-tree': trainDecisionTree,
+    'random-forest': trainRandomForest,
+    'gbt': trainBoostedTrees,
+}
+
+
+def trainModel(spec, features, labels):
+    """Train the model described by spec and apply its threshold"""
+    model = TRAINERS[spec.name](features, labels, **spec.params)
+    if spec.threshold is not None:
+        model.setThreshold(spec.threshold)
+    return model
+
+
+def runModel(spec, training, test, rates=None, cache=None):
+    """Train and evaluate one model, results shaped like modelZoo's
+
+    rates are the class sampling rates of the training set, if it was
+    downsampled; the model is then recalibrated before evaluation.  With a
+    modelCache.ModelCache, a model trained before is loaded instead.
+    """
+    start = time.time()
+    cacheHit = False
+    if cache is None:
+        model = trainModel(spec, *training)
+    else:
+        model, cacheHit = cache.fetch(
+            spec, lambda: trainModel(spec, *training))
+    if rates:
+        model = sampling.recalibrate(model, rates)
+    trained = time.time()
+    results = evaluateArrays(test[1], model.predict(test[0]))
+    evaluated = time.time()
+    metrics.observe('model_train_seconds', trained - start, model=spec.name,
+                    engine='local', cached=cacheHit)
+    metrics.observe('model_eval_seconds', evaluated - trained,
+                    model=spec.name, engine='local')
+    metrics.count('model_predicted_rows_total', len(test[1]),
+                  model=spec.name, engine='local')
+    return {
+        'name': spec.name,
+        'title': spec.title,
+        'spec': spec,
+        'model': model,
+        'metrics': results,
+        'trainSeconds': trained - start,
+        'evalSeconds': evaluated - trained,
+        'cacheHit': cacheHit,
+    }
+
+
+def runModels(training, test, specs=None, rates=None, cache=None):
+    """Train and evaluate the models one after another"""
+    for spec in MODELS if specs is None else specs:
+        yield runModel(spec, training, test, rates, cache)
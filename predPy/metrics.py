@@ -0,0 +1,226 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Timers, counters and histograms of the collectors and the predictor.
+
+Instrumentation is off until enable() is called, and while it is off
+every call returns after one test of ENABLED, and timer() returns a
+shared no-op context manager, so the hooks can stay in the hot paths:
+
+    with metrics.timer('collector_request_seconds'):
+        page = client.new_samples.list(q=query, limit=limit)
+    metrics.count('collector_samples_total', len(page))
+
+    @metrics.timed('features_parse_seconds')
+    def parseTable(lines):
+        ...
+
+Names follow the Prometheus conventions, and keyword arguments become
+labels, e.g. metrics.observe('model_train_seconds', 1.5, model='svm').
+A timer is a histogram of seconds.  The metrics of the process can be
+exported as the Prometheus text format, which collectData.py serves at
+/metrics, or as a JSON profile of the run with dump().
+
+The metrics live in the process that records them: those recorded by
+Spark executors, e.g. while parsing partitions, stay in the executors,
+and only the driver side timings reach the profile of predictor.py.
+"""
+
+import functools
+import json
+import threading
+import time
+
+ENABLED = False
+# Upper bounds of the histogram buckets of durations, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                    0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+
+def reset():
+    """Forget all recorded metrics"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def labelKey(labels):
+    return tuple(sorted((name, str(value))
+                        for name, value in labels.items()))
+
+
+def count(name, value=1, **labels):
+    """Add value to a counter"""
+    if not ENABLED:
+        return
+    key = (name, labelKey(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, buckets=DURATION_BUCKETS, **labels):
+    """Record one value in a histogram"""
+    if not ENABLED:
+        return
+    key = (name, labelKey(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {
+                'buckets': buckets, 'counts': [0] * len(buckets),
+                'count': 0, 'sum': 0.0, 'min': value, 'max': value}
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram['counts'][index] += 1
+                break
+        histogram['count'] += 1
+        histogram['sum'] += value
+        histogram['min'] = min(histogram['min'], value)
+        histogram['max'] = max(histogram['max'], value)
+
+
+class Timer(object):
+    """Context manager observing its duration in a histogram"""
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.time() - self.start, **self.labels)
+        return False
+
+
+class NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+def timer(name, **labels):
+    """Return a context manager timing its block, if enabled"""
+    if not ENABLED:
+        return NULL_TIMER
+    return Timer(name, labels)
+
+
+def timed(name, **labels):
+    """Decorate a function to time its calls"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, time.time() - start, **labels)
+        return wrapper
+    return decorate
+
+
+def seriesName(name, labels):
+    if not labels:
+        return name
+    return '%s{%s}' % (name, ','.join('%s="%s"' % (label, value.replace(
+        '\\', '\\\\').replace('"', '\\"')) for label, value in labels))
+
+
+def snapshot():
+    """Return the counters and histograms as a JSON serializable dict"""
+    with _lock:
+        counters = dict((seriesName(name, labels), value)
+                        for (name, labels), value in _counters.items())
+        histograms = {}
+        for (name, labels), histogram in _histograms.items():
+            histograms[seriesName(name, labels)] = {
+                'count': histogram['count'],
+                'sum': histogram['sum'],
+                'mean': histogram['sum'] / histogram['count'],
+                'min': histogram['min'],
+                'max': histogram['max'],
+                'buckets': dict(
+                    (repr(bound), total) for bound, total in
+                    zip(histogram['buckets'], histogram['counts'])
+                    if total),
+            }
+    return {'counters': counters, 'histograms': histograms}
+
+
+def exposition():
+    """Return the metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, dict(histogram, counts=list(
+            histogram['counts']))) for key, histogram in _histograms.items())
+    declared = set()
+    for (name, labels), value in counters:
+        if name not in declared:
+            lines.append('# TYPE %s counter' % name)
+            declared.add(name)
+        lines.append('%s %r' % (seriesName(name, labels), value))
+    for (name, labels), histogram in histograms:
+        if name not in declared:
+            lines.append('# TYPE %s histogram' % name)
+            declared.add(name)
+        cumulative = 0
+        for bound, total in zip(histogram['buckets'], histogram['counts']):
+            cumulative += total
+            lines.append('%s %d' % (seriesName(
+                name + '_bucket', labels + (('le', repr(bound)),)),
+                cumulative))
+        lines.append('%s %d' % (seriesName(
+            name + '_bucket', labels + (('le', '+Inf'),)),
+            histogram['count']))
+        lines.append('%s %r' % (seriesName(name + '_sum', labels),
+                                histogram['sum']))
+        lines.append('%s %d' % (seriesName(name + '_count', labels),
+                                histogram['count']))
+    return '\n'.join(lines) + '\n'
+
+
+def dump(path, **info):
+    """Write the metrics and info, e.g. the arguments, as a JSON profile"""
+    profile = snapshot()
+    profile.update(info)
+    with open(path, 'w') as fout:
+        json.dump(profile, fout, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        fout.write('\n')
@@ -0,0 +1,176 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Content-addressed memoization of trained models.
+
+A rerun of predictor.py after changing one model's settings should not
+retrain the other six.  ModelCache keys every trained model by the SHA-1
+of everything its training depends on: CACHE_VERSION, the dataset
+fingerprint, the feature slices, the split seed, the engine, the sampling
+rates and the model's name, hyperparameters and threshold.  Entries are
+stored in the model store format of modelStore, one store directory per
+key, and loaded instead of retrained on a hit.
+
+The cache is bounded to maxBytes.  Every hit touches its entry, and after
+a new entry is stored the least recently used entries are evicted until
+the total size fits.  Storing and evicting hold one lock, so models
+trained in parallel do not evict an entry while it is written.  The hits,
+misses and evictions of a run are reported by summary().
+"""
+
+from __future__ import print_function
+import hashlib
+import json
+import os
+import shutil
+import threading
+from featureCache import fileDigest
+from features import SELECTED_SLICES
+import modelStore
+
+# Bump when a trainer or the stored model format changes, so that models
+# cached by older code are trained again
+CACHE_VERSION = 1
+
+
+def datasetFingerprint(path):
+    """SHA-1 of a local input file, its path for other URLs"""
+    if os.path.isfile(path):
+        return fileDigest(path)
+    return path
+
+
+def directorySize(path):
+    """Total size of the files below path"""
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class ModelCache(object):
+    """Size-bounded LRU cache of trained models on disk"""
+
+    def __init__(self, cacheDir, maxBytes, dataset, seed=0, engine='local',
+                 rates=None, perSerial=False, slices=SELECTED_SLICES):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.engine = engine
+        self.context = {
+            'version': CACHE_VERSION,
+            'dataset': dataset,
+            'slices': [list(s) for s in slices],
+            'seed': seed,
+            'engine': engine,
+            'rates': sorted((rates or {}).items()),
+            'perSerial': perSerial,
+        }
+        self.lock = threading.Lock()
+        self.hits = []
+        self.misses = []
+        self.evictions = 0
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+
+    def key(self, spec):
+        """Return the content address of the model described by spec"""
+        content = dict(self.context, name=spec.name, params=spec.params,
+                       threshold=spec.threshold)
+        return hashlib.sha1(json.dumps(content, sort_keys=True).encode(
+            'utf-8')).hexdigest()
+
+    def load(self, spec, sc=None):
+        """Return the cached model of spec, or None on a miss"""
+        entryDir = os.path.join(self.cacheDir, self.key(spec))
+        if not os.path.exists(os.path.join(entryDir, spec.name,
+                                           modelStore.META_FILE)):
+            return None
+        try:
+            if self.engine == 'spark':
+                model, _ = modelStore.loadSparkModel(sc, entryDir, spec.name)
+            else:
+                model, _ = modelStore.loadModel(entryDir, spec.name)
+        except (IOError, OSError, ValueError):
+            return None
+        # The modification time of an entry is its LRU stamp
+        os.utime(entryDir, None)
+        return model
+
+    def store(self, spec, model, sc=None):
+        """Save a freshly trained model and evict down to maxBytes"""
+        key = self.key(spec)
+        with self.lock:
+            modelStore.saveModel(os.path.join(self.cacheDir, key), spec,
+                                 model, self.engine, sc)
+            self.evictLocked(keep=key)
+
+    def fetch(self, spec, train, sc=None):
+        """Return (model, hit): the cached model, or train() stored"""
+        model = self.load(spec, sc)
+        if model is not None:
+            with self.lock:
+                self.hits.append(spec.name)
+            return model, True
+        model = train()
+        self.store(spec, model, sc)
+        with self.lock:
+            self.misses.append(spec.name)
+        return model, False
+
+    def evict(self, keep=None):
+        """Remove least recently used entries while over maxBytes"""
+        with self.lock:
+            self.evictLocked(keep)
+
+    def evictLocked(self, keep=None):
+        """evict, with the lock already held"""
+        entries = []
+        for name in os.listdir(self.cacheDir):
+            path = os.path.join(self.cacheDir, name)
+            if os.path.isdir(path):
+                entries.append((os.path.getmtime(path), name,
+                                directorySize(path)))
+        total = sum(size for _, _, size in entries)
+        for _, name, size in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cacheDir, name),
+                          ignore_errors=True)
+            total -= size
+            self.evictions += 1
+
+    def summary(self):
+        """Return the hit, miss and eviction counts of this run"""
+        return {
+            'hits': len(self.hits),
+            'misses': len(self.misses),
+            'evictions': self.evictions,
+            'hitModels': sorted(self.hits),
+            'missModels': sorted(self.misses),
+        }
+
+    def printSummary(self):
+        summary = self.summary()
+        print("Model cache: %d hits (%s), %d misses (%s), %d evictions" %
+              (summary['hits'], ', '.join(summary['hitModels']) or '-',
+               summary['misses'], ', '.join(summary['missModels']) or '-',
+               summary['evictions']))
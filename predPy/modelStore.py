@@ -0,0 +1,166 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Persistence of trained models with their feature spec and threshold.
+
+Every model is stored in its own directory under the store:
+
+    <store>/<name>/meta.json    name, engine, params, slices, threshold
+    <store>/<name>/model.pkl    model usable without Spark, if any
+    <store>/<name>/spark/       MLlib model saved with model.save(sc, path)
+
+Local engine models are pickled as they are.  MLlib linear models (SVM and
+logistic regression) are also exported as a localEngine.LinearModel, so
+that they can be scored without a SparkContext; the MLlib tree models can
+only be loaded back into Spark.
+"""
+
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import numpy as np
+from features import SELECTED_SLICES
+from localEngine import LinearModel
+
+META_FILE = 'meta.json'
+MODEL_FILE = 'model.pkl'
+SPARK_DIR = 'spark'
+
+# MLlib model classes able to load the saved models, by spec name
+SPARK_MODEL_CLASSES = {
+    'svm': ('pyspark.mllib.classification', 'SVMModel'),
+    'lr-sgd': ('pyspark.mllib.classification', 'LogisticRegressionModel'),
+    'lr-lbfgs': ('pyspark.mllib.classification', 'LogisticRegressionModel'),
+    'naive-bayes': ('pyspark.mllib.classification', 'NaiveBayesModel'),
+    'decision-tree': ('pyspark.mllib.tree', 'DecisionTreeModel'),
+    'random-forest': ('pyspark.mllib.tree', 'RandomForestModel'),
+    'gbt': ('pyspark.mllib.tree', 'GradientBoostedTreesModel'),
+}
+
+
+def exportLinear(name, model):
+    """Return a LinearModel equivalent of an MLlib linear model, or None"""
+    if name not in ('svm', 'lr-sgd', 'lr-lbfgs'):
+        return None
+    local = LinearModel(np.asarray(model.weights.toArray()),
+                        float(model.intercept), logistic=name != 'svm')
+    if model.threshold is not None:
+        local.setThreshold(float(model.threshold))
+    return local
+
+
+def saveModel(storeDir, spec, model, engine='local', sc=None,
+              slices=SELECTED_SLICES, metrics=None):
+    """Save a trained model and its metadata, replacing any older version
+
+    sc is required to save MLlib models.  The new version is written next
+    to the old one and swapped in with renames.
+    """
+    if not os.path.isdir(storeDir):
+        os.makedirs(storeDir)
+    tmpDir = tempfile.mkdtemp(dir=storeDir)
+    try:
+        local = model
+        if engine == 'spark':
+            model.save(sc, os.path.join(tmpDir, SPARK_DIR))
+            local = exportLinear(spec.name, model)
+        if local is not None:
+            with open(os.path.join(tmpDir, MODEL_FILE), 'wb') as fout:
+                pickle.dump(local, fout, pickle.HIGHEST_PROTOCOL)
+        threshold = getattr(local if local is not None else model,
+                            'threshold', None)
+        meta = {
+            'name': spec.name,
+            'title': spec.title,
+            'engine': engine,
+            'params': spec.params,
+            'slices': [list(s) for s in slices],
+            'threshold': threshold,
+            'scorable': local is not None,
+            'metrics': metrics,
+            'savedAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(os.path.join(tmpDir, META_FILE), 'w') as fout:
+            json.dump(meta, fout, indent=2)
+        modelDir = os.path.join(storeDir, spec.name)
+        oldDir = None
+        if os.path.exists(modelDir):
+            oldDir = tempfile.mkdtemp(dir=storeDir)
+            os.rmdir(oldDir)
+            os.rename(modelDir, oldDir)
+        os.rename(tmpDir, modelDir)
+        if oldDir:
+            shutil.rmtree(oldDir)
+    finally:
+        if os.path.exists(tmpDir):
+            shutil.rmtree(tmpDir)
+    return modelDir
+
+
+def listModels(storeDir):
+    """Return the names of the models in the store"""
+    if not os.path.isdir(storeDir):
+        return []
+    return sorted(name for name in os.listdir(storeDir)
+                  if os.path.exists(os.path.join(storeDir, name, META_FILE)))
+
+
+def modelPath(storeDir, name, *parts):
+    """Return a path in the directory of a stored model
+
+    Raises ValueError if name is not one of listModels, so that a name
+    from a request cannot point outside of the store.
+    """
+    if name not in listModels(storeDir):
+        raise ValueError("Unknown model %r" % (name,))
+    return os.path.join(storeDir, name, *parts)
+
+
+def readMeta(storeDir, name):
+    """Return the metadata of a stored model"""
+    with open(modelPath(storeDir, name, META_FILE)) as fin:
+        return json.load(fin)
+
+
+def loadModel(storeDir, name):
+    """Return the (model, meta) of a stored model scorable without Spark"""
+    meta = readMeta(storeDir, name)
+    if not meta['scorable']:
+        raise ValueError("Model %s can only be loaded with loadSparkModel" %
+                         name)
+    with open(modelPath(storeDir, name, MODEL_FILE), 'rb') as fin:
+        model = pickle.load(fin)
+    return model, meta
+
+
+def loadSparkModel(sc, storeDir, name):
+    """Return the (MLlib model, meta) of a model trained on Spark"""
+    meta = readMeta(storeDir, name)
+    if meta['engine'] != 'spark':
+        raise ValueError("Model %s was not trained on Spark" % name)
+    moduleName, className = SPARK_MODEL_CLASSES[name]
+    module = __import__(moduleName, fromlist=[className])
+    model = getattr(module, className).load(
+        sc, modelPath(storeDir, name, SPARK_DIR))
+    if meta['threshold'] is not None and hasattr(model, 'setThreshold'):
+        model.setThreshold(meta['threshold'])
+    return model, meta
@@ -0,0 +1,130 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Model zoo of the hard drive failure predictors.
+
+TRAINERS maps the specs of models.MODELS to the MLlib trainers.  runModels
+caches one training/test split and trains the selected models concurrently
+from a bounded pool of driver threads.  Every thread submits its jobs to
+its own FAIR scheduler pool, named after the model, so that small jobs of
+one model do not queue behind another model's stages.  This needs
+spark.scheduler.mode=FAIR, which predictor.py sets.
+"""
+
+from __future__ import print_function
+import time
+from multiprocessing.pool import ThreadPool
+from pyspark.mllib.classification import SVMWithSGD
+from pyspark.mllib.classification import LogisticRegressionWithSGD
+from pyspark.mllib.classification import LogisticRegressionWithLBFGS
+from pyspark.mllib.classification import NaiveBayes
+from pyspark.mllib.tree import DecisionTree
+from pyspark.mllib.tree import RandomForest
+from pyspark.mllib.tree import GradientBoostedTrees
+from evaluation import evaluate, predictLabels
+from models import MODELS
+from sampling import recalibrate
+import metrics
+
+TRAINERS = {
+    'svm': SVMWithSGD.train,
+    'lr-sgd': LogisticRegressionWithSGD.train,
+    'lr-lbfgs': LogisticRegressionWithLBFGS.train,
+    'naive-bayes': NaiveBayes.train,
+    'decision-tree': DecisionTree.trainClassifier,
+    'random-forest': RandomForest.trainClassifier,
+    'gbt': GradientBoostedTrees.trainClassifier,
+}
+
+
+def trainModel(spec, trainingData):
+    """Train the model described by spec and apply its threshold"""
+    model = TRAINERS[spec.name](trainingData, **spec.params)
+    if spec.threshold is not None:
+        model.setThreshold(spec.threshold)
+    return model
+
+
+def splitData(data, weights=(0.8, 0.2), seed=0):
+    """Split data once into cached, materialized training and test sets"""
+    trainingData, testData = data.randomSplit(list(weights), seed=seed)
+    trainingData.cache()
+    testData.cache()
+    trainingData.count()
+    testData.count()
+    return trainingData, testData
+
+
+def runModel(sc, spec, trainingData, testData, rates=None, cache=None):
+    """Train and evaluate one model inside its FAIR scheduler pool
+
+    rates are the class sampling rates of the training set, if it was
+    downsampled; the model is then recalibrated before evaluation.  With a
+    modelCache.ModelCache, a model trained before is loaded instead.
+    """
+    sc.setLocalProperty('spark.scheduler.pool', spec.name)
+    try:
+        start = time.time()
+        cacheHit = False
+        if cache is None:
+            model = trainModel(spec, trainingData)
+        else:
+            model, cacheHit = cache.fetch(
+                spec, lambda: trainModel(spec, trainingData), sc)
+        if rates:
+            model = recalibrate(model, rates)
+        trained = time.time()
+        results = evaluate(predictLabels(model, testData))
+        evaluated = time.time()
+        metrics.observe('model_train_seconds', trained - start,
+                        model=spec.name, engine='spark', cached=cacheHit)
+        metrics.observe('model_eval_seconds', evaluated - trained,
+                        model=spec.name, engine='spark')
+        return {
+            'name': spec.name,
+            'title': spec.title,
+            'spec': spec,
+            'model': model,
+            'metrics': results,
+            'trainSeconds': trained - start,
+            'evalSeconds': evaluated - trained,
+            'cacheHit': cacheHit,
+        }
+    finally:
+        sc.setLocalProperty('spark.scheduler.pool', None)
+
+
+def runModels(sc, trainingData, testData, specs=None, parallelism=4,
+              rates=None, cache=None):
+    """Train and evaluate the models concurrently
+
+    At most parallelism models are trained at the same time.  The results
+    are yielded in the order the models finish.
+    """
+    specs = MODELS if specs is None else specs
+    pool = ThreadPool(max(1, min(parallelism, len(specs))))
+    try:
+        results = pool.imap_unordered(
+            lambda spec: runModel(sc, spec, trainingData, testData, rates,
+                                  cache), specs)
+        for result in results:
+            yield result
+    finally:
+        pool.close()
+        pool.join()
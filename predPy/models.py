@@ -0,0 +1,77 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Specs of the hard drive failure models.
+
+MODELS lists the seven model families with the hyperparameters used by
+predictor.py.  The specs do not depend on Spark: modelZoo maps them to the
+MLlib trainers and localEngine to its NumPy implementations.
+"""
+
+import collections
+
+# name: short identifier, also used as the FAIR scheduler pool name
+# title: human readable name printed with the metrics
+# params: hyperparameters of the model
+# threshold: decision threshold set after training, None keeps the default
+ModelSpec = collections.namedtuple(
+    'ModelSpec', ['name', 'title', 'params', 'threshold'])
+
+# Empty categoricalFeaturesInfo indicates all features are continuous.
+MODELS = [
+    ModelSpec('svm', "SVM model",
+              {'iterations': 200, 'regParam': 7e-2, 'intercept': True},
+              None),
+    ModelSpec('lr-sgd', "Logistic Regression model with SGD algorithm",
+              {'iterations': 200, 'regParam': 8e-2, 'intercept': True},
+              0.40),
+    ModelSpec('lr-lbfgs', "Logistic Regression model with LBFGS algorithm",
+              {'iterations': 200, 'regParam': 7e-2, 'intercept': True},
+              0.45),
+    ModelSpec('naive-bayes', "Multinomial Naive Bayes",
+              {'lambda_': 7e-1}, None),
+    ModelSpec('decision-tree', "decision tree model",
+              {'numClasses': 2, 'categoricalFeaturesInfo': {},
+               'impurity': 'entropy', 'maxDepth': 4, 'maxBins': 32},
+              None),
+    # Note: Use larger numTrees in practice.
+    ModelSpec('random-forest', "random forest model",
+              {'numClasses': 2, 'categoricalFeaturesInfo': {},
+               'numTrees': 15, 'featureSubsetStrategy': 'auto',
+               'impurity': 'gini', 'maxDepth': 12, 'maxBins': 32},
+              None),
+    ModelSpec('gbt', "Gradient Boosted Trees model",
+              {'categoricalFeaturesInfo': {}, 'numIterations': 20,
+               'maxDepth': 8, 'maxBins': 32},
+              None),
+]
+
+MODELS_BY_NAME = dict((spec.name, spec) for spec in MODELS)
+
+
+def selectModels(names=None):
+    """Return the specs of the named models, all of them by default"""
+    if not names:
+        return list(MODELS)
+    unknown = [name for name in names if name not in MODELS_BY_NAME]
+    if unknown:
+        raise ValueError("Unknown models: %s (choose from %s)" %
+                         (', '.join(unknown),
+                          ', '.join(spec.name for spec in MODELS)))
+    return [MODELS_BY_NAME[name] for name in names]
@@ -31,286 +31,189 @@ Gradient Boosted Trees
 """
 
 from __future__ import print_function
-from pyspark import SparkContext
-import csv
-import StringIO
-# import tempfile
-# from shutil import rmtree
-from pyspark.mllib.linalg import Vectors
-from pyspark.mllib.regression import LabeledPoint
-from pyspark.mllib.classification import SVMWithSGD
-# from pyspark.mllib.classification import SVMModel
-from pyspark.mllib.classification import LogisticRegressionWithSGD
-from pyspark.mllib.classification import LogisticRegressionWithLBFGS
-# from pyspark.mllib.classification import LogisticRegressionModel
-from pyspark.mllib.classification import NaiveBayes
-# from pyspark.mllib.classification import NaiveBayesModel
-from pyspark.mllib.tree import DecisionTree
-# from pyspark.mllib.tree import DecisionTreeModel
-from pyspark.mllib.tree import RandomForest
-# from pyspark.mllib.tree import RandomForestModel
-from pyspark.mllib.tree import GradientBoostedTrees
-# from pyspark.mllib.tree import GradientBoostedTreesModel
-
-
-def loadRecord(line):
-    """Load a CSV line and select 26 indicative parameters"""
-    inputLine = StringIO.StringIO(line)
-    reader = csv.reader(inputLine)
-    parameters = reader.next()
-    # Instances that were collected within seven days before the failures
-    # are used to train the failing model
-    # if float(parameters[-1]) == 1 and float(parameters[3]) >= 360:
-    #    parameters[-1] = 0
-    selectedParameters = (
-        parameters[12:17] + parameters[19:20] + parameters[23:26] +
-        parameters[39:47] + parameters[54:61] + parameters[62:]
-    )
-    # selectedParameters = parameters
-    return selectedParameters
+import argparse
+import os
+from features import SELECTED_SLICES, iterBlocks, selectTable
+from featureCache import cachedPoints, openSource
+from featureStats import loadSelection
+from evaluation import printMetrics
+from models import selectModels
+from modelCache import ModelCache, datasetFingerprint
+from modelStore import saveModel
+from sampling import downsample, parseRates, sampleRDD
+import arffReader
+import localEngine
+import metrics
+import roc
+
+# pyspark and modelZoo, which needs it, are only imported by the Spark
+# engine, so --engine local runs without Spark installed
 
 
 def parseLine(line):
     """Parse a row """
+    from pyspark.mllib.linalg import Vectors
+    from pyspark.mllib.regression import LabeledPoint
     label = float(line[-1])
     features = Vectors.dense(map(float, line[:-1]))
     return LabeledPoint(label, features)
 
 
-if __name__ == "__main__":
-
-    sc = SparkContext(appName="HardDriveFailurePrediction")
-
-    # $example on$
-    data = (sc.textFile('hdd/harddrive1.csv').map(loadRecord).
-            map(parseLine))
-
-    print("===== Choose SVM model =====")
-    # Split data aproximately into training (80%) and test (20%)
-    trainingData, testData = data.randomSplit([0.8, 0.2], seed=0)
-
-    # Train a SVM model
-    model = SVMWithSGD.train(trainingData, iterations=200, regParam=7e-2,
-                             intercept=True)
-
-    # Make prediction and test accuracy.
-#    labelsAndPredictions = (testData
-#        .map(lambda p: (p.label, model.predict(p.features))))
-#    accuracy = (labelsAndPredictions
-#        .filter(lambda (x, v): x == v).count() / float(testData.count()))
-    predictions = model.predict(testData.map(lambda x: x.features))
-    labelsAndPredictions = testData.map(lambda p: p.label).zip(predictions)
-    tp = labelsAndPredictions.filter(lambda (v, p): v == p and p == 1).count()
-    tn = labelsAndPredictions.filter(lambda (v, p): v == p and p == 0).count()
-    fp = labelsAndPredictions.filter(lambda (v, p): v != p and p == 1).count()
-    fn = labelsAndPredictions.filter(lambda (v, p): v != p and p == 0).count()
-    accuracy = (labelsAndPredictions.filter(lambda (v, p): v == p).
-                count() / float(testData.count()))
-    print("true positive number: %d, false positive number: %d" % (tp, fp))
-    print("false negative number: %d, true negative number: %d" % (fn, tn))
-    recall = tp / float(tp + fn)
-    fprate = fp / float(fp + tn)
-    print("The test accuracy of SVM model is: %.4f" % accuracy)
-    print("The test recall of SVM model is: %.4f" % recall)
-    print("The test fprate of SVM model is: %.4f\n\n" % fprate)
-
-    print("===== Choose Logistic Regression model with SGD algorithm =====")
-    # Split data aproximately into training (80%) and test (20%)
-    trainingData, testData = data.randomSplit([0.8, 0.2], seed=0)
-
-    # Train a logistic regression model
-    model = LogisticRegressionWithSGD.train(trainingData, iterations=200,
-                                            regParam=8e-2, intercept=True)
-
-    # Make prediction and test accuracy.
-    print("The original threshold: %0.2f" % float(model.threshold))
-    model.setThreshold(0.40)
-    print("The current threshold: %0.2f" % float(model.threshold))
-    predictions = model.predict(testData.map(lambda x: x.features))
-    labelsAndPredictions = testData.map(lambda p: p.label).zip(predictions)
-    tp = labelsAndPredictions.filter(lambda (v, p): v == p and p == 1).count()
-    tn = labelsAndPredictions.filter(lambda (v, p): v == p and p == 0).count()
-    fp = labelsAndPredictions.filter(lambda (v, p): v != p and p == 1).count()
-    fn = labelsAndPredictions.filter(lambda (v, p): v != p and p == 0).count()
-    accuracy = (labelsAndPredictions.filter(lambda (v, p): v == p).
-                count() / float(testData.count()))
-    print("true positive number: %d, false positive number: %d" % (tp, fp))
-    print("false negative number: %d, true negative number: %d" % (fn, tn))
-    recall = tp / float(tp + fn)
-    fprate = fp / float(fp + tn)
-    print("The test accuracy of Logistic Regression model with"
-          " SGD algorithm is: %.4f" % accuracy)
-    print("The test recall of Logistic Regression model with"
-          " SGD algorithm is: %.4f" % recall)
-    print("The test fprate of Logistic Regression model with"
-          " SGD algorithm is: %.4f\n\n" % fprate)
-
-    print("===== Choose Logistic Regression model with LBFGS algorithm =====")
-    # Split data aproximately into training (80%) and test (20%)
-    trainingData, testData = data.randomSplit([0.8, 0.2], seed=0)
+def parsePartition(lines, slices=SELECTED_SLICES):
+    """Parse a partition of CSV lines into LabeledPoints block by block
 
-    # Train a logistic regression model
-    model = LogisticRegressionWithLBFGS.train(trainingData, iterations=200,
-                                              regParam=7e-2, intercept=True)
+    This replaces map(loadRecord).map(parseLine): the lines are converted
+    to NumPy blocks in bulk and LabeledPoints are only created at the end,
+    when MLlib needs them.
+    """
+    from pyspark.mllib.regression import LabeledPoint
+    for features, labels in iterBlocks(lines, slices=slices):
+        for label, row in zip(labels, features):
+            yield LabeledPoint(float(label), row)
 
-    # Make prediction and test accuracy.
-    print("The original threshold: %0.2f" % float(model.threshold))
-    model.setThreshold(0.45)
-    print("The current threshold: %0.2f" % float(model.threshold))
-    predictions = model.predict(testData.map(lambda x: x.features))
-    labelsAndPredictions = testData.map(lambda p: p.label).zip(predictions)
-    tp = labelsAndPredictions.filter(lambda (v, p): v == p and p == 1).count()
-    tn = labelsAndPredictions.filter(lambda (v, p): v == p and p == 0).count()
-    fp = labelsAndPredictions.filter(lambda (v, p): v != p and p == 1).count()
-    fn = labelsAndPredictions.filter(lambda (v, p): v != p and p == 0).count()
-    accuracy = (labelsAndPredictions.filter(lambda (v, p): v == p).
-                count() / float(testData.count()))
-    print("true positive number: %d, false positive number: %d" % (tp, fp))
-    print("false negative number: %d, true negative number: %d" % (fn, tn))
-    recall = tp / float(tp + fn)
-    fprate = fp / float(fp + tn)
-    print("The test accuracy of Logistic Regression model with"
-          " LBFGS algorithm is: %.4f" % accuracy)
-    print("The test recall of Logistic Regression model with"
-          " LBFGS algorithm is: %.4f" % recall)
-    print("The test fprate of Logistic Regression model with"
-          " LBFGS algorithm is: %.4f\n\n" % fprate)
 
-    print("===== Choose Multinomial Naive Bayes model =====")
-    # Split data aproximately into training (80%) and test (20%)
-    trainingData, testData = data.randomSplit([0.8, 0.2], seed=0)
+def tablePoints(table, slices=SELECTED_SLICES):
+    """Return the LabeledPoints of the selected columns of a parsed table"""
+    from pyspark.mllib.regression import LabeledPoint
+    features, labels = selectTable(table, slices)
+    return [LabeledPoint(float(label), row)
+            for label, row in zip(labels, features)]
 
-    # Train a multinomial naive Bayes model given an RDD of LabeledPoint.
-    model = NaiveBayes.train(trainingData, 7e-1)
-
-    # Make prediction and test accuracy.
-    predictions = model.predict(testData.map(lambda x: x.features))
-    labelsAndPredictions = testData.map(lambda p: p.label).zip(predictions)
-    tp = labelsAndPredictions.filter(lambda (v, p): v == p and p == 1).count()
-    tn = labelsAndPredictions.filter(lambda (v, p): v == p and p == 0).count()
-    fp = labelsAndPredictions.filter(lambda (v, p): v != p and p == 1).count()
-    fn = labelsAndPredictions.filter(lambda (v, p): v != p and p == 0).count()
-    accuracy = (labelsAndPredictions.filter(lambda (v, p): v == p).
-                count() / float(testData.count()))
-    print("true positive number: %d, false positive number: %d" % (tp, fp))
-    print("false negative number: %d, true negative number: %d" % (fn, tn))
-    recall = tp / float(tp + fn)
-    fprate = fp / float(fp + tn)
-    print("The test accuracy of Multinomial Naive Bayes "
-          "is: %.4f" % accuracy)
-    print("The test recall of Multinomial Naive Bayes "
-          "is: %.4f" % recall)
-    print("The test fprate of Multinomial Naive Bayes "
-          "is: %.4f\n\n" % fprate)
-
-    print("===== Choose Decision Tree  model =====")
-    # Split data aproximately into training (80%) and test (20%)
-    trainingData, testData = data.randomSplit([0.8, 0.2], seed=0)
-
-    # Train a decision tree model.
-    # Empty categoricalFeaturesInfo indicates all features are continuous.
-    model = DecisionTree.trainClassifier(trainingData, numClasses=2,
-                                         categoricalFeaturesInfo={},
-                                         impurity='entropy', maxDepth=4,
-                                         maxBins=32)
-    # print('Learned classification tree model:')
-    # print(model.toDebugString())
-
-    # Make prediction and test accuracy.
-    predictions = model.predict(testData.map(lambda x: x.features))
-    labelsAndPredictions = testData.map(lambda p: p.label).zip(predictions)
-    tp = labelsAndPredictions.filter(lambda (v, p): v == p and p == 1).count()
-    tn = labelsAndPredictions.filter(lambda (v, p): v == p and p == 0).count()
-    fp = labelsAndPredictions.filter(lambda (v, p): v != p and p == 1).count()
-    fn = labelsAndPredictions.filter(lambda (v, p): v != p and p == 0).count()
-    accuracy = (labelsAndPredictions.filter(lambda (v, p): v == p).
-                count() / float(testData.count()))
-    print("true positive number: %d, false positive number: %d" % (tp, fp))
-    print("false negative number: %d, true negative number: %d" % (fn, tn))
-    recall = tp / float(tp + fn)
-    fprate = fp / float(fp + tn)
-    print("The test accuracy of decision tree model is: %.4f" % accuracy)
-    print("The test recall of decision tree model is: %.4f" % recall)
-    print("The test fprate of decision tree model is: %.4f\n\n" % fprate)
-
-    print("===== Choose Random Forest model =====")
-    # Split data aproximately into training (80%) and test (20%)
-    trainingData, testData = data.randomSplit([0.8, 0.2], seed=0)
-
-    # Train a Random Forest model.
-    # Empty categoricalFeaturesInfo indicates all features are continuous.
-    # Note: Use larger numTrees in practice.
-    # Setting featureSubsetStrategy="auto" lets the algorithm choose.
-    model = RandomForest.trainClassifier(trainingData, numClasses=2,
-                                         categoricalFeaturesInfo={},
-                                         numTrees=15,
-                                         featureSubsetStrategy="auto",
-                                         impurity='gini', maxDepth=12,
-                                         maxBins=32)
-    # print('Learned classification tree model:')
-    # print(model.toDebugString())
-
-    # Make prediction and test accuracy.
-    predictions = model.predict(testData.map(lambda x: x.features))
-    labelsAndPredictions = testData.map(lambda p: p.label).zip(predictions)
-    tp = labelsAndPredictions.filter(lambda (v, p): v == p and p == 1).count()
-    tn = labelsAndPredictions.filter(lambda (v, p): v == p and p == 0).count()
-    fp = labelsAndPredictions.filter(lambda (v, p): v != p and p == 1).count()
-    fn = labelsAndPredictions.filter(lambda (v, p): v != p and p == 0).count()
-    accuracy = (labelsAndPredictions.filter(lambda (v, p): v == p).
-                count() / float(testData.count()))
-    print("true positive number: %d, false positive number: %d" % (tp, fp))
-    print("false negative number: %d, true negative number: %d" % (fn, tn))
-    recall = tp / float(tp + fn)
-    fprate = fp / float(fp + tn)
-    print("The test accuracy of random forest model is: %.4f" % accuracy)
-    print("The test recall of random forest model is: %.4f" % recall)
-    print("The test fprate of random forest model is: %.4f\n\n" % fprate)
-
-    print("===== Choose Gradient Boosted Trees model =====")
-    # Split data aproximately into training (80%) and test (20%)
-    trainingData, testData = data.randomSplit([0.8, 0.2], seed=0)
-
-    # Train a GradientBoostedTrees model.
-    # Empty categoricalFeaturesInfo indicates all features are continuous.
-    model = GradientBoostedTrees.trainClassifier(trainingData,
-                                                 categoricalFeaturesInfo={},
-                                                 numIterations=20, maxDepth=8,
-                                                 maxBins=32)
-    # print('Learned classification tree model:')
-    # print(model.toDebugString())
-
-    # Make prediction and test accuracy.
-    predictions = model.predict(testData.map(lambda x: x.features))
-    labelsAndPredictions = testData.map(lambda p: p.label).zip(predictions)
-    tp = labelsAndPredictions.filter(lambda (v, p): v == p and p == 1).count()
-    tn = labelsAndPredictions.filter(lambda (v, p): v == p and p == 0).count()
-    fp = labelsAndPredictions.filter(lambda (v, p): v != p and p == 1).count()
-    fn = labelsAndPredictions.filter(lambda (v, p): v != p and p == 0).count()
-    accuracy = (labelsAndPredictions.filter(lambda (v, p): v == p).
-                count() / float(testData.count()))
-    print("true positive number: %d, false positive number: %d" % (tp, fp))
-    print("false negative number: %d, true negative number: %d" % (fn, tn))
-    recall = tp / float(tp + fn)
-    fprate = fp / float(fp + tn)
-    print("The test accuracy of Gradient Boosted Trees "
-          "model is: %.4f" % accuracy)
-    print("The test recall of Gradient Boosted Trees "
-          "model is: %.4f" % recall)
-    print("The test fprate of Gradient Boosted Trees "
-          "model is: %.4f" % fprate)
 
+if __name__ == "__main__":
 
-# Save and load model
-#    path = tempfile.mkdtemp(dir='.')
-#    model.save(sc, path)
-#    sameModel = SVMModel.load(sc, path)
-#    sameModel = LogisticRegressionModel.load(sc, path)
-#    sameModel = NaiveBayesModel.load(sc, path)
-#    sameModel = DecisionTreeModel.load(sc, path)
-#    sameModel = RandomForestModel.load(sc, path)
-#    sameModel = GradientBoostedTreesModel.load(sc, path)
-#    try:
-#        rmtree(path)
-#    except OSError:
-#        pass
+    parser = argparse.ArgumentParser(
+        description="Train and evaluate the hard drive failure models")
+    parser.add_argument('--input', default='hdd/harddrive1.csv',
+                        help="hard drive CSV or ARFF file, may be "
+                             "gzipped")
+    parser.add_argument('--cache-dir', default=None,
+                        help="read the features from a columnar cache in "
+                             "this directory instead of parsing the CSV")
+    parser.add_argument('--models', default=None,
+                        help="comma separated models to train, "
+                             "all of them by default")
+    parser.add_argument('--parallelism', type=int, default=4,
+                        help="number of models trained concurrently")
+    parser.add_argument('--engine', choices=('spark', 'local'),
+                        default='spark',
+                        help="train on Spark or in-process with NumPy")
+    parser.add_argument('--save-dir', default=None,
+                        help="save the trained models to this model store")
+    parser.add_argument('--roc-dir', default=None,
+                        help="write <model>_ROC.arff curves to this "
+                             "directory")
+    parser.add_argument('--target-fprate', type=float, default=0.01,
+                        help="false positive rate the best threshold of "
+                             "each ROC curve may not exceed")
+    parser.add_argument('--sample-rates', default=None,
+                        help="downsample the training set with these "
+                             "'label:rate' pairs, e.g. 0:0.1")
+    parser.add_argument('--per-serial', action='store_true',
+                        help="sample every drive separately (local engine)")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="seed of the training/test split")
+    parser.add_argument('--model-cache', default=None,
+                        help="reuse models trained before from this directory")
+    parser.add_argument('--model-cache-mb', type=float, default=1024,
+                        help="size bound of the model cache in MB")
+    parser.add_argument('--selection', default=None,
+                        help="train on the columns of this selection spec "
+                             "of featureStats.py instead of the default "
+                             "slices")
+    parser.add_argument('--metrics-profile', default=None,
+                        help="write the timers and counters of the run to "
+                             "this JSON file")
+    args = parser.parse_args()
+    metrics.enable(args.metrics_profile is not None)
+    slices = (loadSelection(args.selection) if args.selection
+              else SELECTED_SLICES)
+    specs = selectModels(args.models and args.models.split(','))
+
+    if args.roc_dir and not os.path.isdir(args.roc_dir):
+        os.makedirs(args.roc_dir)
+    sc = None
+    rates = args.sample_rates and parseRates(args.sample_rates)
+    cache = None
+    if args.model_cache:
+        cache = ModelCache(args.model_cache,
+                           int(args.model_cache_mb * 1024 * 1024),
+                           datasetFingerprint(args.input), args.seed,
+                           args.engine, rates,
+                           args.per_serial and args.engine == 'local',
+                           slices)
+    if args.engine == 'local':
+        features, labels, serials = localEngine.loadData(
+            args.input, args.cache_dir, withSerials=True, slices=slices)
+        mask = localEngine.splitMask(len(labels), seed=args.seed)
+        training = (features[mask], labels[mask])
+        test = (features[~mask], labels[~mask])
+        if rates:
+            training = downsample(training[0], training[1], rates,
+                                  serials[mask] if args.per_serial else None)
+        results = localEngine.runModels(training, test, specs, rates,
+                                        cache)
+    else:
+        from pyspark import SparkConf, SparkContext
+        import modelZoo
+        conf = (SparkConf().setAppName("HardDriveFailurePrediction").
+                set('spark.scheduler.mode', 'FAIR'))
+        sc = SparkContext(conf=conf)
+
+        # $example on$
+        if args.cache_dir:
+            data = cachedPoints(sc, args.input, args.cache_dir,
+                                slices=slices)
+        elif arffReader.isArff(args.input):
+            with openSource(args.input) as fin:
+                schema = arffReader.readSchema(fin)
+            data = arffReader.tablesRDD(sc, args.input, schema).flatMap(
+                lambda table: tablePoints(table, slices))
+        else:
+            data = sc.textFile(args.input).mapPartitions(
+                lambda lines: parsePartition(lines, slices))
+
+        # Split data aproximately into training (80%) and test (20%)
+        with metrics.timer('predictor_load_seconds', engine='spark'):
+            trainingData, testData = modelZoo.splitData(data,
+                                                        seed=args.seed)
+        if rates:
+            with metrics.timer('predictor_sample_seconds', engine='spark'):
+                sampledData = sampleRDD(trainingData, rates).cache()
+                sampledData.count()
+            trainingData.unpersist()
+            trainingData = sampledData
+        results = modelZoo.runModels(sc, trainingData, testData, specs,
+                                     args.parallelism, rates, cache)
+
+    for result in results:
+        print("===== %s %s in %.1f s, evaluated in %.1f s =====" %
+              (result['title'],
+               'loaded' if result['cacheHit'] else 'trained',
+               result['trainSeconds'], result['evalSeconds']))
+        printMetrics(result['title'], result['metrics'])
+        if args.roc_dir:
+            with metrics.timer('predictor_roc_seconds',
+                               model=result['name']):
+                if args.engine == 'local':
+                    curve = roc.curveFromArrays(
+                        test[1], result['model'].predictScores(test[0]))
+                else:
+                    labelsAndScores = roc.sparkScores(
+                        result['name'], result['model'], testData)
+                    curve = labelsAndScores and roc.curveFromRDD(
+                        labelsAndScores, numBins=1000)
+            if curve is not None:
+                roc.writeArff(os.path.join(
+                    args.roc_dir, result['name'] + '_ROC.arff'), curve)
+                roc.printCurveSummary(result['title'], curve,
+                                      args.target_fprate)
+        if args.save_dir:
+            with metrics.timer('predictor_save_seconds',
+                               model=result['name']):
+                saveModel(args.save_dir, result['spec'], result['model'],
+                          args.engine, sc, slices, result['metrics'])
+    if cache is not None:
+        cache.printSummary()
+    if args.metrics_profile:
+        metrics.dump(args.metrics_profile, arguments=vars(args))
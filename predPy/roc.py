@@ -0,0 +1,232 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ROC and precision-recall curves from one pass over raw model scores.
+
+Instead of re-predicting and re-counting for every candidate threshold,
+the models produce their raw scores once (probabilities of the logistic
+regressions, margins of the SVM, the predictScores of the local models).
+The scores are sorted once, on the driver for NumPy arrays or with one
+reduceByKey and sortByKey for an RDD, and cumulative sums give the
+confusion matrix at every distinct threshold.  From it come the ROC curve,
+the PR curve, their areas, and the best threshold under a target false
+positive rate.  The models predict a failure for a score > threshold, as
+do the thresholds of the curves, so a reported threshold can be set on a
+model as is.
+
+writeArff saves a curve in the layout of the Weka ThresholdCurve written
+by the Java Model.crossValidatePredictors as <name>_ROC.arff.
+"""
+
+from __future__ import print_function
+import numpy as np
+from evaluation import metricsFromCounts
+
+# MLlib models able to return raw scores once their threshold is cleared
+SPARK_SCORING_MODELS = ('svm', 'lr-sgd', 'lr-lbfgs')
+
+
+def separatingThresholds(scores):
+    """Return the thresholds t with score > t[i] exactly for scores[:i + 1]
+
+    scores must be distinct and sorted in decreasing order.  t[i] lies
+    midway to the next lower score, so it still separates them once
+    printed with a few digits; below the lowest score it is the next float.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if not len(scores):
+        return scores
+    lower = np.r_[scores[1:], np.nextafter(scores[-1], -np.inf)]
+    middle = lower + (scores - lower) / 2.0
+    # Between two adjacent floats the midpoint rounds to one of them
+    return np.where(middle < scores, middle, lower)
+
+
+def curveFromCounts(scores, positives, negatives, thresholds=None):
+    """Build a curve from per-score positive and negative counts
+
+    scores must be distinct and sorted in decreasing order.  Entry i of
+    the curve counts every score >= scores[i] as a predicted failure,
+    which a model predicts for a score > thresholds[i], by default the
+    separatingThresholds of scores.
+    """
+    if thresholds is None:
+        thresholds = separatingThresholds(scores)
+    tp = np.cumsum(positives).astype(np.float64)
+    fp = np.cumsum(negatives).astype(np.float64)
+    totalPositives, totalNegatives = tp[-1], fp[-1]
+    return {
+        'threshold': np.asarray(thresholds, dtype=np.float64),
+        'tp': tp,
+        'fp': fp,
+        'fn': totalPositives - tp,
+        'tn': totalNegatives - fp,
+    }
+
+
+def curveFromArrays(labels, scores):
+    """Build the curve from NumPy label and score arrays"""
+    labels = np.asarray(labels) == 1
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.argsort(-scores, kind='mergesort')
+    scores, labels = scores[order], labels[order]
+    # Last position of every run of equal scores
+    last = np.r_[scores[1:] != scores[:-1], True]
+    tp = np.cumsum(labels)[last]
+    fp = np.cumsum(~labels)[last]
+    return curveFromCounts(scores[last], np.diff(np.r_[0, tp]),
+                           np.diff(np.r_[0, fp]))
+
+
+def curveFromRDD(labelsAndScores, numBins=None):
+    """Build the curve from an RDD of (label, score) pairs
+
+    One reduceByKey counts the positives and negatives of every distinct
+    score and sortByKey orders them.  With numBins, consecutive scores are
+    merged on the driver so the curve has at most about numBins points.
+    """
+    counts = (labelsAndScores.
+              map(lambda pair: (float(pair[1]),
+                                (1, 0) if pair[0] == 1 else (0, 1))).
+              reduceByKey(lambda a, b: (a[0] + b[0], a[1] + b[1])).
+              sortByKey(ascending=False).collect())
+    if not counts:
+        raise ValueError("No scores to build a curve from")
+    scores = np.array([score for score, _ in counts])
+    positives = np.array([pair[0] for _, pair in counts])
+    negatives = np.array([pair[1] for _, pair in counts])
+    thresholds = separatingThresholds(scores)
+    if numBins and len(scores) > numBins:
+        step = int(np.ceil(len(scores) / float(numBins)))
+        ends = np.r_[np.arange(step, len(scores), step), len(scores)] - 1
+        cumulativePositives = np.cumsum(positives)[ends]
+        cumulativeNegatives = np.cumsum(negatives)[ends]
+        # A bin ends above the next distinct score, not the next bin
+        scores, thresholds = scores[ends], thresholds[ends]
+        positives = np.diff(np.r_[0, cumulativePositives])
+        negatives = np.diff(np.r_[0, cumulativeNegatives])
+    return curveFromCounts(scores, positives, negatives, thresholds)
+
+
+def rates(curve):
+    """Return (fprate, tprate, precision) arrays of the curve"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fprate = curve['fp'] / (curve['fp'] + curve['tn'])
+        tprate = curve['tp'] / (curve['tp'] + curve['fn'])
+        precision = curve['tp'] / (curve['tp'] + curve['fp'])
+    return (np.nan_to_num(fprate), np.nan_to_num(tprate),
+            np.nan_to_num(precision))
+
+
+def areas(curve):
+    """Return the (ROC AUC, PR AUC) of the curve"""
+    fprate, tprate, precision = rates(curve)
+    rocAuc = np.trapz(np.r_[0.0, tprate], np.r_[0.0, fprate])
+    # Step interpolation of the PR curve, i.e. the average precision
+    prAuc = np.sum(np.diff(np.r_[0.0, tprate]) * precision)
+    return float(rocAuc), float(prAuc)
+
+
+def bestThreshold(curve, maxFpRate):
+    """Return (threshold, metrics) with the best recall at maxFpRate
+
+    Returns (None, None) if every threshold exceeds the false positive
+    rate.
+    """
+    fprate, tprate, _ = rates(curve)
+    allowed = np.flatnonzero(fprate <= maxFpRate)
+    if not len(allowed):
+        return None, None
+    best = allowed[np.argmax(tprate[allowed])]
+    metrics = metricsFromCounts(*[int(curve[cell][best])
+                                  for cell in ('tp', 'fp', 'fn', 'tn')])
+    return float(curve['threshold'][best]), metrics
+
+
+def writeArff(path, curve):
+    """Save the curve in the Weka ThresholdCurve ARFF layout"""
+    fprate, tprate, precision = rates(curve)
+    total = curve['tp'] + curve['fp'] + curve['fn'] + curve['tn']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fmeasure = np.nan_to_num(2 * precision * tprate /
+                                 (precision + tprate))
+        sampleSize = (curve['tp'] + curve['fp']) / total
+        positiveRate = (curve['tp'] + curve['fn']) / total
+        lift = np.nan_to_num(precision / positiveRate)
+    columns = [
+        ('True Positives', curve['tp']),
+        ('False Negatives', curve['fn']),
+        ('False Positives', curve['fp']),
+        ('True Negatives', curve['tn']),
+        ('False Positive Rate', fprate),
+        ('True Positive Rate', tprate),
+        ('Precision', precision),
+        ('Recall', tprate),
+        ('Fallout', fprate),
+        ('FMeasure', fmeasure),
+        ('Sample Size', sampleSize),
+        ('Lift', lift),
+        ('Threshold', curve['threshold']),
+    ]
+    lines = ["@relation ThresholdCurve", ""]
+    lines.extend("@attribute '%s' numeric" % name for name, _ in columns)
+    lines.extend(["", "@data"])
+    table = np.column_stack([values for _, values in columns])
+    # Weka lists the points by increasing threshold, written in full
+    for row in table[::-1]:
+        lines.append(','.join(['%.12g' % value for value in row[:-1]] +
+                              [repr(float(row[-1]))]))
+    with open(path, 'w') as fout:
+        fout.write('\n'.join(lines) + '\n')
+
+
+def sparkScores(name, model, testData):
+    """Return an RDD of (label, raw score), None if the model cannot score
+
+    The threshold of the model is cleared for the prediction and restored.
+    """
+    if name not in SPARK_SCORING_MODELS:
+        return None
+    threshold = model.threshold
+    model.clearThreshold()
+    try:
+        scores = model.predict(testData.map(lambda x: x.features))
+        labelsAndScores = testData.map(lambda p: p.label).zip(scores).cache()
+        # predict() is lazy, score before the threshold is restored
+        labelsAndScores.count()
+        return labelsAndScores
+    finally:
+        if threshold is not None:
+            model.setThreshold(threshold)
+
+
+def printCurveSummary(title, curve, maxFpRate):
+    """Print the areas and the best threshold of a curve"""
+    rocAuc, prAuc = areas(curve)
+    print("The ROC AUC of %s is: %.4f, the PR AUC is: %.4f" %
+          (title, rocAuc, prAuc))
+    threshold, metrics = bestThreshold(curve, maxFpRate)
+    if threshold is None:
+        print("No threshold of %s keeps the fprate under %.4f" %
+              (title, maxFpRate))
+        return
+    print("Best threshold of %s for fprate <= %.4f: %r "
+          "(recall %.4f, fprate %.4f, precision %.4f)" %
+          (title, maxFpRate, threshold, metrics['recall'],
+           metrics['fprate'], metrics['precision']))
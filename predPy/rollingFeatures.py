@@ -0,0 +1,178 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Per-drive rolling-window features over the daily SMART rows.
+
+A row only shows the state of a drive on one day, while failures show in
+the trends of the SMART counters.  RollingWindow adds, for every source
+column, the day-over-day delta, the rate (delta per day elapsed) and the
+max and mean over the last `window` rows of the same drive (serial in
+column 0, day index in column 1).
+
+The statistics are computed with vectorized operations over the rows
+sorted by serial and day: running sums for the means and `window` shifted
+comparisons for the maxima, masked at drive boundaries.  update() keeps
+the last `window` rows of every drive by serial, so a new day's rows are
+processed together with the short tails of their own drives only, never
+with the whole history or the other drives.  A caller bounding the
+number of drives, like streamPredictor's DriveStates, drops the tail of
+a forgotten drive with evict().
+
+The derived columns are inserted just before the label, so that the
+(62, None) range of features.SELECTED_SLICES picks them up and loadRecord,
+parseLines and the feature cache use them without changes.
+
+Usage: python rollingFeatures.py harddrive1.csv.gz rolling.csv.gz --window 7
+"""
+
+from __future__ import print_function
+import argparse
+import gzip
+import itertools
+import numpy as np
+from features import parseTable, selectedColumns
+from featureCache import openSource
+
+SERIAL_COLUMN = 0
+DAY_COLUMN = 1
+STATISTICS = ('delta', 'rate', 'max', 'mean')
+
+
+class RollingWindow(object):
+    """Incremental rolling statistics of the rows of many drives"""
+
+    def __init__(self, window=7, columns=None):
+        """columns lists the source columns, by default the selected ones"""
+        self.window = window
+        self.columns = columns
+        self.tails = {}
+
+    def sourceColumns(self, numColumns):
+        if self.columns is None:
+            self.columns = selectedColumns(numColumns)[:-1]
+        return self.columns
+
+    def update(self, table):
+        """Return the rows of table with the derived columns inserted
+
+        table holds new rows in the harddrive1.csv layout, their order is
+        kept.  The rows of each drive have to arrive in day order across
+        calls.
+        """
+        if not len(table):
+            return table
+        columns = self.sourceColumns(table.shape[1])
+        tails = [self.tails[serial] for serial in
+                 np.unique(table[:, SERIAL_COLUMN]).tolist()
+                 if serial in self.tails]
+        combined = np.vstack(tails + [table]) if tails else table
+        isNew = np.arange(len(combined)) >= len(combined) - len(table)
+        order = np.lexsort((combined[:, DAY_COLUMN],
+                            combined[:, SERIAL_COLUMN]))
+        rows = combined[order]
+        derived = self.statistics(rows, columns)
+
+        # Keep the last window rows of every drive of the batch
+        serials = rows[:, SERIAL_COLUMN]
+        starts = np.flatnonzero(np.r_[True, serials[1:] != serials[:-1]])
+        for start, stop in zip(starts, np.r_[starts[1:], len(rows)]):
+            self.tails[float(serials[start])] = \
+                rows[max(start, stop - self.window):stop].copy()
+
+        result = np.empty((len(combined), table.shape[1] + derived.shape[1]))
+        result[order] = np.hstack([rows[:, :-1], derived, rows[:, -1:]])
+        return result[isNew]
+
+    def evict(self, serial):
+        """Forget the tail of a drive"""
+        self.tails.pop(float(serial), None)
+
+    def statistics(self, rows, columns):
+        """Derived columns of rows sorted by serial and day"""
+        serials = rows[:, SERIAL_COLUMN]
+        days = rows[:, DAY_COLUMN]
+        values = rows[:, columns]
+        count = len(rows)
+        groupStart = np.r_[True, serials[1:] != serials[:-1]]
+        startIndex = np.maximum.accumulate(
+            np.where(groupStart, np.arange(count), 0))
+        position = np.arange(count) - startIndex
+
+        hasPrevious = (position >= 1)[:, np.newaxis]
+        previous = np.vstack([values[:1], values[:-1]])
+        delta = np.where(hasPrevious, values - previous, 0.0)
+        gap = np.r_[0.0, days[1:] - days[:-1]][:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.where(hasPrevious & (gap > 0), delta / gap, 0.0)
+
+        span = np.minimum(position + 1, self.window)
+        sums = np.vstack([np.zeros((1, len(columns))),
+                          np.cumsum(values, axis=0)])
+        index = np.arange(count)
+        mean = ((sums[index + 1] - sums[index + 1 - span]) /
+                span[:, np.newaxis])
+
+        maximum = values.copy()
+        for lag in range(1, self.window):
+            valid = position >= lag
+            if not valid.any():
+                break
+            maximum[valid] = np.maximum(maximum[valid],
+                                        values[index[valid] - lag])
+        return np.hstack([delta, rate, maximum, mean])
+
+    def columnNames(self):
+        """Names of the derived columns, in their order"""
+        return ['%s_%d' % (statistic, column) for statistic in STATISTICS
+                for column in self.columns]
+
+
+def augmentFile(source, target, window=7, blockRows=65536):
+    """Write the CSV file with the rolling columns added
+
+    The source is read in blocks in file order; each drive's rows must be
+    in day order, as in harddrive1.csv.
+    """
+    rolling = RollingWindow(window)
+    rows = 0
+    with openSource(source) as fin:
+        fout = gzip.open(target, 'wb') if target.endswith('.gz') else \
+            open(target, 'wb')
+        try:
+            while True:
+                chunk = list(itertools.islice(fin, blockRows))
+                if not chunk:
+                    break
+                augmented = rolling.update(parseTable(chunk))
+                np.savetxt(fout, augmented, fmt='%.10g', delimiter=',')
+                rows += len(augmented)
+        finally:
+            fout.close()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Add per-drive rolling-window features to a CSV file")
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--window', type=int, default=7)
+    args = parser.parse_args()
+    print("Wrote %d rows to %s" %
+          (augmentFile(args.input, args.output, args.window), args.output))
@@ -0,0 +1,156 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Stratified negative downsampling of the training data.
+
+About three quarters of the hard drive rows are healthy, and most of them
+are near-identical consecutive days of the same few hundred drives, so the
+trainers spend most of their time on redundant negatives.  The functions
+here keep a configurable fraction of every class before training, either
+uniformly or per serial, in which case every drive keeps a proportional
+share of its rows.  Only the training split is sampled; the test split and
+therefore the reported metrics are untouched.
+
+Sampling with class rates r0 (healthy) and r1 (failing) multiplies the odds
+a model learns by r1 / r0.  recalibrate undoes that by shifting the
+log-odds of the probabilistic models by log(r0 / r1): the intercept of the
+logistic regressions, the class priors of naive Bayes, the leaf
+probabilities of the trees and forests and the margin of the boosted
+trees.  The SVM margin has no probabilistic meaning and is left as is.
+Of the MLlib models only logistic regression and naive Bayes are
+recalibrated: the tree, forest and boosted tree models live in the JVM
+and cannot be changed from Python, so they are left uncalibrated.
+"""
+
+import math
+import numpy as np
+import localEngine
+
+
+def parseRates(text):
+    """Parse 'label:rate,...' into a {label: rate} dict"""
+    rates = {}
+    for item in text.split(','):
+        label, rate = item.split(':')
+        rate = float(rate)
+        if not 0 < rate <= 1:
+            raise ValueError("Sampling rate %s is not in (0, 1]" % rate)
+        rates[float(label)] = rate
+    return rates
+
+
+def sampleIndices(labels, rates, serials=None, seed=0):
+    """Return the sorted indices of the rows kept by the sampling
+
+    Rows of a label missing from rates are all kept.  With serials, each
+    drive keeps ceil(rate * rows) of its rows of every label.
+    """
+    labels = np.asarray(labels)
+    rng = np.random.RandomState(seed)
+    keep = np.ones(len(labels), dtype=bool)
+    for label, rate in rates.items():
+        members = np.flatnonzero(labels == label)
+        if rate >= 1 or not len(members):
+            continue
+        if serials is None:
+            keep[members] = rng.rand(len(members)) < rate
+            continue
+        groups = np.asarray(serials)[members]
+        # Random rank of every row within its drive
+        order = np.lexsort((rng.rand(len(members)), groups))
+        sortedGroups = groups[order]
+        starts = np.r_[True, sortedGroups[1:] != sortedGroups[:-1]]
+        startIndex = np.maximum.accumulate(
+            np.where(starts, np.arange(len(order)), 0))
+        rank = np.arange(len(order)) - startIndex
+        sizes = np.diff(np.r_[np.flatnonzero(starts), len(order)])
+        quota = np.ceil(rate * sizes)[np.cumsum(starts) - 1]
+        keep[members[order]] = rank < quota
+    return np.flatnonzero(keep)
+
+
+def downsample(features, labels, rates, serials=None, seed=0):
+    """Return the sampled (features, labels) arrays"""
+    indices = sampleIndices(labels, rates, serials, seed)
+    return features[indices], labels[indices]
+
+
+def sampleRDD(data, rates, seed=0):
+    """Stratified sample of an RDD of LabeledPoint by label
+
+    LabeledPoints carry no serial, so Spark samples per class only.
+    """
+    fractions = {0.0: 1.0, 1.0: 1.0}
+    fractions.update(rates)
+    return (data.keyBy(lambda point: point.label).
+            sampleByKey(False, fractions, seed).values())
+
+
+def logOddsShift(rates):
+    """Log-odds correction of a model trained on sampled classes"""
+    return math.log(rates.get(0.0, 1.0) / rates.get(1.0, 1.0))
+
+
+def recalibrate(model, rates):
+    """Undo the prior shift caused by sampling, in place, return model"""
+    shift = logOddsShift(rates)
+    if shift == 0:
+        return model
+    if isinstance(model, localEngine.LinearModel):
+        if model.logistic:
+            model.intercept += shift
+    elif isinstance(model, localEngine.NaiveBayesModel):
+        model.logPrior = model.logPrior + np.array([0.0, shift])
+    elif isinstance(model, localEngine.TreeModel):
+        if model.classify:
+            p = model.value
+            odds = math.exp(shift)
+            model.value = p * odds / (p * odds + (1.0 - p))
+    elif isinstance(model, localEngine.ForestModel):
+        for tree in model.trees:
+            recalibrate(tree, rates)
+    elif isinstance(model, localEngine.BoostedTreesModel):
+        # The MLlib log loss models P(failure) = 1 / (1 + exp(-2 margin))
+        model.offset += shift / 2.0
+    else:
+        return recalibrateSpark(model, shift)
+    return model
+
+
+def recalibrateSpark(model, shift):
+    """Return an MLlib model with its log-odds shifted
+
+    Logistic regression gets its intercept shifted, naive Bayes its log
+    prior of the failing class; other models are returned unchanged.
+    """
+    from pyspark.mllib.classification import LogisticRegressionModel
+    from pyspark.mllib.classification import NaiveBayesModel
+    if isinstance(model, NaiveBayesModel):
+        pi = np.array(model.pi, dtype=np.float64)
+        pi[np.asarray(model.labels) == 1.0] += shift
+        return NaiveBayesModel(model.labels, pi, model.theta)
+    if not isinstance(model, LogisticRegressionModel):
+        return model
+    shifted = LogisticRegressionModel(model.weights, model.intercept + shift,
+                                      model.numFeatures, model.numClasses)
+    if model.threshold is not None:
+        shifted.setThreshold(model.threshold)
+    else:
+        shifted.clearThreshold()
+    return shifted
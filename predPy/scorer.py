@@ -0,0 +1,207 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Low-latency batched scoring of SMART records with stored models.
+
+A BatchScorer owns one model loaded from the model store and one worker
+thread.  Callers hand in CSV rows in the harddrive1.csv layout (the label
+column is ignored) and block until their rows are scored.  The worker
+drains the queue into micro-batches of up to maxBatch rows, waiting at most
+maxDelay seconds for more callers, so concurrent callers share one
+vectorized parse and predict instead of each paying for its own.
+stop() ends the worker once the requests queued before it are scored.
+A ScorerRegistry replaces, and stops, the scorer of a model saved again
+to the store, so a retrained model is served without a restart.
+"""
+
+import collections
+import os
+import threading
+import time
+import Queue
+import numpy as np
+from features import parseLines
+from modelStore import META_FILE, loadModel, modelPath
+
+# Requests whose latencies are kept for the percentiles
+LATENCY_WINDOW = 1000
+# Queued by stop() to end the worker
+STOP = object()
+
+
+class BatchScorer(object):
+    """Micro-batching scorer of one stored model"""
+
+    def __init__(self, model, meta, maxBatch=512, maxDelay=0.002):
+        self.model = model
+        self.meta = meta
+        self.slices = [tuple(s) for s in meta['slices']]
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay
+        self.queue = Queue.Queue()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.batches = 0
+        self.rows = 0
+        self.stopped = False
+        self.worker = threading.Thread(target=self.run)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def score(self, lines, timeout=10.0):
+        """Return (predictions, scores) lists for the CSV rows"""
+        if self.stopped:
+            raise RuntimeError("The scorer was stopped")
+        lines = [line.strip() for line in lines]
+        if not all(lines):
+            raise ValueError("Empty record")
+        request = {'lines': lines, 'done': threading.Event(),
+                   'start': time.time()}
+        self.queue.put(request)
+        if not request['done'].wait(timeout):
+            raise RuntimeError("Scoring timed out")
+        if 'error' in request:
+            raise request['error']
+        return request['predictions'], request['scores']
+
+    def predict(self, lines):
+        """Score the rows in one vectorized call"""
+        features, _ = parseLines(lines, self.slices)
+        predictions = self.model.predict(features)
+        if hasattr(self.model, 'predictScores'):
+            scores = self.model.predictScores(features)
+        else:
+            scores = predictions
+        return predictions, scores
+
+    def stop(self, timeout=None):
+        """End the worker after the requests already queued"""
+        self.stopped = True
+        self.queue.put(STOP)
+        self.worker.join(timeout)
+
+    def collect(self):
+        """Block for one request and gather a micro-batch behind it
+
+        Returns None once stop() was called.
+        """
+        first = self.queue.get()
+        if first is STOP:
+            return None
+        batch = [first]
+        rows = len(first['lines'])
+        deadline = time.time() + self.maxDelay
+        while rows < self.maxBatch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=remaining)
+            except Queue.Empty:
+                break
+            if request is STOP:
+                # Score this batch first, the next collect stops
+                self.queue.put(STOP)
+                break
+            batch.append(request)
+            rows += len(request['lines'])
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            if batch is None:
+                return
+            try:
+                lines = [line for request in batch
+                         for line in request['lines']]
+                predictions, scores = self.predict(lines)
+                offset = 0
+                for request in batch:
+                    stop = offset + len(request['lines'])
+                    request['predictions'] = predictions[offset:stop].tolist()
+                    request['scores'] = scores[offset:stop].tolist()
+                    offset = stop
+            except Exception:
+                # Score the requests one by one so that a malformed record
+                # only fails the request that sent it
+                for request in batch:
+                    try:
+                        predictions, scores = self.predict(request['lines'])
+                        request['predictions'] = predictions.tolist()
+                        request['scores'] = scores.tolist()
+                    except Exception as error:
+                        request['error'] = ValueError(str(error))
+            finished = time.time()
+            self.batches += 1
+            for request in batch:
+                self.rows += len(request['lines'])
+                self.latencies.append(finished - request['start'])
+                request['done'].set()
+
+    def stats(self):
+        """Return the counters and latency percentiles in milliseconds"""
+        latencies = np.array(self.latencies) * 1000.0
+        stats = {'batches': self.batches, 'rows': self.rows}
+        if len(latencies):
+            stats['p50_ms'] = float(np.percentile(latencies, 50))
+            stats['p99_ms'] = float(np.percentile(latencies, 99))
+        return stats
+
+
+class ScorerRegistry(object):
+    """Lazily created BatchScorers of the models in a store directory"""
+
+    def __init__(self, storeDir, **options):
+        self.storeDir = storeDir
+        self.options = options
+        self.scorers = {}
+        self.savedAt = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        """Return the scorer of a model, loaded again if it was saved again
+
+        A model saved by modelStore.saveModel gets a new meta.json, whose
+        modification time is compared with that of the loaded version.
+        """
+        savedAt = os.path.getmtime(modelPath(self.storeDir, name, META_FILE))
+        with self.lock:
+            stale = self.scorers.get(name)
+            if stale is not None and self.savedAt[name] == savedAt:
+                return stale
+            model, meta = loadModel(self.storeDir, name)
+            scorer = BatchScorer(model, meta, **self.options)
+            self.scorers[name], self.savedAt[name] = scorer, savedAt
+        if stale is not None:
+            stale.stop()
+        return scorer
+
+    def reload(self, name=None):
+        """Forget loaded models so they are read again from the store
+
+        The worker threads of the forgotten scorers are stopped.
+        """
+        with self.lock:
+            names = list(self.scorers) if name is None else \
+                [name] if name in self.scorers else []
+            stale = [self.scorers.pop(each) for each in names]
+            for each in names:
+                del self.savedAt[each]
+        for scorer in stale:
+            scorer.stop()
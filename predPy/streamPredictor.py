@@ -0,0 +1,303 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Streaming failure prediction over incoming SMART records.
+
+New daily rows in the harddrive1.csv layout (serial in column 0, day index
+in column 1, the label column is ignored) are read from a directory, whose
+files are tailed as they grow, or from a TCP socket, one row per line.
+Rows are gathered into micro-batches of at most maxBatch rows or maxDelay
+seconds, whichever comes first, scored with a model from the model store,
+and every predicted failure is emitted as a JSON alert line.  The time
+from a row's arrival to its alert is therefore bounded by maxDelay plus
+the scoring time of one batch.
+
+Per-drive state (last day seen, last alert day) lives in an LRU table of
+at most maxDrives entries.  It drops replayed rows and suppresses repeated
+alerts of a drive within cooldown days.  With --window the rows go
+through a rollingFeatures.RollingWindow first, which keeps the last window
+rows of every drive in the table, for models trained on rollingFeatures
+output; a drive evicted from the table loses its window rows too.
+
+Usage:
+
+    python streamPredictor.py --model-dir models --model random-forest \
+        --watch incoming/ --alerts alerts.jsonl
+    python streamPredictor.py --model-dir models --model gbt --port 9999
+"""
+
+from __future__ import print_function
+import argparse
+import collections
+import glob
+import json
+import os
+import SocketServer
+import sys
+import threading
+import time
+import Queue
+import numpy as np
+from features import parseTable, selectTable
+from modelStore import loadModel
+from rollingFeatures import RollingWindow
+
+
+class DriveStates(object):
+    """Bounded LRU table of per-drive state
+
+    onEvict, if given, is called with the serial of every drive dropped
+    from the table, so other per-drive state can be dropped with it.
+    """
+
+    def __init__(self, maxDrives=100000, cooldown=7, onEvict=None):
+        self.maxDrives = maxDrives
+        self.cooldown = cooldown
+        self.onEvict = onEvict
+        self.states = collections.OrderedDict()
+
+    def touch(self, serial):
+        """Return the state of the drive, marking it most recently used"""
+        state = self.states.pop(serial, None)
+        if state is None:
+            state = {'lastDay': None, 'lastAlertDay': None}
+            if len(self.states) >= self.maxDrives:
+                evicted, _ = self.states.popitem(last=False)
+                if self.onEvict is not None:
+                    self.onEvict(evicted)
+        self.states[serial] = state
+        return state
+
+    def accept(self, serial, day):
+        """Record a row, False if it replays a day already seen"""
+        state = self.touch(serial)
+        if state['lastDay'] is not None and day <= state['lastDay']:
+            return False
+        state['lastDay'] = day
+        return True
+
+    def shouldAlert(self, serial, day):
+        """Record an alert, False if the drive alerted within cooldown"""
+        state = self.touch(serial)
+        last = state['lastAlertDay']
+        if last is not None and day - last < self.cooldown:
+            return False
+        state['lastAlertDay'] = day
+        return True
+
+
+def watchDirectory(directory, rows, pattern='*.csv', pollInterval=1.0):
+    """Put every complete line appended to the matching files into rows
+
+    A file that shrank or was replaced under the same name, e.g. by log
+    rotation, is read again from its start.
+    """
+    offsets = {}
+    while True:
+        paths = sorted(glob.glob(os.path.join(directory, pattern)))
+        for path in paths:
+            inode, offset = offsets.get(path, (None, 0))
+            try:
+                stat = os.stat(path)
+                if stat.st_ino != inode or stat.st_size < offset:
+                    inode, offset = stat.st_ino, 0
+                offsets[path] = (inode, offset)
+                if stat.st_size <= offset:
+                    continue
+                with open(path, 'rb') as fin:
+                    fin.seek(offset)
+                    for line in iter(fin.readline, ''):
+                        # Keep partial lines for the next poll
+                        if not line.endswith('\n'):
+                            break
+                        offset += len(line)
+                        if line.strip():
+                            rows.put((time.time(), line))
+            except (IOError, OSError):
+                continue
+            offsets[path] = (inode, offset)
+        for path in set(offsets) - set(paths):
+            del offsets[path]
+        time.sleep(pollInterval)
+
+
+def serveSocket(host, port, rows):
+    """Put every line received on the TCP port into rows"""
+
+    class Handler(SocketServer.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if line.strip():
+                    rows.put((time.time(), line))
+
+    server = SocketServer.ThreadingTCPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def nextBatch(rows, maxBatch, maxDelay):
+    """Block for one row and gather more until maxBatch or maxDelay"""
+    batch = [rows.get()]
+    deadline = batch[0][0] + maxDelay
+    while len(batch) < maxBatch:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(rows.get(timeout=remaining))
+        except Queue.Empty:
+            break
+    return batch
+
+
+def parseRows(rows):
+    """Parse (arrival, serial, day, line) rows into a table
+
+    Returns the table and the rows it holds.  If the block does not parse,
+    the rows are parsed one by one and those that fail, or do not have the
+    column count of most rows, are left out.
+    """
+    try:
+        return parseTable([line for _, _, _, line in rows]), rows
+    except ValueError:
+        pass
+    parsed = []
+    for row in rows:
+        try:
+            table = parseTable([row[3]])
+        except ValueError:
+            continue
+        if len(table):
+            parsed.append((row, table))
+    if not parsed:
+        return np.empty((0, 0)), []
+    width = collections.Counter(
+        single.shape[1] for _, single in parsed).most_common(1)[0][0]
+    parsed = [(row, single) for row, single in parsed
+              if single.shape[1] == width]
+    return (np.vstack([single for _, single in parsed]),
+            [row for row, _ in parsed])
+
+
+def scoreBatch(model, meta, batch, states, rolling=None):
+    """Score a batch of (arrival time, line) pairs
+
+    Returns the alerts and the number of malformed rows left out.  Rows
+    are only recorded in states once they parsed, so a bad row does not
+    cost the other rows of its batch.
+    """
+    keyed = []
+    for arrival, line in batch:
+        key = line.split(',', 2)
+        try:
+            keyed.append((arrival, key[0].strip(), float(key[1]), line))
+        except (IndexError, ValueError):
+            continue
+    table, parsed = parseRows(keyed)
+    rejected = len(batch) - len(parsed)
+    keep = [states.accept(serial, day) for _, serial, day, _ in parsed]
+    accepted = [row for row, accept in zip(parsed, keep) if accept]
+    if not accepted:
+        return [], rejected
+    table = table[np.array(keep)]
+    slices = [tuple(s) for s in meta['slices']]
+    if rolling is not None:
+        table = rolling.update(table)
+    features, _ = selectTable(table, slices)
+    predictions = model.predict(features)
+    scores = (model.predictScores(features)
+              if hasattr(model, 'predictScores') else predictions)
+    alerts = []
+    now = time.time()
+    for (arrival, serial, day, _), prediction, score in zip(
+            accepted, predictions, scores):
+        if prediction == 1 and states.shouldAlert(serial, day):
+            alerts.append({
+                'serial': serial,
+                'day': day,
+                'score': float(score),
+                'model': meta['name'],
+                'detectedAt': time.strftime('%Y-%m-%dT%H:%M:%S',
+                                            time.localtime(now)),
+                'latencyMs': round((now - arrival) * 1000.0, 1),
+            })
+    return alerts, rejected
+
+
+def run(model, meta, rows, alertsOut, states, maxBatch=1024, maxDelay=1.0,
+        rolling=None):
+    """Score the incoming rows forever, writing one JSON alert per line"""
+    rejectedTotal = 0
+    while True:
+        batch = nextBatch(rows, maxBatch, maxDelay)
+        try:
+            alerts, rejected = scoreBatch(model, meta, batch, states,
+                                          rolling)
+        except ValueError as error:
+            print("Skipped a batch: %s" % error, file=sys.stderr)
+            continue
+        if rejected:
+            rejectedTotal += rejected
+            print("Rejected %d malformed rows, %d in total" %
+                  (rejected, rejectedTotal), file=sys.stderr)
+        for alert in alerts:
+            alertsOut.write(json.dumps(alert, sort_keys=True) + '\n')
+        alertsOut.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Stream SMART records through a stored model")
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--model', required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--watch', help="directory of growing CSV files")
+    source.add_argument('--port', type=int, help="TCP port to listen on")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--pattern', default='*.csv')
+    parser.add_argument('--alerts', default=None,
+                        help="append alerts to this file, default stdout")
+    parser.add_argument('--max-batch', type=int, default=1024)
+    parser.add_argument('--max-delay', type=float, default=1.0,
+                        help="seconds a row may wait for its batch")
+    parser.add_argument('--max-drives', type=int, default=100000)
+    parser.add_argument('--cooldown', type=float, default=7,
+                        help="days between two alerts of the same drive")
+    parser.add_argument('--queue-size', type=int, default=100000)
+    parser.add_argument('--window', type=int, default=None,
+                        help="add rolling features over this many days")
+    args = parser.parse_args()
+
+    model, meta = loadModel(args.model_dir, args.model)
+    rows = Queue.Queue(maxsize=args.queue_size)
+    if args.watch:
+        reader = threading.Thread(target=watchDirectory,
+                                  args=(args.watch, rows, args.pattern))
+    else:
+        reader = threading.Thread(target=serveSocket,
+                                  args=(args.host, args.port, rows))
+    reader.daemon = True
+    reader.start()
+
+    alertsOut = open(args.alerts, 'a') if args.alerts else sys.stdout
+    rolling = RollingWindow(args.window) if args.window else None
+    states = DriveStates(args.max_drives, args.cooldown,
+                         rolling and rolling.evict)
+    run(model, meta, rows, alertsOut, states, args.max_batch,
+        args.max_delay, rolling)
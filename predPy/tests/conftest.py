@@ -0,0 +1,64 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Shared setup of the predPy tests, run with python -m pytest predPy/tests"""
+
+import os
+import sys
+import threading
+
+# The modules import each other by their flat names, as in the scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+
+class Sample(object):
+    """A sample as ceilometerclient returns it, fields as attributes"""
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+
+
+class SampleManager(object):
+    """new_samples of a client, answering from a ceilometerStub.Fleet
+
+    newest is the newest timestamp returned so far.
+    """
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.newest = None
+
+    def list(self, q, limit=None):
+        filters = [(each['field'], each['op'], each['value']) for each in q]
+        page = [Sample(fields)
+                for fields in self.fleet.list_samples(filters, limit)]
+        with self.lock:
+            self.calls += 1
+            if page:
+                self.newest = max(self.newest, page[0].timestamp)
+        return page
+
+
+class FleetClient(object):
+    """An in-process ceilometer client over a ceilometerStub.Fleet"""
+
+    def __init__(self, fleet):
+        self.new_samples = SampleManager(fleet)
@@ -0,0 +1,116 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import gzip
+import itertools
+import os
+import numpy as np
+import pytest
+import arffReader
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                    os.pardir, 'data')
+
+HEADER = """% comment before the relation
+@relation 'drives'
+@attribute serial {7, 3, 5}
+@attribute hours numeric
+@attribute 'read errors' real
+@attribute failed {0,1,}
+@data
+"""
+PLAIN = """7, 10, 1.5, 0
+3,20,?,1
+% comment in the data
+5, 30, 2.5e3, ?
+"""
+QUOTED = """'7', 10, 1.5, '0'
+"3",20,?,1
+% comment in the data
+5, '30', 2.5e3, ?
+"""
+EXPECTED = [[0, 10, 1.5, 0], [1, 20, np.nan, 1], [2, 30, 2500, np.nan]]
+
+
+def same(actual, expected):
+    return np.allclose(actual, expected, rtol=0, atol=0, equal_nan=True)
+
+
+def read(text):
+    tables = list(arffReader.iterTables(text.splitlines(True)))
+    return tables[0][0], np.vstack([table for _, table in tables])
+
+
+def test_schema():
+    schema, _ = read(HEADER + PLAIN)
+    assert schema.relation == 'drives'
+    assert schema.names() == ['serial', 'hours', 'read errors', 'failed']
+    assert schema.attributes[3].values == ['0', '1']
+    assert schema.fast
+
+
+def test_fast_and_quoted_slow_path_agree():
+    schema, fast = read(HEADER + PLAIN)
+    _, slow = read(HEADER + QUOTED)
+    assert same(fast, EXPECTED)
+    assert same(slow, EXPECTED)
+    lines = list(arffReader.dataLines(PLAIN.splitlines()))
+    assert same(arffReader.parseSlow(schema, lines),
+                arffReader.parseFast(schema, lines))
+
+
+def test_harddrive_fast_path_matches_tokenizer():
+    with open(os.path.join(DATA, 'harddrive1.arff')) as fin:
+        schema = arffReader.readSchema(fin)
+        lines = list(arffReader.dataLines(itertools.islice(fin, 300)))
+    assert schema.fast and len(lines) > 200
+    assert same(arffReader.parseFast(schema, lines),
+                arffReader.parseSlow(schema, lines))
+
+
+def test_strings_and_dates():
+    text = """@relation collected
+@attribute time date "yyyy-MM-dd'T'HH:mm:ss"
+@attribute resource_id string
+@attribute 'cpu_util' numeric
+@data
+2016-02-28T00:01:00, 'vm, one', 5.5
+2016-02-28T00:02:00, vm-two, ?
+"""
+    schema, table = read(text)
+    assert not schema.fast
+    assert table[:, 0].tolist() == [1456617660.0, 1456617720.0]
+    assert table[0, 1] == arffReader.stringKey('vm, one')
+    assert same(table[:, 2], [5.5, np.nan])
+
+
+def test_unknown_nominal_value():
+    with pytest.raises(ValueError):
+        read(HEADER + "9, 10, 1.5, 0\n")
+    with pytest.raises(ValueError):
+        read(HEADER + "'9', 10, 1.5, 0\n")
+
+
+def test_gzipped_blocks(tmpdir):
+    path = str(tmpdir.join('drives.arff.gz'))
+    with gzip.open(path, 'wb') as fout:
+        fout.write(HEADER + PLAIN)
+    with gzip.open(path) as fin:
+        tables = [table for _, table in arffReader.iterTables(fin, 2)]
+    assert [len(table) for table in tables] == [2, 1]
+    assert same(np.vstack(tables), EXPECTED)
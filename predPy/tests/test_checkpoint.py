@@ -0,0 +1,118 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import datetime
+import gzip
+import os
+import pytest
+from ceilometerStub import Fleet
+from checkpoint import collect_incremental, read_checkpoint
+from collector import Fetcher, collect, format_time
+from conftest import FleetClient
+
+START = datetime.datetime(2016, 2, 28)
+RESOURCE = 'resource-0001'
+METERS = ['cpu_util', 'disk.read.requests.rate', 'disk.write.requests.rate']
+
+
+def moment(minutes):
+    return format_time(START + datetime.timedelta(minutes=minutes))
+
+
+def run(function, path, end, fmt, interval=60, **options):
+    fleet = Fleet(resources=2, meters=3, samples=18000 // interval,
+                  interval=interval, gap_rate=0.1)
+    fetcher = Fetcher(FleetClient(fleet), workers=2, retries=0)
+    try:
+        return function(fetcher, RESOURCE, METERS, moment(0), moment(end),
+                        path, page_size=40,
+                        window=datetime.timedelta(minutes=45), fmt=fmt,
+                        **options)
+    finally:
+        fetcher.close()
+
+
+def read(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as dataset:
+        return dataset.read()
+
+
+@pytest.fixture(params=['arff', 'csv.gz'])
+def fmt(request):
+    return request.param
+
+
+def test_incremental_matches_full(tmpdir, fmt):
+    full = str(tmpdir.join('full.' + fmt))
+    incremental = str(tmpdir.join('incremental.' + fmt))
+    rows = run(collect, full, 300, fmt)
+    appended = [run(collect_incremental, incremental, end, fmt)
+                for end in (100, 101, 250, 300, 300)]
+    assert appended[-1] == 0
+    assert sum(appended) == rows
+    assert read(incremental) == read(full)
+    assert read_checkpoint(incremental)['last'][0] is not None
+
+
+@pytest.mark.parametrize('options', [
+    {'tolerance': datetime.timedelta(seconds=45)},
+    {'tolerance': datetime.timedelta(seconds=50), 'fill': 'drop'},
+    {'resample': datetime.timedelta(minutes=5)},
+    {'resample': datetime.timedelta(minutes=5), 'fill': 'previous'},
+], ids=['tolerance', 'tolerance-drop', 'resample', 'resample-previous'])
+def test_incremental_splits_rows_like_full(tmpdir, options):
+    # Runs ending inside resampling buckets and tolerance windows
+    full = str(tmpdir.join('full.csv.gz'))
+    incremental = str(tmpdir.join('incremental.csv.gz'))
+    run(collect, full, 300, 'csv.gz', interval=37, **options)
+    for end in (41.5, 102, 102.2, 250.75, 300):
+        run(collect_incremental, incremental, end, 'csv.gz', interval=37,
+            **options)
+        partial = str(tmpdir.join('partial.csv.gz'))
+        run(collect, partial, end, 'csv.gz', interval=37, **options)
+        assert read(incremental) == read(partial)
+    assert read(incremental) == read(full)
+
+
+def test_incremental_resumes_interrupted_run(tmpdir, fmt):
+    full = str(tmpdir.join('full.' + fmt))
+    incremental = str(tmpdir.join('incremental.' + fmt))
+    run(collect, full, 300, fmt)
+    run(collect_incremental, incremental, 150, fmt)
+    # Rows written after the last checkpoint of a run that then crashed
+    opener = gzip.open if fmt == 'csv.gz' else open
+    with opener(incremental, 'ab') as dataset:
+        dataset.write(b'9,9,9,9,9,0\n' if fmt == 'csv.gz' else b'9,9,9\n')
+    run(collect_incremental, incremental, 300, fmt)
+    assert read(incremental) == read(full)
+
+
+def test_incremental_restarts_on_other_meters(tmpdir):
+    full = str(tmpdir.join('full.arff'))
+    incremental = str(tmpdir.join('incremental.arff'))
+    run(collect, full, 300, 'arff')
+    with open(incremental, 'w') as dataset:
+        dataset.write('stale\n')
+    with open(incremental + '.checkpoint', 'w') as checkpoint:
+        checkpoint.write('{"resource_id": "%s", "meters": ["cpu_util"], '
+                         '"format": "arff", "last": [null], "length": 6}' %
+                         RESOURCE)
+    run(collect_incremental, incremental, 300, 'arff')
+    assert read(incremental) == read(full)
+    assert os.path.exists(incremental + '.checkpoint')
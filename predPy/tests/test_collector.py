@@ -0,0 +1,233 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import datetime
+import pytest
+from ceilometerStub import Fleet
+from collector import (FILL_DROP, FILL_MISSING, FILL_PREVIOUS, Fetcher,
+                       format_time, iter_batches, iter_window, merge_series,
+                       parse_time)
+from conftest import FleetClient, Sample
+
+START = datetime.datetime(2016, 2, 28)
+
+
+def window_ids(client, begin, end, page_size, resource_id='resource-0000',
+               meter='cpu_util'):
+    fetcher = Fetcher(client, workers=1, retries=0)
+    try:
+        return [each.id for each in iter_window(fetcher, resource_id, meter,
+                                                begin, end, page_size)]
+    finally:
+        fetcher.close()
+
+
+@pytest.mark.parametrize('page_size', [2, 7, 50, 1000])
+def test_iter_window_pages(page_size):
+    fleet = Fleet(resources=2, meters=2, samples=50)
+    client = FleetClient(fleet)
+    end = START + datetime.timedelta(minutes=50)
+    ids = window_ids(client, START, end, page_size)
+    assert ids == ['0-0-%d' % index for index in range(49, -1, -1)]
+    # Pages after the first repeat the sample at their cursor
+    assert client.new_samples.calls <= 50 // (page_size - 1) + 2
+
+
+def test_iter_window_bounds():
+    client = FleetClient(Fleet(resources=1, meters=1, samples=50))
+    begin = START + datetime.timedelta(minutes=10)
+    end = START + datetime.timedelta(minutes=20)
+    ids = window_ids(client, begin, end, 3)
+    assert ids == ['0-0-%d' % index for index in range(19, 9, -1)]
+
+
+def test_iter_window_gaps():
+    fleet = Fleet(resources=1, meters=1, samples=200, gap_rate=0.3)
+    end = START + datetime.timedelta(minutes=200)
+    ids = window_ids(FleetClient(fleet), START, end, 16)
+    expected = [fields['id'] for fields in fleet.list_samples(
+        [('resource_id', 'eq', 'resource-0000'), ('meter', 'eq', 'cpu_util')],
+        None)]
+    assert 0 < len(ids) < 200
+    assert ids == expected
+
+
+class TiedSamples(object):
+    """new_samples holding several samples per timestamp"""
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    def list(self, q, limit=None):
+        ops = {'ge': lambda a, b: a >= b, 'lt': lambda a, b: a < b,
+               'le': lambda a, b: a <= b}
+        bounds = [(ops[each['op']], parse_time(each['value']))
+                  for each in q if each['field'] == 'timestamp']
+        page = [each for each in self.samples
+                if all(op(parse_time(each.timestamp), value)
+                       for op, value in bounds)]
+        page.sort(key=lambda each: (each.timestamp, each.id), reverse=True)
+        return page[:limit]
+
+
+class TiedClient(object):
+
+    def __init__(self, samples):
+        self.new_samples = TiedSamples(samples)
+
+
+def tied(counts):
+    """Samples with counts[i] of them at minute i"""
+    samples = []
+    for minute, count in enumerate(counts):
+        timestamp = (START + datetime.timedelta(minutes=minute)).isoformat()
+        samples.extend(Sample({'id': '%d-%d' % (minute, index),
+                               'timestamp': timestamp})
+                       for index in range(count))
+    return samples
+
+
+def test_iter_window_ties_across_pages():
+    samples = tied([3, 2, 3, 1, 3])
+    end = START + datetime.timedelta(minutes=5)
+    ids = window_ids(TiedClient(samples), START, end, 4)
+    assert sorted(ids) == sorted(each.id for each in samples)
+    assert len(ids) == len(set(ids))
+
+
+def test_iter_window_page_too_small():
+    end = START + datetime.timedelta(minutes=2)
+    with pytest.raises(RuntimeError):
+        window_ids(TiedClient(tied([1, 5])), START, end, 4)
+
+
+@pytest.mark.parametrize('resample', [None, datetime.timedelta(minutes=5)])
+def test_merge_stays_in_step_with_a_meter_without_samples(resample):
+    fleet = Fleet(resources=1, meters=2, samples=600)
+    client = FleetClient(fleet)
+    fetcher = Fetcher(client, workers=2, retries=0)
+    window = datetime.timedelta(minutes=30)
+    series = [('resource-0000', 'cpu_util'), ('resource-0000', 'absent')]
+    batches = iter_batches(fetcher, series, START.isoformat(),
+                           (START + datetime.timedelta(hours=10)).isoformat(),
+                           page_size=20, window=window)
+    ahead = []
+    try:
+        for moment, _, values in merge_series(batches, 2, resample=resample):
+            assert values[1] is None
+            newest = parse_time(client.new_samples.newest)
+            ahead.append(newest - moment)
+    finally:
+        fetcher.close()
+    assert len(ahead) == (600 if resample is None else 120)
+    # A row closes on the first sample of the next window, by when the
+    # window after that is prefetched, but never the whole range
+    assert max(ahead) <= 3 * window
+
+
+def samples(meter, *points):
+    """Samples of one meter from (seconds after START, volume) points"""
+    return [Sample({'id': '%s-%s' % (meter, seconds), 'resource_id': 'r',
+                    'timestamp': format_time(
+                        START + datetime.timedelta(seconds=seconds)),
+                    'volume': volume})
+            for seconds, volume in points]
+
+
+def rows(batches, width=2, **options):
+    return [((moment - START).total_seconds(), values)
+            for moment, _, values in merge_series(batches, width, **options)]
+
+
+def test_tolerance_matching():
+    a = samples('a', (0, 1.0), (60, 2.0), (61, 3.0))
+    b = samples('b', (2, 10.0), (70, 20.0))
+    assert rows([[a, b]]) == [(0, [1.0, 10.0]), (60, [2.0, None]),
+                              (61, [3.0, None]), (70, [None, 20.0])]
+    assert rows([[a, b]], tolerance=datetime.timedelta(seconds=10)) == [
+        (0, [1.0, 10.0]), (60, [2.0, 20.0]), (61, [3.0, None])]
+
+
+def test_tolerance_across_windows():
+    first = [samples('a', (0, 1.0), (58, 2.0)), samples('b', (1, 10.0))]
+    second = [samples('a', (120, 3.0)), samples('b', (62, 20.0))]
+    assert rows([first, second],
+                tolerance=datetime.timedelta(seconds=5)) == [
+        (0, [1.0, 10.0]), (58, [2.0, 20.0]), (120, [3.0, None])]
+
+
+def test_resample_buckets():
+    a = samples('a', (0, 1.0), (100, 3.0), (290, 5.0), (310, 7.0))
+    b = samples('b', (650, 10.0))
+    assert rows([[a, b]], resample=datetime.timedelta(minutes=5)) == [
+        (0, [3.0, None]), (300, [7.0, None]), (600, [None, 10.0])]
+
+
+GAPPY = [samples('a', (0, 1.0), (60, 2.0), (120, 3.0)),
+         samples('b', (0, 10.0), (120, 30.0))]
+
+
+@pytest.mark.parametrize('fill, expected', [
+    (FILL_MISSING, [[1.0, 10.0], [2.0, None], [3.0, 30.0]]),
+    (FILL_PREVIOUS, [[1.0, 10.0], [2.0, 10.0], [3.0, 30.0]]),
+    (FILL_DROP, [[1.0, 10.0], [3.0, 30.0]]),
+    (-1, [[1.0, 10.0], [2.0, -1], [3.0, 30.0]]),
+])
+def test_fill_policies(fill, expected):
+    for options in ({}, {'resample': datetime.timedelta(minutes=1)}):
+        assert [values for _, values in rows([GAPPY], fill=fill,
+                                             **options)] == expected
+
+
+def test_last_covers_dropped_rows():
+    last = [None, None]
+    rows([GAPPY], fill=FILL_DROP, last=last)
+    assert last == [GAPPY[0][-1].timestamp, GAPPY[1][-1].timestamp]
+
+
+@pytest.mark.parametrize('fill', [FILL_MISSING, FILL_PREVIOUS, FILL_DROP])
+def test_gappy_fleet_meter(fill):
+    fleet = Fleet(resources=1, meters=2, samples=240, gap_rate=0.3)
+    fetcher = Fetcher(FleetClient(fleet), workers=2, retries=0)
+    series = [('resource-0000', meter) for meter in fleet.meters]
+    try:
+        batches = iter_batches(fetcher, series, START.isoformat(),
+                               (START + datetime.timedelta(hours=4)).
+                               isoformat(), page_size=25,
+                               window=datetime.timedelta(minutes=50))
+        merged = list(merge_series(batches, 2, fill=fill))
+    finally:
+        fetcher.close()
+    present = [[fleet.present(0, meter, index) for meter in range(2)]
+               for index in range(240)]
+    present = [(index, each) for index, each in enumerate(present)
+               if any(each)]
+    if fill == FILL_DROP:
+        present = [(index, each) for index, each in present if all(each)]
+    assert len(merged) == len(present)
+    previous = [None, None]
+    for (moment, _, values), (index, each) in zip(merged, present):
+        assert moment == fleet.moment(0, each.index(True), index)
+        for meter in range(2):
+            if each[meter]:
+                previous[meter] = fleet.volume(0, meter, index)
+                assert values[meter] == previous[meter]
+            elif fill == FILL_PREVIOUS:
+                assert values[meter] == previous[meter]
+            else:
+                assert values[meter] is None
@@ -0,0 +1,115 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import numpy as np
+from featureStats import ColumnStats, columnSlices, mergeStats, pruneColumns
+
+
+def table(rows=500, seed=7):
+    """Features 0 to 4 and the label last: 1 is constant, 3 copies 0 and
+    4 is 2 scaled and a little less correlated with the label.  0 has SMART
+    sized values to test the precision"""
+    random = np.random.RandomState(seed)
+    raw = random.randint(0, 10 ** 9, size=rows).astype(float)
+    label = (raw + random.normal(scale=10 ** 8, size=rows) >
+             5 * 10 ** 8).astype(float)
+    other = random.normal(size=rows) + label
+    shifted = other * -3.0 + 0.05 * label
+    return np.column_stack([raw, np.full(rows, 42.0), other, raw * 2.0,
+                            shifted, label])
+
+
+def test_blockwise_merge_equals_single_pass():
+    data = table()
+    whole = ColumnStats.ofTable(data)
+    for blocks in ((1, 499), (100, 200, 300), (250,), (7, 8, 9, 10)):
+        stats = None
+        for block in np.split(data, blocks):
+            stats = mergeStats(stats, ColumnStats.ofTable(block))
+        assert stats.rows == whole.rows
+        assert np.allclose(stats.mean, whole.mean, rtol=1e-12, atol=0)
+        assert np.allclose(stats.comoment, whole.comoment, rtol=1e-9,
+                           atol=1e-6)
+        assert np.array_equal(stats.minimum, whole.minimum)
+        assert np.array_equal(stats.maximum, whole.maximum)
+        assert np.array_equal(stats.finite, whole.finite)
+
+
+def test_merge_is_associative_and_skips_empty_blocks():
+    a, b, c = [ColumnStats.ofTable(block)
+               for block in np.split(table(), (120, 333))]
+    left = a.merge(b).merge(c)
+    right = a.merge(b.merge(c))
+    assert np.allclose(left.mean, right.mean, rtol=1e-12, atol=0)
+    assert np.allclose(left.comoment, right.comoment, rtol=1e-9, atol=1e-6)
+    empty = ColumnStats(0, None, None, None, None, None)
+    assert a.merge(None) is a
+    assert a.merge(empty) is a
+    assert empty.merge(a) is a
+    assert mergeStats(None, a) is a
+
+
+def test_merge_counts_non_finite_values():
+    data = table(rows=20)
+    data[3, 2] = np.nan
+    stats = mergeStats(ColumnStats.ofTable(data[:10]),
+                       ColumnStats.ofTable(data[10:]))
+    assert stats.finite.tolist() == [20, 20, 19, 20, 20, 20]
+
+
+def test_prune_drops_constant_and_duplicate_columns():
+    kept, dropped = pruneColumns(ColumnStats.ofTable(table()))
+    assert kept == [0, 2]
+    assert dropped == {1: 'constant', 3: 'duplicate of 0',
+                       4: 'duplicate of 2'}
+
+
+def test_prune_keeps_the_duplicate_most_correlated_with_the_label():
+    data = table()
+    # Column 3 now carries the raw value and column 0 a shifted copy of it
+    data[:, 0] = data[:, 3] + np.random.RandomState(1).normal(
+        scale=1e3, size=len(data))
+    kept, dropped = pruneColumns(ColumnStats.ofTable(data))
+    assert 3 in kept
+    assert dropped[0] == 'duplicate of 3'
+
+
+def test_prune_keeps_columns_with_non_finite_values():
+    data = table()
+    data[0, 1] = np.nan
+    data[0, 3] = np.inf
+    kept, dropped = pruneColumns(ColumnStats.ofTable(data))
+    assert kept == [0, 1, 2, 3]
+    assert dropped == {4: 'duplicate of 2'}
+
+
+def test_prune_by_standard_deviation():
+    # Column 2 goes first, so its copy 4, three times wider, survives
+    kept, dropped = pruneColumns(ColumnStats.ofTable(table()), minStd=2.0)
+    assert kept == [0, 4]
+    assert dropped[1] == 'constant'
+    assert dropped[2].startswith('std ')
+    assert dropped[3] == 'duplicate of 0'
+
+
+def test_column_slices():
+    assert columnSlices([4, 5, 6, 9, 12, 13], 14) == [(4, 7), (9, 10),
+                                                      (12, None)]
+    assert columnSlices([0, 2], 14) == [(0, 1), (2, 3)]
+    assert columnSlices([], 14) == []
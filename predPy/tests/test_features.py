@@ -0,0 +1,85 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+import pytest
+from features import parseLines, parseTable, selectTable, selectedColumns
+
+LINES = ['1,10,0.5,3,0\n', '2,20,1.5,4,1\n', '\n', '3,30,2.5,5,0\n']
+
+
+def test_parse_table():
+    table = parseTable(LINES)
+    assert table.shape == (3, 5)
+    assert table.dtype == np.float64
+    assert table[1].tolist() == [2, 20, 1.5, 4, 1]
+
+
+def test_parse_table_empty():
+    assert parseTable(['', '\n']).shape == (0, 0)
+
+
+def test_parse_table_ragged():
+    with pytest.raises(ValueError):
+        parseTable(['1,2,3', '4,5'])
+
+
+def test_parse_table_not_numeric():
+    with pytest.raises(ValueError):
+        parseTable(['1,2,3', '4,x,6'])
+
+
+def test_select_table():
+    features, labels = selectTable(parseTable(LINES), ((1, 3), (4, None)))
+    assert features.tolist() == [[10, 0.5], [20, 1.5], [30, 2.5]]
+    assert labels.tolist() == [0, 1, 0]
+
+
+def test_select_table_empty():
+    features, labels = selectTable(np.empty((0, 0)))
+    assert features.shape == (0, 0)
+    assert labels.shape == (0,)
+
+
+def test_parse_lines_matches_select_table():
+    slices = ((0, 1), (2, None))
+    expected = selectTable(parseTable(LINES), slices)
+    for actual, wanted in zip(parseLines(LINES, slices), expected):
+        assert np.array_equal(actual, wanted)
+
+
+def test_selected_columns():
+    assert selectedColumns(5, ((0, 1), (3, None))) == [0, 3, 4]
+
+
+def test_select_table_no_columns():
+    with pytest.raises(ValueError) as error:
+        selectTable(parseTable(LINES), ((2, 2),))
+    assert 'select no columns' in str(error.value)
+
+
+def test_select_table_out_of_range():
+    # The default slices reach column 62, the collector rows are narrower
+    with pytest.raises(ValueError) as error:
+        selectTable(parseTable(LINES))
+    assert 'outside the 5 columns' in str(error.value)
+
+
+def test_select_table_stop_out_of_range():
+    with pytest.raises(ValueError):
+        selectTable(parseTable(LINES), ((1, 6),))
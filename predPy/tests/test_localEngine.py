@@ -0,0 +1,103 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+import pytest
+import localEngine
+from models import MODELS, selectModels
+
+
+@pytest.fixture(scope='module')
+def fixture():
+    """600 rows of four nonnegative features, failing when x0 + x1 > 11"""
+    rng = np.random.RandomState(1)
+    features = rng.rand(600, 4) * 10
+    labels = (features[:, 0] + features[:, 1] > 11).astype(np.float64)
+    return localEngine.splitData(features, labels)
+
+
+def test_split_data():
+    features = np.arange(200.0).reshape(100, 2)
+    labels = np.arange(100.0)
+    training, test = localEngine.splitData(features, labels)
+    assert len(training[1]) + len(test[1]) == 100
+    assert not set(training[1]) & set(test[1])
+    assert (training[0][:, 0] == 2 * training[1]).all()
+    again = localEngine.splitData(features, labels)
+    assert np.array_equal(again[0][1], training[1])
+
+
+@pytest.mark.parametrize('spec', MODELS, ids=lambda spec: spec.name)
+def test_model_outputs(fixture, spec):
+    training, test = fixture
+    model = localEngine.trainModel(spec, *training)
+    predictions = model.predict(test[0])
+    assert predictions.shape == test[1].shape
+    assert set(np.unique(predictions)) <= {0.0, 1.0}
+    assert (predictions == test[1]).mean() > 0.7
+
+
+@pytest.mark.parametrize('spec', MODELS, ids=lambda spec: spec.name)
+def test_run_model(fixture, spec):
+    training, test = fixture
+    result = localEngine.runModel(spec, training, test)
+    counts = result['metrics']
+    assert result['name'] == spec.name
+    assert counts['tp'] + counts['fn'] == (test[1] == 1).sum()
+    assert counts['tn'] + counts['fp'] == (test[1] == 0).sum()
+
+
+def test_linear_threshold():
+    model = localEngine.LinearModel(np.array([1.0, -1.0]), 0.5, False)
+    features = np.array([[0.0, 0.0], [0.0, 1.0], [2.0, 2.0]])
+    assert model.predictScores(features).tolist() == [0.5, -0.5, 0.5]
+    assert model.predict(features).tolist() == [1.0, 0.0, 1.0]
+    model.setThreshold(0.5)
+    assert model.predict(features).tolist() == [0.0, 0.0, 0.0]
+
+
+def test_naive_bayes():
+    features = np.array([[2.0, 0.0], [1.0, 1.0], [0.0, 3.0], [0.0, 1.0]])
+    labels = np.array([0.0, 0.0, 1.0, 1.0])
+    model = localEngine.trainNaiveBayes(features, labels, lambda_=1.0)
+    assert np.allclose(model.logPrior, np.log([0.5, 0.5]))
+    assert np.allclose(model.logLikelihood,
+                       np.log([[4 / 6.0, 2 / 6.0], [1 / 6.0, 5 / 6.0]]))
+    assert model.predict(np.array([[3.0, 0.0], [0.0, 2.0]])).tolist() == \
+        [0.0, 1.0]
+
+
+def test_naive_bayes_negative():
+    with pytest.raises(ValueError):
+        localEngine.trainNaiveBayes(np.array([[-1.0]]), np.array([0.0]))
+
+
+def test_decision_tree_step():
+    features = np.arange(40.0).reshape(40, 1)
+    labels = (features[:, 0] >= 25).astype(np.float64)
+    spec, = selectModels(['decision-tree'])
+    model = localEngine.trainModel(spec, features, labels)
+    assert np.array_equal(model.predict(features), labels)
+
+
+def test_random_forest_seed(fixture):
+    training, test = fixture
+    predictions = [localEngine.trainRandomForest(*training, numTrees=5,
+                                                 seed=7).predict(test[0])
+                   for _ in range(2)]
+    assert np.array_equal(*predictions)
@@ -0,0 +1,71 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import numpy as np
+import modelCache
+from localEngine import LinearModel
+from modelCache import ModelCache, directorySize
+from models import selectModels
+
+SVM, LR = selectModels(['svm', 'lr-sgd'])
+
+
+def trainer(trained, weight):
+    def train():
+        trained.append(weight)
+        return LinearModel(np.array([weight]), 0.0, False)
+    return train
+
+
+def test_hit_after_miss(tmpdir):
+    cache = ModelCache(str(tmpdir), 1 << 20, 'dataset')
+    trained = []
+    model, hit = cache.fetch(SVM, trainer(trained, 2.0))
+    assert not hit
+    model, hit = cache.fetch(SVM, trainer(trained, 3.0))
+    assert hit and model.weights.tolist() == [2.0]
+    assert trained == [2.0]
+    assert cache.summary()['hitModels'] == ['svm']
+
+
+def test_key_covers_context(tmpdir, monkeypatch):
+    cache = ModelCache(str(tmpdir), 1 << 20, 'dataset')
+    key = cache.key(SVM)
+    assert key != cache.key(LR)
+    assert key != ModelCache(str(tmpdir), 1 << 20, 'other').key(SVM)
+    assert key == ModelCache(str(tmpdir), 1 << 20, 'dataset').key(SVM)
+    monkeypatch.setattr(modelCache, 'CACHE_VERSION',
+                        modelCache.CACHE_VERSION + 1)
+    assert key != ModelCache(str(tmpdir), 1 << 20, 'dataset').key(SVM)
+
+
+def test_size_bound_evicts_least_recently_used(tmpdir):
+    cacheDir = str(tmpdir)
+    cache = ModelCache(cacheDir, 1 << 20, 'dataset')
+    cache.fetch(SVM, trainer([], 1.0))
+    entry = directorySize(cacheDir)
+    # Room for one entry and a half
+    cache.maxBytes = entry * 3 // 2
+    cache.fetch(LR, trainer([], 1.0))
+    assert cache.summary()['evictions'] == 1
+    assert os.listdir(cacheDir) == [cache.key(LR)]
+    trained = []
+    cache.fetch(SVM, trainer(trained, 1.0))
+    assert trained == [1.0]
+    assert os.listdir(cacheDir) == [cache.key(SVM)]
@@ -0,0 +1,116 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+import pytest
+import roc
+from localEngine import LinearModel
+
+LABELS = np.array([1, 0, 1, 1, 0, 0, 1, 0, 0, 0], dtype=np.float64)
+# Tied scores across both classes
+SCORES = np.array([0.9, 0.8, 0.8, 0.7, 0.7, 0.7, 0.4, 0.4, 0.1, 0.1])
+
+
+class PairRDD(object):
+    """The few RDD operations of curveFromRDD, on a list"""
+
+    def __init__(self, items):
+        self.items = list(items)
+
+    def map(self, function):
+        return PairRDD(map(function, self.items))
+
+    def reduceByKey(self, function):
+        reduced = {}
+        for key, value in self.items:
+            reduced[key] = (function(reduced[key], value) if key in reduced
+                            else value)
+        return PairRDD(reduced.items())
+
+    def sortByKey(self, ascending=True):
+        return PairRDD(sorted(self.items, reverse=not ascending))
+
+    def collect(self):
+        return list(self.items)
+
+
+def assert_thresholds_reproduce(curve, labels, scores):
+    for index, threshold in enumerate(curve['threshold']):
+        predicted = scores > threshold
+        assert curve['tp'][index] == (predicted & (labels == 1)).sum()
+        assert curve['fp'][index] == (predicted & (labels == 0)).sum()
+        assert curve['fn'][index] == (~predicted & (labels == 1)).sum()
+        assert curve['tn'][index] == (~predicted & (labels == 0)).sum()
+
+
+def test_curve_counts_ties():
+    curve = roc.curveFromArrays(LABELS, SCORES)
+    assert curve['tp'].tolist() == [1, 2, 3, 4, 4]
+    assert curve['fp'].tolist() == [0, 1, 3, 4, 6]
+    assert_thresholds_reproduce(curve, LABELS, SCORES)
+
+
+def test_thresholds_separate_adjacent_floats():
+    scores = np.array([1.0, np.nextafter(1.0, 0.0), 0.5])
+    thresholds = roc.separatingThresholds(scores)
+    for index, threshold in enumerate(thresholds):
+        assert (scores > threshold).tolist() == [True] * (index + 1) + \
+            [False] * (len(scores) - index - 1)
+
+
+@pytest.mark.parametrize('numBins', [None, 2, 3])
+def test_rdd_curve_matches_thresholds(numBins):
+    rng = np.random.RandomState(0)
+    labels = (rng.rand(200) < 0.3).astype(np.float64)
+    scores = np.round(rng.rand(200), 1)
+    curve = roc.curveFromRDD(PairRDD(zip(labels, scores)), numBins)
+    if numBins:
+        assert len(curve['threshold']) <= numBins + 1
+    assert_thresholds_reproduce(curve, labels, scores)
+    if numBins is None:
+        full = roc.curveFromArrays(labels, scores)
+        for cell in ('threshold', 'tp', 'fp', 'fn', 'tn'):
+            assert np.array_equal(curve[cell], full[cell])
+
+
+def test_best_threshold_round_trip():
+    features = SCORES[:, np.newaxis]
+    model = LinearModel(np.array([1.0]), 0.0, False)
+    curve = roc.curveFromArrays(LABELS, model.predictScores(features))
+    threshold, metrics = roc.bestThreshold(curve, 0.5)
+    assert metrics['tp'] == 3 and metrics['fp'] == 3
+    assert 0.4 < threshold < 0.7
+    model.setThreshold(threshold)
+    predicted = model.predict(features) == 1
+    assert (predicted & (LABELS == 1)).sum() == metrics['tp']
+    assert (predicted & (LABELS == 0)).sum() == metrics['fp']
+
+
+def test_best_threshold_none():
+    curve = roc.curveFromArrays(LABELS, SCORES)
+    assert roc.bestThreshold(curve, -1.0) == (None, None)
+
+
+def test_write_arff_thresholds(tmpdir):
+    curve = roc.curveFromArrays(LABELS, SCORES)
+    path = str(tmpdir.join('curve.arff'))
+    roc.writeArff(path, curve)
+    with open(path) as arff:
+        rows = arff.read().split('@data\n')[1].split()
+    written = [float(row.split(',')[-1]) for row in rows]
+    assert written == curve['threshold'][::-1].tolist()
@@ -0,0 +1,95 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import math
+import numpy as np
+import pytest
+import localEngine
+from sampling import (downsample, logOddsShift, parseRates, recalibrate,
+                      sampleIndices)
+
+# 9000 healthy rows and 1000 failing ones of 100 drives
+LABELS = np.r_[np.zeros(9000), np.ones(1000)]
+SERIALS = np.arange(10000) % 100
+
+
+def test_parse_rates():
+    assert parseRates('0:0.1,1:1') == {0.0: 0.1, 1.0: 1.0}
+    with pytest.raises(ValueError):
+        parseRates('0:0')
+
+
+def test_rates_per_label():
+    indices = sampleIndices(LABELS, {0.0: 0.1})
+    assert (np.diff(indices) > 0).all()
+    kept = LABELS[indices]
+    assert (kept == 1).sum() == 1000
+    assert abs((kept == 0).sum() - 900) < 100
+    assert len(sampleIndices(LABELS, {0.0: 1.0, 1.0: 1.0})) == 10000
+
+
+def test_rates_per_serial():
+    indices = sampleIndices(LABELS, {0.0: 0.25, 1.0: 0.5}, SERIALS)
+    for label, rate in ((0.0, 0.25), (1.0, 0.5)):
+        rows = np.bincount(SERIALS[LABELS == label], minlength=100)
+        kept = np.bincount(SERIALS[indices][LABELS[indices] == label],
+                           minlength=100)
+        assert (kept == np.ceil(rate * rows)).all()
+
+
+def test_sampling_is_seeded():
+    first = sampleIndices(LABELS, {0.0: 0.3}, seed=4)
+    assert np.array_equal(first, sampleIndices(LABELS, {0.0: 0.3}, seed=4))
+    assert not np.array_equal(first, sampleIndices(LABELS, {0.0: 0.3},
+                                                   seed=5))
+
+
+def test_recalibrated_logistic_regression_restores_base_rate():
+    # Uninformative features: the model can only learn the base rate, and
+    # every drive keeps exactly 10 of its 90 healthy rows
+    features = np.zeros((len(LABELS), 1))
+    rates = {0.0: 1 / 9.0}
+    sampled = downsample(features, LABELS, rates, SERIALS)
+    assert (sampled[1] == 0).sum() == (sampled[1] == 1).sum()
+    model = localEngine.trainLogisticNewton(*sampled, regParam=0.0,
+                                            intercept=True)
+    assert abs(model.intercept) < 1e-6
+    recalibrate(model, rates)
+    assert abs(model.intercept - math.log(1000 / 9000.0)) < 1e-6
+
+
+def logOdds(probabilities):
+    return np.log(probabilities / (1 - probabilities))
+
+
+def test_recalibrate_shifts_log_odds():
+    rates = {0.0: 0.2}
+    shift = logOddsShift(rates)
+    assert shift == pytest.approx(math.log(0.2))
+    bayes = localEngine.NaiveBayesModel(np.log([0.5, 0.5]),
+                                        np.zeros((2, 1)))
+    recalibrate(bayes, rates)
+    assert bayes.logPrior[1] - bayes.logPrior[0] == pytest.approx(shift)
+    # One impure leaf, a quarter of its rows failing
+    features = np.zeros((4, 1))
+    tree = localEngine.trainDecisionTree(features,
+                                         np.array([0.0, 0.0, 0.0, 1.0]))
+    before = logOdds(tree.predictScores(features))
+    recalibrate(tree, rates)
+    after = logOdds(tree.predictScores(features))
+    assert after - before == pytest.approx(np.repeat(shift, 4))
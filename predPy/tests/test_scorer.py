@@ -0,0 +1,79 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import threading
+import time
+import numpy as np
+import pytest
+from localEngine import LinearModel
+from modelStore import META_FILE, loadModel, saveModel
+from models import selectModels
+from scorer import ScorerRegistry
+
+SPEC, = selectModels(['svm'])
+SLICES = ((1, None),)
+LINES = ['7,1.0,0', '7,-1.0,1']
+
+
+def save(storeDir, sign):
+    model = LinearModel(np.array([sign]), 0.0, False)
+    saveModel(storeDir, SPEC, model, slices=SLICES)
+
+
+@pytest.fixture
+def store(tmpdir):
+    storeDir = str(tmpdir.join('models'))
+    save(storeDir, 1.0)
+    return storeDir
+
+
+@pytest.mark.parametrize('name', ['../models/svm', 'lr-sgd', '', None])
+def test_unknown_model_rejected(store, name):
+    with pytest.raises(ValueError):
+        loadModel(store, name)
+    with pytest.raises(ValueError):
+        ScorerRegistry(store).get(name)
+
+
+def test_retrained_model_reloaded(store):
+    registry = ScorerRegistry(store)
+    first = registry.get('svm')
+    assert registry.get('svm') is first
+    assert first.score(LINES)[0] == [1.0, 0.0]
+    save(store, -1.0)
+    # A coarse file system clock could give both versions one mtime
+    savedAt = os.path.getmtime(os.path.join(store, 'svm', META_FILE))
+    os.utime(os.path.join(store, 'svm', META_FILE),
+             (time.time(), savedAt + 1))
+    second = registry.get('svm')
+    assert second is not first
+    assert second.score(LINES)[0] == [0.0, 1.0]
+    assert not first.worker.is_alive()
+    with pytest.raises(RuntimeError):
+        first.score(LINES)
+
+
+def test_reload_stops_workers(store):
+    registry = ScorerRegistry(store)
+    threads = threading.active_count()
+    for _ in range(3):
+        registry.get('svm').score(LINES)
+        registry.reload()
+    assert threading.active_count() == threads
+    assert registry.scorers == {}
@@ -0,0 +1,109 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import datetime
+import gzip
+import numpy as np
+import pytest
+import arffReader
+from features import parseTable
+from writers import (WRITERS, CsvWriter, open_writer, read_columns,
+                     read_json, resource_key)
+
+METERS = ['cpu_util', 'memory.usage']
+START = datetime.datetime(2016, 2, 28, 1, 2, 3)
+ROWS = [(START + datetime.timedelta(minutes=index),
+         'resource-%d' % (index % 2),
+         [index * 0.1, None if index % 3 else 1.0 / (index + 1)])
+        for index in range(10)]
+
+
+def same(actual, expected):
+    """Exact equality, nan equal to nan"""
+    return np.allclose(actual, expected, rtol=0, atol=0, equal_nan=True)
+
+
+def write(fmt, path, rows, append=False):
+    writer = open_writer(fmt, path, METERS, append)
+    try:
+        for row in rows:
+            writer.write(*row)
+        return writer.sync()
+    finally:
+        writer.close()
+
+
+def columnar(tmpdir, rows=ROWS):
+    path = str(tmpdir.join('columns'))
+    write('columnar', path, rows)
+    names, columns = read_columns(path)
+    assert names == ['key', 'time'] + METERS + ['label']
+    return np.column_stack([np.frombuffer(column) for column in columns])
+
+
+def test_columnar_values(tmpdir):
+    table = columnar(tmpdir)
+    assert table.shape == (10, 5)
+    assert table[1, 0] == resource_key('resource-1')
+    assert table[0, 1] == (START - datetime.datetime(1970, 1, 1)).\
+        total_seconds()
+    assert np.isnan(table[1, 3]) and table[3, 3] == 0.25
+    assert (table[:, 4] == 0).all()
+
+
+def test_csv_round_trip(tmpdir):
+    path = str(tmpdir.join('rows.csv.gz'))
+    write('csv.gz', path, ROWS)
+    with gzip.open(path) as fin:
+        table = parseTable(fin.readlines())
+    assert same(table, columnar(tmpdir))
+    assert read_json(CsvWriter.keys_path(path), None) == dict(
+        (str(resource_key(name)), name)
+        for name in ('resource-0', 'resource-1'))
+
+
+def test_arff_round_trip(tmpdir):
+    path = str(tmpdir.join('rows.arff'))
+    write('arff', path, ROWS)
+    with open(path) as fin:
+        tables = [table for _, table in arffReader.iterTables(fin)]
+    table = np.vstack(tables)
+    # time and resource id swap places, the ARFF file has no label
+    expected = columnar(tmpdir)[:, [1, 0, 2, 3]]
+    assert same(table, expected)
+
+
+@pytest.mark.parametrize('fmt', ['arff', 'csv.gz', 'columnar'])
+def test_append_and_truncate(tmpdir, fmt):
+    whole = str(tmpdir.join('whole.' + fmt))
+    parts = str(tmpdir.join('parts.' + fmt))
+    write(fmt, whole, ROWS)
+    length = write(fmt, parts, ROWS[:4])
+    write(fmt, parts, ROWS[4:7], append=True)
+    # The rows after a sync, as after a crash, are cut off again
+    WRITERS[fmt].truncate(parts, length)
+    assert WRITERS[fmt].size(parts) == length
+    write(fmt, parts, ROWS[4:], append=True)
+    if fmt == 'columnar':
+        assert WRITERS[fmt].size(parts) == 10
+        assert same(np.column_stack(read_columns(parts)[1]),
+                    np.column_stack(read_columns(whole)[1]))
+    else:
+        opener = gzip.open if fmt == 'csv.gz' else open
+        with opener(parts) as fin, opener(whole) as expected:
+            assert fin.read() == expected.read()
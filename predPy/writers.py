@@ -0,0 +1,357 @@
+# Copyright 2016 Huawei Technologies Co. Ltd.
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Streaming dataset writers of the collectors.
+
+A writer takes the merged rows of collector.merge_series one at a time
+and buffers them on their way to disk, so a collection never builds a
+list of its rows.  The format is chosen per run:
+
+* arff: the ARFF file the collectors always wrote.
+* csv.gz: gzip compressed numeric CSV that features.parseTable reads: a
+  numeric resource key in column 0, the time in epoch seconds in column
+  1, the meters, and a label, always 0, in the last column.  Missing
+  values are written as nan.  The resource ids of the keys are kept in a
+  <path>.keys.json file next to it.
+* columnar: a directory with one file of native float64 values per
+  column, in the same column order as csv.gz, and a meta.json naming
+  the columns, row count and keys.
+
+Every writer can append to an existing dataset and sync() it to a
+consistent point: the ARFF file is flushed, the current gzip member
+closed, or the column buffers written.  sync returns the size of the
+dataset, in bytes or rows, that the class methods size and truncate
+understand, which is what checkpoint.py needs to resume after a crash.
+
+The collected columns are not those of harddrive1.csv, so predictor.py
+cannot train on them with the default features.SELECTED_SLICES, which
+fall outside the table.  The label must first be filled in from the
+known failures, and the meters picked with a selection spec, e.g. a
+selection.json of {"slices": [[2, null]]} passed to predictor.py
+--selection, or one written by featureStats.py.  The ARFF output has no
+label column at all; one has to be appended before training.
+"""
+
+import array
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import sys
+import metrics
+
+FORMATS = ('arff', 'csv.gz', 'columnar')
+EXTENSIONS = {'arff': '.arff', 'csv.gz': '.csv.gz', 'columnar': '.columns'}
+BUFFER_SIZE = 1 << 20
+# Rows buffered before a compressed or columnar write
+BUFFER_ROWS = 4096
+EPOCH = datetime.datetime(1970, 1, 1)
+META_FILE = 'meta.json'
+ARFF_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def resource_key(resource_id):
+    """Return a stable numeric key of a resource id, exact as a double"""
+    return int(hashlib.sha1(resource_id).hexdigest()[:12], 16)
+
+
+def epoch_seconds(moment):
+    return (moment - EPOCH).total_seconds()
+
+
+def write_json(path, value):
+    """Atomically replace the JSON file at path"""
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as fout:
+        json.dump(value, fout, sort_keys=True, indent=1,
+                  separators=(',', ': '))
+    os.rename(temporary, path)
+
+
+def read_json(path, default):
+    try:
+        with open(path) as fin:
+            return json.load(fin)
+    except IOError:
+        return default
+
+
+def file_size(path):
+    return os.path.getsize(path)
+
+
+def truncate_file(path, size):
+    with open(path, 'r+b') as fout:
+        fout.truncate(size)
+
+
+def arff_header(meters):
+    """Return the ARFF header of the collected meter samples
+
+    The attributes are typed, so arffReader and Weka read the time as a
+    date and the meters as numbers.
+    """
+    item_info = ["% ARFF file for the collected meter sample"
+                 " with some numeric feature from ceilometer API. \n \n"
+                 "@relation  'collected samples for VMs on host' \n \n"
+                 "@attribute  timestample  date \"yyyy-MM-dd'T'HH:mm:ss\" \n"
+                 "@attribute  resource_id  string \n"]
+    for each in meters:
+        item_info.append("@attribute  '%s'  numeric \n" % each)
+    item_info.append("@data \n \n")
+    return ''.join(item_info)
+
+
+def format_row(moment, resource_id, values):
+    """Return one ARFF data line, missing values written as '?'"""
+    fields = [moment.strftime(ARFF_TIME_FORMAT), resource_id]
+    # repr keeps every digit, str rounds to 12
+    fields.extend('?' if value is None else repr(float(value))
+                  for value in values)
+    return ', '.join(fields) + '\n'
+
+
+class ArffWriter(object):
+    """Rows as lines of an ARFF file"""
+
+    def __init__(self, path, meters, append=False):
+        self.fout = open(path, 'ab' if append else 'wb', BUFFER_SIZE)
+        if not append:
+            self.fout.write(arff_header(meters))
+        self.count = 0
+
+    def write(self, moment, resource_id, values):
+        self.fout.write(format_row(moment, resource_id, values))
+        self.count += 1
+
+    @metrics.timed('writer_sync_seconds', format='arff')
+    def sync(self):
+        """Flush the file to disk and return its length"""
+        self.fout.flush()
+        os.fsync(self.fout.fileno())
+        return os.fstat(self.fout.fileno()).st_size
+
+    @metrics.timed('writer_close_seconds', format='arff')
+    def close(self):
+        metrics.count('writer_rows_total', self.count, format='arff')
+        self.fout.close()
+
+    size = staticmethod(file_size)
+    truncate = staticmethod(truncate_file)
+
+
+class CsvWriter(object):
+    """Rows as gzip compressed CSV lines in the harddrive1.csv layout
+
+    Each sync closes a gzip member; gzip readers read the concatenated
+    members as one stream.
+    """
+
+    def __init__(self, path, meters, append=False):
+        self.path = path
+        self.raw = open(path, 'ab' if append else 'wb')
+        self.member = None
+        self.lines = []
+        self.keys = read_json(self.keys_path(path), {}) if append else {}
+        self.new_keys = False
+        self.count = 0
+
+    @staticmethod
+    def keys_path(path):
+        return path + '.keys.json'
+
+    def write(self, moment, resource_id, values):
+        key = resource_key(resource_id)
+        if str(key) not in self.keys:
+            self.keys[str(key)] = resource_id
+            self.new_keys = True
+        fields = [str(key), repr(epoch_seconds(moment))]
+        fields.extend('nan' if value is None else repr(float(value))
+                      for value in values)
+        fields.append('0')
+        self.lines.append(','.join(fields) + '\n')
+        self.count += 1
+        if len(self.lines) >= BUFFER_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Compress the buffered lines into the current gzip member"""
+        if not self.lines:
+            return
+        if self.member is None:
+            self.member = gzip.GzipFile(fileobj=self.raw, mode='wb')
+        self.member.write(''.join(self.lines))
+        self.lines = []
+
+    def finish(self):
+        """Close the current gzip member and save new keys"""
+        self.flush()
+        if self.member is not None:
+            self.member.close()
+            self.member = None
+        if self.new_keys:
+            write_json(self.keys_path(self.path), self.keys)
+            self.new_keys = False
+
+    @metrics.timed('writer_sync_seconds', format='csv.gz')
+    def sync(self):
+        """End the gzip member, flush the file and return its length"""
+        self.finish()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        return os.fstat(self.raw.fileno()).st_size
+
+    @metrics.timed('writer_close_seconds', format='csv.gz')
+    def close(self):
+        metrics.count('writer_rows_total', self.count, format='csv.gz')
+        self.finish()
+        self.raw.close()
+
+    size = staticmethod(file_size)
+    truncate = staticmethod(truncate_file)
+
+
+class ColumnarWriter(object):
+    """Rows as one file of native float64 values per column"""
+
+    def __init__(self, path, meters, append=False):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        meta = read_json(os.path.join(path, META_FILE), None)
+        self.names = ['key', 'time'] + list(meters) + ['label']
+        if append and meta is not None:
+            self.keys = meta['keys']
+            self.rows = self.size(path)
+        else:
+            self.keys, self.rows = {}, 0
+            # Drop the columns of an earlier dataset with more meters
+            index = len(self.names)
+            while os.path.exists(self.column_path(path, index)):
+                os.remove(self.column_path(path, index))
+                index += 1
+        mode = 'ab' if append else 'wb'
+        self.files = [open(self.column_path(path, column), mode)
+                      for column in range(len(self.names))]
+        self.columns = [array.array('d') for _ in self.names]
+        self.count = 0
+
+    @staticmethod
+    def column_path(path, index):
+        return os.path.join(path, 'c%03d.f64' % index)
+
+    def write(self, moment, resource_id, values):
+        key = resource_key(resource_id)
+        self.keys[str(key)] = resource_id
+        row = [float(key), epoch_seconds(moment)]
+        row.extend(float('nan') if value is None else float(value)
+                   for value in values)
+        row.append(0.0)
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        self.count += 1
+        if len(self.columns[0]) >= BUFFER_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered values to the column files"""
+        for column, fout in zip(self.columns, self.files):
+            column.tofile(fout)
+            del column[:]
+
+    def write_meta(self):
+        write_json(os.path.join(self.path, META_FILE), {
+            'columns': self.names,
+            'rows': self.rows + self.count,
+            'dtype': 'float64',
+            'byteorder': sys.byteorder,
+            'keys': self.keys,
+        })
+
+    @metrics.timed('writer_sync_seconds', format='columnar')
+    def sync(self):
+        """Write the buffers to disk and return the number of rows"""
+        self.flush()
+        for fout in self.files:
+            fout.flush()
+            os.fsync(fout.fileno())
+        self.write_meta()
+        return self.rows + self.count
+
+    @metrics.timed('writer_close_seconds', format='columnar')
+    def close(self):
+        metrics.count('writer_rows_total', self.count, format='columnar')
+        self.flush()
+        for fout in self.files:
+            fout.close()
+        self.write_meta()
+
+    @classmethod
+    def size(cls, path):
+        """Return the number of complete rows in all column files"""
+        item_size = array.array('d').itemsize
+        sizes = []
+        index = 0
+        while os.path.exists(cls.column_path(path, index)):
+            sizes.append(os.path.getsize(cls.column_path(path, index)))
+            index += 1
+        return min(sizes) // item_size if sizes else 0
+
+    @classmethod
+    def truncate(cls, path, rows):
+        item_size = array.array('d').itemsize
+        index = 0
+        while os.path.exists(cls.column_path(path, index)):
+            with open(cls.column_path(path, index), 'r+b') as fout:
+                fout.truncate(rows * item_size)
+            index += 1
+
+
+WRITERS = {'arff': ArffWriter, 'csv.gz': CsvWriter,
+           'columnar': ColumnarWriter}
+
+
+def dataset_path(base, fmt):
+    """Return the path of a dataset named base in a format"""
+    return base + EXTENSIONS[fmt]
+
+
+def open_writer(fmt, path, meters, append=False):
+    """Return a writer of the format to the dataset at path"""
+    if fmt not in WRITERS:
+        raise ValueError("unknown format %r, not one of %s" %
+                         (fmt, ', '.join(FORMATS)))
+    return WRITERS[fmt](path, meters, append)
+
+
+def read_columns(path):
+    """Return the column names and arrays of a columnar dataset"""
+    meta = read_json(os.path.join(path, META_FILE), None)
+    if meta is None:
+        raise IOError("%s is not a columnar dataset" % path)
+    columns = []
+    for index in range(len(meta['columns'])):
+        column = array.array('d')
+        with open(ColumnarWriter.column_path(path, index), 'rb') as fin:
+            column.fromfile(fin, meta['rows'])
+        if meta['byteorder'] != sys.byteorder:
+            column.byteswap()
+        columns.append(column)
+    return meta['columns'], columns